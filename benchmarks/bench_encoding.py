@@ -0,0 +1,67 @@
+"""
+Micro-benchmark of the charset detection of the scraped articles, chardet against `resolve_encoding`.
+
+"chardet" runs `chardet.detect` over the whole body of every page, as the search scraper used
+to do. "resolved" is `html_parsing.resolve_encoding`, which reads the declared charset and only
+falls back to a detector on a sample. Each article of the fixture corpus is measured three ways:
+with its Content-Type header, with its `<meta charset>` only, and with no declaration at all.
+
+Usage:
+    python benchmarks/bench_encoding.py [--repeat N] [--corpus DIR]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+
+import chardet  # noqa: E402
+from html_parsing import resolve_encoding  # noqa: E402
+from replay import FixtureCorpus  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]*charset[^>]*>', re.I)
+
+
+def load_articles(corpus):
+    """
+    Get the body and the Content-Type header of every article of the corpus.
+    """
+    articles = []
+    for entry in corpus.manifest.values():
+        if entry['file'].startswith('articles/'):
+            with open(os.path.join(corpus.directory, entry['file']), 'rb') as f:
+                articles.append((f.read(), entry.get('headers', {}).get('Content-Type')))
+    return articles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='Number of detections per page and variant.')
+    parser.add_argument('--corpus', default=CORPUS, help='The fixture corpus directory.')
+    args = parser.parse_args()
+
+    articles = load_articles(FixtureCorpus(args.corpus))
+    cases = [
+        ('header', [(content, content_type) for content, content_type in articles]),
+        ('meta', [(content, None) for content, _ in articles]),
+        ('undeclared', [(META_CHARSET_PATTERN.sub(b'', content), None) for content, _ in articles]),
+    ]
+    for content, content_type in cases[0][1]:
+        assert content.decode(chardet.detect(content)['encoding']) == content.decode(resolve_encoding(content, content_type))
+
+    print(f'{len(articles)} articles, {sum(len(content) for content, _ in articles) // len(articles)} bytes on average, '
+          f'{args.repeat} repetitions')
+    for name, pages in cases:
+        chardet_ms = timeit.timeit(lambda: [chardet.detect(content) for content, _ in pages],
+                                   number=args.repeat) / args.repeat / len(pages) * 1000
+        resolved_ms = timeit.timeit(lambda: [resolve_encoding(content, content_type) for content, content_type in pages],
+                                    number=args.repeat) / args.repeat / len(pages) * 1000
+        print(f'{name:<11} chardet {chardet_ms:8.3f} ms/page   resolved {resolved_ms:8.3f} ms/page   '
+              f'speedup x{chardet_ms / resolved_ms:.0f}')
+
+
+if __name__ == '__main__':
+    main()
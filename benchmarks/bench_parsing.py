@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of the Argenprop page parsing, before and after targeted subtree extraction.
+
+"before" parses the whole page with html.parser, as the scraper used to do (the project
+page was parsed twice, once for the brief and once for the apartment links). "after"
+uses the default parser of `html_parsing` with the SoupStrainers of `argenprop_scraper`.
+For a listing page with JSON-LD, "structured" reads the fields from the embedded data
+without parsing the HTML at all. The fixture pages reproduce the markup of Argenprop
+project and listing pages.
+
+Usage:
+    python benchmarks/bench_parsing.py [--repeat N] [--fixtures DIR]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+
+from bs4 import BeautifulSoup  # noqa: E402
+from argenprop_scraper import (APARTMENT_LINK_STRAINER, APARTMENT_STRAINER, PROJECT_STRAINER,  # noqa: E402
+                               ArgenPropData)
+from html_parsing import DEFAULT_PARSER, make_soup  # noqa: E402
+from structured_data import extract_listing  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'argenprop')
+
+
+def parse_project_before(apd, content):
+    soup = BeautifulSoup(content, 'html.parser')
+    apd.create_project_brief(soup=soup)
+    apd.project_images(soup=soup)
+    apd.available_apartments(soup=BeautifulSoup(content, 'html.parser'))
+
+
+def parse_project_after(apd, content):
+    soup = make_soup(content, parse_only=PROJECT_STRAINER)
+    apd.create_project_brief(soup=soup)
+    apd.project_images(soup=soup)
+    apd.available_apartments(soup=make_soup(content, parse_only=APARTMENT_LINK_STRAINER))
+
+
+def parse_apartment_before(apd, content):
+    return apd.parse_apartment_page(BeautifulSoup(content, 'html.parser'), 'fixture')
+
+
+def parse_apartment_after(apd, content):
+    return apd.parse_apartment_page(make_soup(content, parse_only=APARTMENT_STRAINER), 'fixture')
+
+
+def parse_apartment_structured(apd, content):
+    return apd.structured_apartment_data(extract_listing(content), 'fixture')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help='Number of parses per page and variant.')
+    parser.add_argument('--fixtures', default=FIXTURES,
+                        help='Directory with project.html, apartment.html and apartment_jsonld.html.')
+    args = parser.parse_args()
+
+    apd = ArgenPropData(fetcher=object())
+    with open(os.path.join(args.fixtures, 'project.html'), 'rb') as f:
+        project = f.read()
+    with open(os.path.join(args.fixtures, 'apartment.html'), 'rb') as f:
+        apartment = f.read()
+    with open(os.path.join(args.fixtures, 'apartment_jsonld.html'), 'rb') as f:
+        apartment_jsonld = f.read()
+
+    assert parse_apartment_before(apd, apartment) == parse_apartment_after(apd, apartment)
+    assert parse_apartment_after(apd, apartment_jsonld) == parse_apartment_structured(apd, apartment_jsonld)
+
+    print(f'Parser: {DEFAULT_PARSER}, {args.repeat} repetitions')
+    for name, before, after, content in [
+        ('project page', parse_project_before, parse_project_after, project),
+        ('apartment page', parse_apartment_before, parse_apartment_after, apartment),
+    ]:
+        before_ms = timeit.timeit(lambda: before(apd, content), number=args.repeat) / args.repeat * 1000
+        after_ms = timeit.timeit(lambda: after(apd, content), number=args.repeat) / args.repeat * 1000
+        print(f'{name:<15} before {before_ms:7.2f} ms   after {after_ms:7.2f} ms   speedup x{before_ms / after_ms:.1f}')
+    dom_ms = timeit.timeit(lambda: parse_apartment_after(apd, apartment_jsonld), number=args.repeat) / args.repeat * 1000
+    structured_ms = timeit.timeit(lambda: parse_apartment_structured(apd, apartment_jsonld),
+                                  number=args.repeat) / args.repeat * 1000
+    print(f'{"JSON-LD page":<15} dom    {dom_ms:7.2f} ms   structured {structured_ms:7.2f} ms   '
+          f'speedup x{dom_ms / structured_ms:.1f}')
+
+
+if __name__ == '__main__':
+    main()
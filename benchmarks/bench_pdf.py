@@ -0,0 +1,88 @@
+"""
+Benchmark of the PDF stages of the knowledge corpus: rendering the articles and extracting their chunks.
+
+"serial" extracts every PDF of the corpus one at a time, joining its pages into one string
+before splitting it, as `VectorDBManager` used to do. "pool" is `chroma_db.iter_pdf_chunks`,
+which streams the pages of each file into the splitter in a process pool. The texts extracted
+are then rendered again with `KnowledgeCreator.save_articles_to_pdf`, with one process and
+with the pool. Both stages should scale with the number of cores once each process gets
+`MIN_PDFS_PER_WORKER` files; smaller corpora are processed serially whatever `--workers` says.
+
+Usage:
+    python benchmarks/bench_pdf.py [--pdf-directory DIR] [--workers N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'scraper'))
+sys.path.insert(0, os.path.join(ROOT, 'db_manager'))
+
+import fitz  # noqa: E402
+from chroma_db import iter_pdf_chunks  # noqa: E402
+from knowledge_creator import KnowledgeCreator  # noqa: E402
+from langchain_text_splitters import CharacterTextSplitter  # noqa: E402
+
+
+def serial_chunks(list_of_pdfs, chunk_size, overlap_size):
+    """
+    Extract and split the PDF files the way `VectorDBManager` did before the process pool.
+    """
+    chunks = []
+    for doc in list_of_pdfs:
+        with fitz.open(doc) as pdf_document:
+            text = ""
+            for page_num in range(len(pdf_document)):
+                text += pdf_document.load_page(page_num).get_text()
+        chunks.append(CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap_size).split_text(text))
+    return chunks
+
+
+def timed(run):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pdf-directory', default=os.path.join(ROOT, 'data', 'processed', 'pdf_files'),
+                        help='The directory of the PDF corpus.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes of the pool.')
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--overlap-size', type=int, default=125)
+    args = parser.parse_args()
+
+    list_of_pdfs = sorted(os.path.join(args.pdf_directory, name) for name in os.listdir(args.pdf_directory)
+                          if name.endswith('.pdf'))
+    print(f'{len(list_of_pdfs)} PDF files, {args.workers} workers ({os.cpu_count()} cores)')
+
+    serial, serial_s = timed(lambda: serial_chunks(list_of_pdfs, args.chunk_size, args.overlap_size))
+    print(f'extract serial      {serial_s:7.2f} s   {len(list_of_pdfs) / serial_s:7.1f} files/s   '
+          f'{sum(map(len, serial))} chunks')
+    for workers in sorted({1, args.workers}):
+        pooled, pooled_s = timed(lambda: [chunks for _, chunks in iter_pdf_chunks(
+            list_of_pdfs, args.chunk_size, args.overlap_size, workers=workers)])
+        same = sum(a == b for a, b in zip(serial, pooled))
+        print(f'extract pool x{workers:<4} {pooled_s:7.2f} s   {len(list_of_pdfs) / pooled_s:7.1f} files/s   '
+              f'{sum(map(len, pooled))} chunks, {same}/{len(list_of_pdfs)} files chunked identically')
+
+    articles = [{'url': f'https://example.com/{os.path.basename(doc)[:-4]}', 'article_text': '\n'.join(chunks)}
+                for doc, chunks in zip(list_of_pdfs, serial) if chunks]
+    knowledge_creator = KnowledgeCreator(browser=None)
+    font_path = os.path.join(ROOT, 'assets', 'fonts', 'DejaVu_Sans', 'DejaVuSansCondensed.ttf')
+    for workers in sorted({1, args.workers}):
+        with tempfile.TemporaryDirectory() as output_dir:
+            _, render_s = timed(lambda: knowledge_creator.save_articles_to_pdf(
+                articles, output_dir, font_path=font_path, workers=workers))
+        print(f'render pool x{workers:<5} {render_s:7.2f} s   {len(articles) / render_s:7.1f} files/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""
+Benchmark of the import of scraped listings into the SQLite database of `PropDb`.
+
+"per-row" is the import before the bulk path, into the former single properties table: a
+SELECT to check whether each property exists, then an UPDATE or an INSERT on both tables and
+a commit per property. "bulk" is `PropDb.import_data`, which upserts batches with `executemany`
+and `INSERT ... ON CONFLICT`, and "bulk fast" the same with `synchronous=OFF` during the load.
+Each path loads the listings into an empty database and then loads them again, when every row
+is an update.
+
+Then a database with the former layout, where every property carries a copy of its project,
+is migrated to the projects and units tables, comparing the size of the tables and the text
+embedded by `RealEstateDataTransformer` before and after.
+
+Last, the same filtered searches are timed over the scraped text columns, the way the
+generated SQL used to filter with `LIKE` and `CAST`, and over the typed, indexed columns
+and the full-text index of the descriptions.
+
+Usage:
+    python benchmarks/bench_propdb.py [--projects N] [--units N]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+
+from normalization import NORMALIZED_COLUMNS, canonical_barrio, normalize_property, parse_number  # noqa: E402
+from sqlite_db import PROPERTY_COLUMNS, PropDb  # noqa: E402
+
+# The same searches over the scraped text columns and over the typed columns
+QUERIES = [
+    ('barrio, rooms, price',
+     "SELECT prop_url FROM properties WHERE prop_location LIKE '%Palermo%' AND CAST(prop_rooms AS INTEGER) = 2 "
+     "AND CAST(REPLACE(REPLACE(prop_price, 'USD ', ''), '.', '') AS REAL) < 200000",
+     "SELECT prop_url FROM properties WHERE barrio = 'Palermo' AND rooms = 2 AND price_usd < 200000"),
+    ('price per m2',
+     "SELECT prop_url FROM properties WHERE CAST(REPLACE(REPLACE(prop_price, 'USD ', ''), '.', '') AS REAL) "
+     "/ CAST(prop_m2 AS REAL) < 700",
+     "SELECT prop_url FROM properties WHERE price_usd_m2 < 700"),
+    ('high floor',
+     "SELECT prop_url FROM properties WHERE CAST(prop_floor AS INTEGER) >= 19",
+     "SELECT prop_url FROM properties WHERE floor >= 19"),
+    ('amenity keywords',
+     "SELECT prop_url FROM properties WHERE (prop_description LIKE '%sauna%' OR project_description LIKE '%sauna%') "
+     "AND (prop_description LIKE '%vestidor%' OR project_description LIKE '%vestidor%')",
+     "SELECT prop_url FROM properties WHERE rowid IN "
+     "(SELECT rowid FROM properties_fts WHERE properties_fts MATCH '\"sauna\"* AND \"vestidor\"*')"),
+]
+
+# Fields as the websites write them, with the values stored in the typed columns
+NORMALIZATION_CASES = [
+    (parse_number, '1.200 m2', 1200),
+    (parse_number, '52,5 m²', 52.5),
+    (parse_number, '1.200,5 m2', 1200.5),
+    (parse_number, '45 m²', 45),
+    (canonical_barrio, 'Palermo Soho, Capital Federal', 'Palermo'),
+    (canonical_barrio, 'Capital Federal', None),
+    (canonical_barrio, 'Centro, CABA', None),
+    (canonical_barrio, 'Buenos Aires', None),
+    (canonical_barrio, 'Olivos, Vicente López', 'Olivos'),
+]
+
+BARRIOS = ['Palermo', 'Belgrano', 'Caballito', 'Villa Crespo', 'Núñez', 'Almagro', 'Colegiales', 'Saavedra']
+AMENITIES = ['pileta', 'parrilla', 'SUM', 'gimnasio', 'solárium', 'laundry', 'sauna', 'bicicletero', 'coworking']
+FEATURES = ['balcón', 'cochera', 'baulera', 'vestidor', 'toilette', 'lavadero', 'terraza propia', 'jardín']
+
+
+def check_normalization():
+    """
+    Check that the typed columns are parsed right before timing the searches over them.
+    """
+    for parse, value, expected in NORMALIZATION_CASES:
+        assert parse(value) == expected, (parse.__name__, value, parse(value), expected)
+
+
+def make_projects(n_projects, n_units, seed=0):
+    """
+    Generate projects shaped like the output of the scrapers.
+    """
+    rng = random.Random(seed)
+    projects = []
+    for i in range(n_projects):
+        barrio = rng.choice(BARRIOS)
+        project_url = f'https://www.argenprop.com/emprendimiento-{i}'
+        projects.append({
+            'project_url': project_url,
+            'project_district': barrio,
+            'project_address': f'Av. Siempreviva {rng.randint(100, 9999)}',
+            'project_description': ('Emprendimiento a estrenar con amenities: ' + ', '.join(rng.sample(AMENITIES, 2)) +
+                                    '. Entrega estimada en 2026, financiación en cuotas. ' * 4),
+            'project_images': [f'https://static.argenprop.com/{i}/{j}.jpg' for j in range(6)],
+            'properties': [{
+                'prop_url': f'{project_url}/departamento-{j}',
+                'prop_address': f'Av. Siempreviva {j}',
+                'prop_floor': f'{rng.randint(1, 20)}°',
+                'prop_price': f'USD {rng.randint(60, 400)}.000',
+                'prop_m2': f'{rng.randint(30, 150)} m²',
+                'prop_rooms': f'{rng.randint(1, 5)} ambientes',
+                'prop_bedrooms': f'{rng.randint(0, 4)} dormitorios',
+                'prop_location': f'{barrio}, Capital Federal',
+                'prop_description': ('Departamento a estrenar, luminoso, con ' + ' y '.join(rng.sample(FEATURES, 2)) +
+                                     '. Cocina integrada y pisos de madera. ' * 4),
+                'prop_images': [f'https://static.argenprop.com/{i}/{j}/{k}.jpg' for k in range(4)],
+            } for j in range(n_units)],
+        })
+    return projects
+
+
+def create_legacy_tables(cursor):
+    """
+    Create the former layout: the properties with a copy of their project, and their images.
+    """
+    cursor.execute(f'''
+    CREATE TABLE properties (
+        {', '.join(f'{column} TEXT' + (' PRIMARY KEY' if column == 'prop_url' else '') for column in PROPERTY_COLUMNS)},
+        {', '.join(f'{name} {sql_type}' for name, sql_type in NORMALIZED_COLUMNS)}
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE prop_images_href (prop_url TEXT UNIQUE, project_url TEXT, prop_images TEXT, project_images TEXT)
+    ''')
+
+
+def legacy_parameters(project, prop):
+    """
+    The rows of a property in the former layout.
+    """
+    normalized = normalize_property(project, prop)
+    parameters = tuple(str(prop.get(column, project.get(column, ''))) for column in PROPERTY_COLUMNS)
+    image_parameters = (prop['prop_url'], project['project_url'], json.dumps(prop['prop_images'], ensure_ascii=False),
+                        json.dumps(project['project_images'], ensure_ascii=False))
+    return parameters + tuple(normalized[name] for name, _ in NORMALIZED_COLUMNS), image_parameters
+
+
+def per_row_import(prop_db, projects):
+    """
+    Import the projects the way `PropDb.insert_or_update_property` did before the bulk path.
+    """
+    cursor = prop_db.cursor
+    for project in projects:
+        for prop in project['properties']:
+            parameters, image_parameters = legacy_parameters(project, prop)
+            # Only the scraped fields, as before the typed columns
+            parameters = parameters[:len(PROPERTY_COLUMNS)]
+            cursor.execute('SELECT 1 FROM properties WHERE prop_url = ?', (prop['prop_url'],))
+            if cursor.fetchone() is not None:
+                cursor.execute('''
+                UPDATE properties
+                SET prop_address = ?, prop_floor = ?, prop_price = ?, prop_m2 = ?, prop_rooms = ?,
+                    prop_bedrooms = ?, prop_location = ?, prop_description = ?,
+                    project_url = ?, project_district = ?, project_address = ?, project_description = ?
+                WHERE prop_url = ?
+                ''', parameters[1:] + parameters[:1])
+                cursor.execute('''
+                UPDATE prop_images_href SET project_url = ?, prop_images = ?, project_images = ?
+                WHERE prop_url = ?
+                ''', image_parameters[1:] + image_parameters[:1])
+            else:
+                cursor.execute(f'''
+                INSERT INTO properties ({', '.join(PROPERTY_COLUMNS)}) VALUES ({', '.join('?' for _ in parameters)})
+                ''', parameters)
+                cursor.execute('''
+                INSERT INTO prop_images_href (prop_url, project_url, prop_images, project_images)
+                VALUES (?, ?, ?, ?)
+                ''', image_parameters)
+            prop_db.conn.commit()
+
+
+def table_bytes(cursor, tables):
+    """
+    The bytes of the pages of some tables, without their indexes.
+    """
+    return cursor.execute(f"SELECT SUM(pgsize) FROM dbstat WHERE name IN ({', '.join('?' for _ in tables)})",
+                          tables).fetchone()[0]
+
+
+def measure(name, projects, load, legacy=False):
+    """
+    Load the projects twice into a new database and print the rows per second of each load.
+    """
+    n_rows = sum(len(project['properties']) for project in projects)
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                prop_db = PropDb(dbname='bench.db')
+                prop_db.connect()
+                if legacy:
+                    create_legacy_tables(prop_db.cursor)
+                else:
+                    prop_db.create_tables()
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    load(prop_db, projects)
+                timings.append(time.perf_counter() - start)
+            rows = prop_db.cursor.execute(f'SELECT COUNT(*) FROM {prop_db.table}').fetchone()[0]
+            with contextlib.redirect_stdout(io.StringIO()):
+                prop_db.close()
+        finally:
+            os.chdir(cwd)
+    assert rows == n_rows, (name, rows, n_rows)
+    print(f'{name:<10} insert {timings[0]:7.2f} s {n_rows / timings[0]:9.0f} rows/s   '
+          f'update {timings[1]:7.2f} s {n_rows / timings[1]:9.0f} rows/s')
+
+
+def measure_layout(projects):
+    """
+    Migrate a database with the former layout and compare the size of the tables and the embedded text.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                prop_db = PropDb(dbname='bench.db')
+                prop_db.connect()
+            cursor = prop_db.cursor
+            create_legacy_tables(cursor)
+            rows = [legacy_parameters(project, prop) for project in projects for prop in project['properties']]
+            cursor.executemany(f"INSERT INTO properties VALUES ({', '.join('?' for _ in rows[0][0])})",
+                               [parameters for parameters, _ in rows])
+            cursor.executemany('INSERT INTO prop_images_href VALUES (?, ?, ?, ?)', [images for _, images in rows])
+            prop_db.conn.commit()
+            legacy_bytes = table_bytes(cursor, ['properties', 'prop_images_href'])
+            # The former transformer embedded both descriptions once per property
+            legacy_docs, legacy_chars = cursor.execute(
+                'SELECT COUNT(*), SUM(LENGTH(prop_description) + 1 + LENGTH(project_description)) FROM properties'
+            ).fetchone()
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                prop_db.create_tables()
+            migration_s = time.perf_counter() - start
+            new_bytes = table_bytes(cursor, [prop_db.projects_table, prop_db.units_table, prop_db.images_table])
+            unit_docs, unit_chars = cursor.execute(
+                f'SELECT COUNT(*), SUM(LENGTH(prop_description)) FROM {prop_db.units_table}').fetchone()
+            project_docs, project_chars = cursor.execute(
+                f"SELECT COUNT(*), SUM(LENGTH(project_description)) FROM {prop_db.projects_table} "
+                f"WHERE project_description != ''").fetchone()
+            with contextlib.redirect_stdout(io.StringIO()):
+                prop_db.close()
+        finally:
+            os.chdir(cwd)
+    print(f'migration  {migration_s:7.2f} s   {len(rows) / migration_s:9.0f} rows/s')
+    print(f'tables     properties {legacy_bytes / 2**20:7.1f} MB   projects + units {new_bytes / 2**20:7.1f} MB'
+          f'   {legacy_bytes / new_bytes:.1f}x smaller')
+    print(f'embedded   {legacy_docs} docs {legacy_chars / 2**20:7.1f} M chars   '
+          f'{unit_docs + project_docs} docs {(unit_chars + project_chars) / 2**20:7.1f} M chars   '
+          f'{legacy_chars / (unit_chars + project_chars):.1f}x less text')
+
+
+def measure_queries(projects, repeat=20):
+    """
+    Time the searches of QUERIES over a database loaded with the projects.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                prop_db = PropDb(dbname='bench.db')
+                prop_db.connect()
+                prop_db.create_tables()
+                prop_db.import_data(projects)
+            for name, text_query, typed_query in QUERIES:
+                timings = []
+                for query in (text_query, typed_query):
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        rows = prop_db.cursor.execute(query).fetchall()
+                    timings.append((time.perf_counter() - start) / repeat * 1000)
+                plan = ' '.join(row[-1] for row in prop_db.cursor.execute(f'EXPLAIN QUERY PLAN {typed_query}'))
+                print(f'{name:<21} text {timings[0]:7.2f} ms   typed {timings[1]:7.2f} ms   {len(rows)} rows   {plan}')
+            with contextlib.redirect_stdout(io.StringIO()):
+                prop_db.close()
+        finally:
+            os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--projects', type=int, default=2000, help='Number of projects.')
+    parser.add_argument('--units', type=int, default=15, help='Number of properties of each project.')
+    args = parser.parse_args()
+
+    check_normalization()
+    projects = make_projects(args.projects, args.units)
+    print(f'{args.projects} projects, {args.projects * args.units} properties')
+    measure('per-row', projects, per_row_import, legacy=True)
+    measure('bulk', projects, lambda prop_db, projects: prop_db.import_data(projects))
+    measure('bulk fast', projects, lambda prop_db, projects: prop_db.import_data(projects, fast=True))
+    measure_layout(projects)
+    measure_queries(projects)
+
+
+if __name__ == '__main__':
+    main()
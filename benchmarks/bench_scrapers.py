@@ -0,0 +1,115 @@
+"""
+End-to-end benchmark of the scrapers against the offline fixture corpus.
+
+Every request is served by `replay.ReplayAdapter` from `benchmarks/fixtures`, so the
+numbers measure the scrapers themselves and never touch a live website. For each
+scraper it reports the pages fetched, pages/s, CPU ms per page (parsing and extraction,
+since replayed requests cost almost nothing) and the peak RSS of the process so far.
+
+Usage:
+    python benchmarks/bench_scrapers.py [--corpus DIR] [--workers N] [--repeat N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
+
+from argenprop_scraper import ArgenPropData  # noqa: E402
+from autoscraper_prop import AutoScraperProp  # noqa: E402
+from browser import Browser  # noqa: E402
+from fetch_policy import FetchPolicy  # noqa: E402
+from fetcher import Fetcher  # noqa: E402
+from knowledge_creator import KnowledgeCreator  # noqa: E402
+from property_scraper import PropertyScraper  # noqa: E402
+from replay import FixtureCorpus, mount_replay  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def peak_rss_mb():
+    """
+    Get the peak resident set size of the process in MB.
+    """
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def replay_fetcher(corpus, workers):
+    """
+    Create an uncached fetcher whose session is served by the corpus. The default per-host
+    rate limit is lifted, since replayed requests never reach the website.
+    """
+    fetcher = Fetcher(per_host_limit=workers, pool_size=workers, policy=FetchPolicy(rate=None))
+    mount_replay(fetcher.session, corpus)
+    return fetcher
+
+
+def measure(name, fetcher, run):
+    """
+    Run a scraper silently and print its throughput.
+    """
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+    wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+    pages = max(fetcher.pages, 1)
+    print(f'{name:<40} {fetcher.pages:6d} pages {pages / wall:9.1f} pages/s '
+          f'{cpu * 1000 / pages:8.2f} ms/page   peak RSS {peak_rss_mb():6.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--corpus', default=CORPUS, help='The fixture corpus directory.')
+    parser.add_argument('--workers', type=int, default=4, help='Workers for the concurrent Argenprop crawl.')
+    parser.add_argument('--repeat', type=int, default=5, help='Times each fixture URL list is crawled.')
+    args = parser.parse_args()
+
+    corpus = FixtureCorpus(args.corpus)
+    project_urls = [url for url in corpus.manifest if '/emprendimientos/emprendimiento-en-' in url]
+    listing_pages = sum(1 for url in corpus.manifest if 'capital-federal?pagina-' in url)
+
+    for workers in sorted({1, args.workers}):
+        fetcher = replay_fetcher(corpus, workers)
+        apd = ArgenPropData(list_of_urls=project_urls * args.repeat, fetcher=fetcher, apply_rates=False)
+        measure(f'ArgenPropData ({workers} workers)', fetcher, lambda: apd.compile_project_data(workers=workers))
+
+    fetcher = replay_fetcher(corpus, args.workers)
+    # The rates of the sources are not applied either
+    scraper = PropertyScraper(list_of_urls=project_urls * args.repeat, fetcher=fetcher, apply_rates=False)
+    measure(f'PropertyScraper ({args.workers} workers)', fetcher,
+            lambda: scraper.compile_project_data(workers=args.workers))
+
+    fetcher = replay_fetcher(corpus, 1)
+    autoscraper = AutoScraperProp(fetcher=fetcher, models_dir=tempfile.mkdtemp(), apply_rates=False)
+
+    def discover():
+        for _ in range(args.repeat):
+            autoscraper.get_urls_from_website(source='argenprop', number_of_pages=listing_pages)
+
+    measure('AutoScraperProp.get_urls_from_website', fetcher, discover)
+
+    article_urls = os.path.join(args.corpus, 'article_urls.txt')
+    for workers in sorted({1, args.workers}):
+        fetcher = replay_fetcher(corpus, workers)
+        knowledge_creator = KnowledgeCreator(browser=Browser(fetcher=fetcher))
+
+        def ingest():
+            for _ in range(args.repeat):
+                knowledge_creator.create_article_dicts(list_of_files=[article_urls], workers=workers)
+
+        measure(f'KnowledgeCreator ({workers} workers)', fetcher, ingest)
+
+
+if __name__ == '__main__':
+    main()
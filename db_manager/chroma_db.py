@@ -1,12 +1,94 @@
+import json
 import os
-import fitz
+from concurrent.futures import ProcessPoolExecutor
+from document_store import DocumentStore, text_hash
+from near_duplicates import NearDuplicateFilter
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_text_splitters import CharacterTextSplitter
 
+try:
+    import fitz
+except ImportError:  # PyMuPDF is only needed to index the PDF files
+    fitz = None
+
+# Files extracted by each process of the pool at least; smaller batches are extracted
+# serially, as starting the processes costs more than they save
+MIN_PDFS_PER_WORKER = 64
+
+# The text splitter and page buffer size of the extraction worker processes, set once per process by _init_extract_worker
+_extract_config = None
+
+
+def iter_pdf_pages(doc):
+    with fitz.open(doc) as pdf_document:
+        for page in pdf_document:
+            yield page.get_text()
+
+
+def iter_chunks(pages, splitter, buffer_size):
+    """
+    Splits a stream of page texts into chunks without joining the whole document first.
+
+    The pages are buffered until `buffer_size` characters; the chunks of the buffer are yielded
+    except the last one, whose text is kept to be merged with the next pages.
+    """
+    buffer = ''
+    for text in pages:
+        buffer += text
+        if len(buffer) >= buffer_size:
+            chunks = splitter.split_text(buffer)
+            if len(chunks) > 1:
+                yield from chunks[:-1]
+                buffer = buffer[buffer.rfind(chunks[-1]):]
+    if buffer:
+        yield from splitter.split_text(buffer)
+
+
+def _init_extract_worker(chunk_size, overlap_size):
+    global _extract_config
+    _extract_config = (CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap_size), 4 * chunk_size)
+
+
+def _extract_pdf_chunks(doc):
+    splitter, buffer_size = _extract_config
+    try:
+        return list(iter_chunks(iter_pdf_pages(doc), splitter, buffer_size))
+    except Exception as e:
+        print(f"Error loading {doc}: {e}")
+        return []
+
+
+def iter_pdf_chunks(list_of_pdfs, chunk_size, overlap_size, workers=None):
+    """
+    Yields each PDF file with its chunks, extracted and split in a pool of `workers` processes
+    (one per core by default), in the order of `list_of_pdfs`. Fewer processes are started when
+    there are not `MIN_PDFS_PER_WORKER` files for each.
+    """
+    if fitz is None:
+        raise ImportError("PyMuPDF is required to index PDF files: pip install pymupdf")
+    workers = min(workers or os.cpu_count() or 1, len(list_of_pdfs) // MIN_PDFS_PER_WORKER)
+    if workers <= 1:
+        _init_extract_worker(chunk_size, overlap_size)
+        yield from zip(list_of_pdfs, map(_extract_pdf_chunks, list_of_pdfs))
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker,
+                             initargs=(chunk_size, overlap_size)) as pool:
+        yield from zip(list_of_pdfs, pool.map(_extract_pdf_chunks, list_of_pdfs))
+
+
 class VectorDBManager:
-    def __init__(self, pdf_directory='data/processed/pdf_files', db_directory='data/db/chroma_db', chunk_size=500, overlap_size=125):
+    def __init__(self, pdf_directory='data/processed/pdf_files', db_directory='data/db/chroma_db', chunk_size=500, overlap_size=125,
+                 document_store=None, batch_size=512, dedup=True, document_threshold=0.8, chunk_threshold=0.8):
+        # With a document store the texts are read from it instead of extracted from the PDF files
         self.pdf_directory = pdf_directory
+        self.document_store = document_store
+        self.batch_size = batch_size
+        # Near duplicate documents and chunks are dropped before embedding, see NearDuplicateFilter
+        self.dedup = dedup
+        self.document_threshold = document_threshold
+        self.chunk_threshold = chunk_threshold
+        self.dedup_report = {'documents': [], 'chunks': []}
         self.db_directory = db_directory
         self.chunk_size = chunk_size
         self.overlap_size = overlap_size
@@ -23,13 +105,10 @@ class VectorDBManager:
         return pdf_files
     
     def text_loader(self, doc):
+        if fitz is None:
+            raise ImportError("PyMuPDF is required to index PDF files: pip install pymupdf")
         try:
-            with fitz.open(doc) as pdf_document:
-                text = ""
-                for page_num in range(len(pdf_document)):
-                    page = pdf_document.load_page(page_num)
-                    text += page.get_text()
-            return text
+            return ''.join(iter_pdf_pages(doc))
         except Exception as e:
             print(f"Error loading {doc}: {e}")
             return ""
@@ -45,17 +124,129 @@ class VectorDBManager:
             persist_directory = self.db_directory
         db = Chroma.from_texts(texts=chunks, embedding=embedding_function, persist_directory=persist_directory)
 
-    def process_and_save_chunks(self):
+    def near_duplicate_filters(self):
+        if not self.dedup:
+            return None, None
+        return NearDuplicateFilter(threshold=self.document_threshold), NearDuplicateFilter(threshold=self.chunk_threshold)
+
+    def unique_chunks(self, key, splits, chunk_filter):
+        """
+        Drops the chunks of a document that are near duplicates of the chunks indexed before.
+
+        Returns:
+            list: Pairs of the position of each chunk kept in the document and its text.
+        """
+        if chunk_filter is None:
+            return list(enumerate(splits))
+        return [(idx, chunk) for idx, chunk in enumerate(splits) if chunk_filter.add(f'{key}#{idx}', chunk) is None]
+
+    def report_duplicates(self, document_filter, chunk_filter, output_file=None):
+        """
+        Prints how many near duplicate documents and chunks were dropped, and saves them to `output_file` as JSON.
+        """
+        if document_filter is None:
+            return
+        self.dedup_report = {'documents': document_filter.dropped, 'chunks': chunk_filter.dropped}
+        print(f"Near duplicates dropped: {len(document_filter.dropped)} documents, {len(chunk_filter.dropped)} chunks.")
+        if output_file is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(self.dedup_report, f, indent=4, ensure_ascii=False)
+
+    def process_documents(self, source=None, reindex=False, dedup_report_file=None):
+        """
+        Embeds the documents of the document store that are new or changed since they were last indexed.
+
+        The chunks of a document are stored with its url and source as metadata and with ids derived
+        from the hashes of its url and its text, so two urls with the same text never share a chunk,
+        and the chunks of its previous version are deleted first. Documents are
+        embedded `batch_size` chunks at a time and marked as indexed once their batch is loaded.
+
+        Near duplicates of a document, or of a chunk, indexed before are dropped; the documents
+        already indexed by previous runs are seen first, so a new copy never replaces them. The
+        dropped documents are marked as indexed too, and only come back when their text changes.
+        """
+        pending_urls = self.document_store.pending(source=source, reindex=reindex)
+        print(f"{len(pending_urls)} documents to index.")
+        document_filter, chunk_filter = self.near_duplicate_filters()
+        if document_filter is not None:
+            pending = set(pending_urls)
+            for url, text in sorted(self.document_store.texts().items()):
+                if url not in pending and document_filter.add(url, text) is None:
+                    self.unique_chunks(url, self.split_text(text), chunk_filter)
+            # Only the duplicates among the pending documents are reported
+            document_filter.dropped.clear()
+            chunk_filter.dropped.clear()
+        db = Chroma(persist_directory=self.db_directory, embedding_function=self.embedding_model)
+        doc_chunks_to_chroma = []
+        batch, indexed = {'texts': [], 'metadatas': [], 'ids': []}, []
+
+        def flush():
+            if batch['texts']:
+                db.add_texts(**batch)
+            for url, content_hash in indexed:
+                self.document_store.mark_indexed(url, content_hash)
+            for values in batch.values():
+                values.clear()
+            indexed.clear()
+
+        for url in pending_urls:
+            document = self.document_store.get(url)
+            if document['indexed_hash'] is not None:
+                stale_ids = db.get(where={'url': url})['ids']
+                if stale_ids:
+                    db.delete(ids=stale_ids)
+            indexed.append((url, document['content_hash']))
+            if document_filter is not None and document_filter.add(url, document['text']) is not None:
+                continue
+            chunks = self.unique_chunks(url, self.split_text(document['text']), chunk_filter)
+            batch['texts'].extend(chunk for _, chunk in chunks)
+            batch['metadatas'].extend({'url': url, 'source': document['source']} for _ in chunks)
+            url_hash = text_hash(url)[:16]
+            batch['ids'].extend(f"{url_hash}:{document['content_hash']}:{idx}" for idx, _ in chunks)
+            doc_chunks_to_chroma.extend(chunk for _, chunk in chunks)
+            if len(batch['texts']) >= self.batch_size:
+                flush()
+        flush()
+        self.report_duplicates(document_filter, chunk_filter, dedup_report_file)
+        return doc_chunks_to_chroma
+
+    def process_and_save_chunks(self, workers=None, dedup_report_file=None):
+        if self.document_store is not None:
+            return self.process_documents(dedup_report_file=dedup_report_file)
         list_of_pdfs = self.get_all_pdf_files()
         doc_chunks_to_chroma = []
-        for doc in list_of_pdfs:
-            text = self.text_loader(doc)
-            if text:
-                splits = self.split_text(text)
+        document_filter, chunk_filter = self.near_duplicate_filters()
+        for doc, splits in iter_pdf_chunks(list_of_pdfs, self.chunk_size, self.overlap_size, workers=workers):
+            if document_filter is not None and document_filter.add(doc, '\n'.join(splits)) is not None:
+                continue
+            splits = [chunk for _, chunk in self.unique_chunks(doc, splits, chunk_filter)]
+            if splits:
                 doc_chunks_to_chroma.extend(splits)
                 self.load_to_chroma(splits, self.embedding_model, self.db_directory)
+        self.report_duplicates(document_filter, chunk_filter, dedup_report_file)
         return doc_chunks_to_chroma
 
 if __name__ == "__main__":
-    vector_db_manager = VectorDBManager()
-    doc_chunks_to_chroma = vector_db_manager.process_and_save_chunks()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Embed the scraped documents into the Chroma vector index.')
+    parser.add_argument('--from-pdfs', action='store_true', help='Extract the texts from the PDF files instead of the document store.')
+    parser.add_argument('--reindex', action='store_true', help='Embed again the documents already indexed.')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes extracting the PDF files (default: one per core).')
+    parser.add_argument('--no-dedup', action='store_true', help='Embed the near duplicate documents and chunks too.')
+    parser.add_argument('--dedup-report', default='data/processed/dedup_report.json', help='JSON file listing the near duplicates dropped.')
+    parser.add_argument('--source', default=None, help='Only index the documents of this source (article, search, transcript).')
+    args = parser.parse_args()
+
+    if args.from_pdfs:
+        vector_db_manager = VectorDBManager(dedup=not args.no_dedup)
+        doc_chunks_to_chroma = vector_db_manager.process_and_save_chunks(workers=args.workers,
+                                                                         dedup_report_file=args.dedup_report)
+    else:
+        store = DocumentStore()
+        vector_db_manager = VectorDBManager(document_store=store, dedup=not args.no_dedup)
+        doc_chunks_to_chroma = vector_db_manager.process_documents(source=args.source, reindex=args.reindex,
+                                                                   dedup_report_file=args.dedup_report)
+        store.close()
+    print(f"{len(doc_chunks_to_chroma)} chunks loaded to Chroma.")
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+SPACES_PATTERN = re.compile(r'[ \t\r\f\v]+')
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n\s*')
+# When two sources store the same URL, the text of the first one in this list is kept: a full
+# article is better than the snippet of a search result
+SOURCE_PRECEDENCE = ['article', 'transcript', 'search']
+
+
+def normalize_text(text):
+    """
+    Normalize the text of a document: NFC unicode, single spaces and at most one blank line between paragraphs.
+    """
+    text = unicodedata.normalize('NFC', text)
+    text = SPACES_PATTERN.sub(' ', text)
+    return BLANK_LINES_PATTERN.sub('\n\n', text).strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _precedence(column):
+    # Sources missing from SOURCE_PRECEDENCE come after all the listed ones
+    cases = ' '.join(f"WHEN '{source}' THEN {rank}" for rank, source in enumerate(SOURCE_PRECEDENCE))
+    return f'(CASE {column} {cases} ELSE {len(SOURCE_PRECEDENCE)} END)'
+
+
+class DocumentStore:
+    """
+    The canonical text of the scraped documents: advice articles, search results and video transcripts.
+
+    The scrapers write the normalized text of each document once, keyed by its URL, and
+    `VectorDBManager` reads it from here instead of extracting it back from PDFs. The hash of
+    the text last embedded is kept, so only new and changed documents are indexed again.
+
+    Attributes:
+        path (str): The path of the SQLite database.
+
+    Methods:
+        upsert(url, text, source, title): Store a document, returning whether its text changed.
+        upsert_many(documents): Store several documents.
+        get(url): Get a document.
+        texts(source): Get the text of every document of a source.
+        pending(source, reindex): List the URLs of the documents to index.
+        mark_indexed(url, content_hash): Record that a version of a document was indexed.
+        counts(): Count the documents of each source.
+        close(): Close the database.
+    """
+
+    def __init__(self, path='data/processed/documents.sqlite'):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS documents (
+            url TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            title TEXT,
+            text TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            indexed_hash TEXT,
+            updated_at REAL
+        )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS documents_source ON documents (source)')
+        self.conn.commit()
+
+    def upsert(self, url, text, source, title=None):
+        """
+        Store the normalized text of a document. Empty texts are not stored, and neither is the
+        text of a URL already stored by a source with a higher SOURCE_PRECEDENCE, so two sources
+        do not overwrite each other's text and the document is not embedded again on every run.
+
+        Args:
+            url (str): The URL of the document.
+            text (str): The text.
+            source (str): The kind of document, e.g. 'article' or 'transcript'.
+            title (str, optional): The title of the document.
+
+        Returns:
+            bool: True if the document is new or its text changed.
+        """
+        text = normalize_text(text or '')
+        if not text:
+            return False
+        content_hash = text_hash(text)
+        with self._lock:
+            cursor = self.conn.execute(f'''
+            INSERT INTO documents (url, source, title, text, content_hash, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET source = excluded.source, title = COALESCE(excluded.title, title),
+                text = excluded.text, content_hash = excluded.content_hash, updated_at = excluded.updated_at
+            WHERE content_hash != excluded.content_hash
+                AND {_precedence('excluded.source')} <= {_precedence('documents.source')}
+            ''', (url, source, title, text, content_hash, time.time()))
+            self.conn.commit()
+            return cursor.rowcount > 0
+
+    def upsert_many(self, documents):
+        """
+        Store several documents.
+
+        Args:
+            documents (iterable): Dictionaries with the 'url', 'text' and 'source' of each
+                document, and optionally its 'title'.
+
+        Returns:
+            int: The number of new or changed documents.
+        """
+        return sum(self.upsert(document['url'], document['text'], document['source'], document.get('title'))
+                   for document in documents)
+
+    def get(self, url):
+        """
+        Get a document.
+
+        Returns:
+            dict: The columns of the document, or None if it is not stored.
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT * FROM documents WHERE url = ?', (url,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def texts(self, source=None):
+        """
+        Get the text of every document, e.g. to skip the documents already scraped.
+
+        Returns:
+            dict: The text of each document, keyed by its URL.
+        """
+        query, args = 'SELECT url, text FROM documents', ()
+        if source is not None:
+            query, args = query + ' WHERE source = ?', (source,)
+        with self._lock:
+            return {row['url']: row['text'] for row in self.conn.execute(query, args)}
+
+    def pending(self, source=None, reindex=False):
+        """
+        List the URLs of the documents whose current text has not been indexed.
+
+        Args:
+            source (str, optional): Only list the documents of this source.
+            reindex (bool): If True, list every document.
+
+        Returns:
+            list: The URLs.
+        """
+        conditions, args = [], []
+        if not reindex:
+            conditions.append('(indexed_hash IS NULL OR indexed_hash != content_hash)')
+        if source is not None:
+            conditions.append('source = ?')
+            args.append(source)
+        query = 'SELECT url FROM documents' + (' WHERE ' + ' AND '.join(conditions) if conditions else '')
+        with self._lock:
+            return [row['url'] for row in self.conn.execute(query + ' ORDER BY url', args)]
+
+    def mark_indexed(self, url, content_hash):
+        """
+        Record that a version of a document was embedded into the vector index.
+        """
+        with self._lock:
+            self.conn.execute('UPDATE documents SET indexed_hash = ? WHERE url = ?', (content_hash, url))
+            self.conn.commit()
+
+    def counts(self):
+        """
+        Count the documents of each source.
+
+        Returns:
+            dict: The number of documents, keyed by source.
+        """
+        with self._lock:
+            return {row['source']: row['n'] for row in
+                    self.conn.execute('SELECT source, COUNT(*) AS n FROM documents GROUP BY source')}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,147 @@
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r'\w+')
+# Hashes are permuted modulo a Mersenne prime larger than any 32-bit shingle hash
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+
+def shingle_hashes(text, size=5):
+    """
+    Hash the word shingles of a text, after folding case and accents.
+
+    Args:
+        text (str): The text.
+        size (int): The number of words of each shingle.
+
+    Returns:
+        numpy.ndarray: The distinct 32-bit hashes of the shingles. Texts shorter than `size`
+            words have a single shingle, and texts without words none.
+    """
+    text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+    words = WORD_PATTERN.findall(text)
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    shingles = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return np.fromiter((zlib.crc32(shingle.encode('ascii')) for shingle in shingles), dtype=np.uint64,
+                       count=len(shingles))
+
+
+def lsh_bands(threshold, num_perm):
+    """
+    Choose the number of bands and rows of the LSH index whose S-curve rises at `threshold`.
+
+    Returns:
+        tuple: The number of bands and the number of rows of each band.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+class NearDuplicateFilter:
+    """
+    Detects the near duplicate texts of a corpus with MinHash signatures and an LSH index.
+
+    Each text is reduced to the minimum hashes of its word shingles under `num_perm` random
+    permutations. Texts whose signatures agree on every row of some band are candidates, and a
+    candidate is a duplicate when the share of equal hashes, an estimate of the Jaccard similarity
+    of their shingles, reaches `threshold`. The first text of each group of duplicates is kept.
+
+    Attributes:
+        threshold (float): Minimum estimated Jaccard similarity between two duplicates, from 0 to 1.
+        num_perm (int): The number of hashes of each signature.
+        shingle_size (int): The number of words of each shingle.
+        dropped (list): The duplicates found so far, as dictionaries with the 'key' of the
+            duplicate, the key it is a 'duplicate_of' and their 'similarity'.
+
+    Methods:
+        signature(text): Compute the MinHash signature of a text.
+        find_duplicate(text): Find an indexed text that is a near duplicate.
+        add(key, text): Index a text, returning the key of the text it duplicates if any.
+        deduplicate(items): Keep the first text of each group of duplicates.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=5, seed=1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.dropped = []
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        rng = np.random.RandomState(seed)
+        # Below 2**32 so the products with the 32-bit hashes do not overflow 64 bits
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = {}
+
+    def signature(self, text):
+        """
+        Compute the MinHash signature of a text.
+
+        Returns:
+            numpy.ndarray: The `num_perm` minimum hashes, or None if the text has no words.
+        """
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not len(hashes):
+            return None
+        return ((np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME).min(axis=0)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _find(self, signature, band_keys):
+        best_key, best_similarity = None, 0.0
+        candidates = {key for bucket, band_key in zip(self._buckets, band_keys) for key in bucket.get(band_key, ())}
+        for key in candidates:
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= self.threshold and similarity > best_similarity:
+                best_key, best_similarity = key, similarity
+        return best_key, best_similarity
+
+    def find_duplicate(self, text):
+        """
+        Find an indexed text that is a near duplicate of a text.
+
+        Returns:
+            tuple: The key of the most similar duplicate and the estimated similarity, or
+                (None, 0.0) if there is none.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None, 0.0
+        return self._find(signature, self._band_keys(signature))
+
+    def add(self, key, text):
+        """
+        Index a text unless it is a near duplicate of an indexed one.
+
+        Returns:
+            str: The key of the text it duplicates, or None if it was indexed.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        band_keys = self._band_keys(signature)
+        duplicate_of, similarity = self._find(signature, band_keys)
+        if duplicate_of is not None:
+            self.dropped.append({'key': key, 'duplicate_of': duplicate_of, 'similarity': round(similarity, 3)})
+            return duplicate_of
+        self._signatures[key] = signature
+        for bucket, band_key in zip(self._buckets, band_keys):
+            bucket.setdefault(band_key, []).append(key)
+        return None
+
+    def deduplicate(self, items):
+        """
+        Keep the first text of each group of near duplicates.
+
+        Args:
+            items (iterable): Pairs of a key and a text.
+
+        Returns:
+            list: The pairs that are not a duplicate of an earlier one.
+        """
+        return [(key, text) for key, text in items if self.add(key, text) is None]
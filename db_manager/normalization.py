@@ -0,0 +1,209 @@
+import math
+import re
+import unicodedata
+
+PRICE_PATTERN = re.compile(r'(u\$?s|usd|\$)?\s*(\d[\d.,]*)', re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)*(?:,\d+)?')
+GROUND_FLOOR_PATTERN = re.compile(r'\b(?:pb|planta baja)\b')
+MONOAMBIENTE_PATTERN = re.compile(r'\bmono\s*ambiente\b')
+
+# The 48 barrios of the City of Buenos Aires
+BARRIOS = [
+    'Agronomía', 'Almagro', 'Balvanera', 'Barracas', 'Belgrano', 'Boedo', 'Caballito', 'Chacarita', 'Coghlan',
+    'Colegiales', 'Constitución', 'Flores', 'Floresta', 'La Boca', 'La Paternal', 'Liniers', 'Mataderos',
+    'Monte Castro', 'Montserrat', 'Nueva Pompeya', 'Núñez', 'Palermo', 'Parque Avellaneda', 'Parque Chacabuco',
+    'Parque Chas', 'Parque Patricios', 'Puerto Madero', 'Recoleta', 'Retiro', 'Saavedra', 'San Cristóbal',
+    'San Nicolás', 'San Telmo', 'Vélez Sársfield', 'Versalles', 'Villa Crespo', 'Villa del Parque', 'Villa Devoto',
+    'Villa General Mitre', 'Villa Lugano', 'Villa Luro', 'Villa Ortúzar', 'Villa Pueyrredón', 'Villa Real',
+    'Villa Riachuelo', 'Villa Santa Rita', 'Villa Soldati', 'Villa Urquiza',
+]
+# Neighbourhood names used by the listings that are part of an official barrio
+BARRIO_ALIASES = {
+    'palermo soho': 'Palermo', 'palermo hollywood': 'Palermo', 'palermo chico': 'Palermo',
+    'palermo viejo': 'Palermo', 'palermo nuevo': 'Palermo', 'las canitas': 'Palermo',
+    'belgrano r': 'Belgrano', 'belgrano c': 'Belgrano', 'bajo belgrano': 'Belgrano',
+    'barrio norte': 'Recoleta', 'once': 'Balvanera', 'congreso': 'Balvanera', 'abasto': 'Balvanera',
+    'monserrat': 'Montserrat', 'boca': 'La Boca', 'paternal': 'La Paternal', 'pompeya': 'Nueva Pompeya',
+    'microcentro': 'San Nicolás', 'tribunales': 'San Nicolás', 'villa gral mitre': 'Villa General Mitre',
+    'velez sarsfield': 'Vélez Sársfield',
+}
+# Names of the City of Buenos Aires, without accents, which say nothing about the barrio
+CITY_NAMES = {'capital federal', 'caba', 'c.a.b.a.', 'ciudad autonoma de buenos aires', 'ciudad de buenos aires'}
+# Names of the provinces, and of the country, without accents, which are not barrios either
+PROVINCE_NAMES = {
+    'argentina', 'buenos aires', 'catamarca', 'chaco', 'chubut', 'cordoba', 'corrientes', 'entre rios', 'formosa',
+    'jujuy', 'la pampa', 'la rioja', 'mendoza', 'misiones', 'neuquen', 'rio negro', 'salta', 'san juan', 'san luis',
+    'santa cruz', 'santa fe', 'santiago del estero', 'tierra del fuego', 'tucuman',
+}
+
+# The typed columns computed from the scraped text fields, with their SQLite types
+NORMALIZED_COLUMNS = [
+    ('price_amount', 'REAL'),
+    ('price_currency', 'TEXT'),
+    ('price_usd', 'REAL'),
+    ('price_usd_m2', 'REAL'),
+    ('surface_m2', 'REAL'),
+    ('rooms', 'INTEGER'),
+    ('bedrooms', 'INTEGER'),
+    ('floor', 'INTEGER'),
+    ('barrio', 'TEXT'),
+]
+
+
+def fold(text):
+    """
+    Lowercase a text and strip its accents.
+    """
+    return unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode('ascii')
+
+
+_BARRIO_NAMES = {fold(barrio): barrio for barrio in BARRIOS}
+_BARRIO_NAMES.update(BARRIO_ALIASES)
+# Longest names first, so 'palermo soho' wins over 'palermo' and 'villa crespo' over 'villa'
+BARRIO_PATTERN = re.compile(r'\b(' + '|'.join(re.escape(name) for name in
+                                             sorted(_BARRIO_NAMES, key=len, reverse=True)) + r')\b')
+
+
+def _text(value):
+    """
+    Get the text of a scraped field, or None if it is missing ('nan', empty or NaN).
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    value = str(value).strip()
+    return value if value and value.lower() != 'nan' else None
+
+
+def parse_price(price):
+    """
+    Parse a price like 'USD 118.500' or '$ 95.000.000'.
+
+    Returns:
+        tuple: The amount and the currency ('USD' or 'ARS'), or (None, None) if the price is unknown.
+    """
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return (float(price), 'USD') if price > 0 else (None, None)
+    text = _text(price)
+    match = PRICE_PATTERN.search(text) if text else None
+    if match is None:
+        return None, None
+    digits = re.sub(r'[.,](\d{3})(?!\d)', r'\1', match.group(2)).replace(',', '.')
+    try:
+        amount = float(digits)
+    except ValueError:
+        return None, None
+    currency = 'ARS' if match.group(1) == '$' else 'USD'
+    return (amount, currency) if amount > 0 else (None, None)
+
+
+def parse_number(value):
+    """
+    Parse the first number of a field, e.g. 52.5 from '52,5 m²' or 1200 from '1.200 m2'.
+
+    A '.' followed by three digits separates thousands, as in the prices; any other '.' or ','
+    is the decimal point.
+
+    Returns:
+        float: The number, or None if there is none.
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return None if math.isnan(value) else float(value)
+    text = _text(value)
+    match = NUMBER_PATTERN.search(text) if text else None
+    if match is None:
+        return None
+    digits = re.sub(r'\.(\d{3})(?!\d)', r'\1', match.group()).replace(',', '.')
+    try:
+        return float(digits)
+    except ValueError:
+        return None
+
+
+def parse_count(value, monoambiente=1):
+    """
+    Parse a number of rooms or bedrooms, e.g. 2 from '2 ambientes'.
+
+    Args:
+        value: The field.
+        monoambiente (int): The count of a field that says 'monoambiente': one room, no bedrooms.
+
+    Returns:
+        int: The count, or None if it is unknown.
+    """
+    text = _text(value)
+    if text and MONOAMBIENTE_PATTERN.search(fold(text)):
+        return monoambiente
+    number = parse_number(value)
+    return int(number) if number is not None else None
+
+
+def parse_floor(value):
+    """
+    Parse a floor like 'Piso 5', '12°' or 'PB', the ground floor being 0.
+
+    Returns:
+        int: The floor, or None if it is unknown.
+    """
+    text = _text(value)
+    if text and GROUND_FLOOR_PATTERN.search(fold(text)):
+        return 0
+    number = parse_number(value)
+    return int(number) if number is not None else None
+
+
+def canonical_barrio(*locations):
+    """
+    Get the barrio of a listing from its location fields, tried in order.
+
+    Official barrios and the neighbourhood names the listings use for them are recognized
+    anywhere in a field, e.g. 'Palermo Soho, Capital Federal' is 'Palermo'. Outside the city
+    the first part of the first location is used, e.g. 'Olivos' for 'Olivos, Vicente López',
+    unless it is a province. A location in the city without a known barrio, e.g. 'Capital
+    Federal', has none.
+
+    Returns:
+        str: The barrio, or None if it is unknown.
+    """
+    locations = [text for text in map(_text, locations) if text]
+    for location in locations:
+        match = BARRIO_PATTERN.search(fold(location))
+        if match:
+            return _BARRIO_NAMES[match.group(1)]
+    for location in locations:
+        parts = [part.strip() for part in fold(location).split(',')]
+        if any(part in CITY_NAMES for part in parts):
+            continue
+        if parts[0] and parts[0] not in PROVINCE_NAMES:
+            return location.split(',')[0].strip().title()
+    return None
+
+
+def normalize_property(project_data, prop_data, ars_per_usd=None):
+    """
+    Compute the typed columns of a property from its scraped fields.
+
+    Args:
+        project_data (dict): The project the property belongs to.
+        prop_data (dict): The property.
+        ars_per_usd (float, optional): The exchange rate used to price in USD the properties
+            listed in pesos. Without it their USD price is unknown.
+
+    Returns:
+        dict: The value of each of the NORMALIZED_COLUMNS, None where it is unknown.
+    """
+    amount, currency = parse_price(prop_data.get('prop_price'))
+    price_usd = amount if currency == 'USD' else (amount / ars_per_usd if amount and ars_per_usd else None)
+    surface_m2 = parse_number(prop_data.get('prop_m2'))
+    if not surface_m2:
+        surface_m2 = None
+    return {
+        'price_amount': amount,
+        'price_currency': currency,
+        'price_usd': price_usd,
+        'price_usd_m2': round(price_usd / surface_m2, 2) if price_usd and surface_m2 else None,
+        'surface_m2': surface_m2,
+        'rooms': parse_count(prop_data.get('prop_rooms')),
+        'bedrooms': parse_count(prop_data.get('prop_bedrooms'), monoambiente=0),
+        'floor': parse_floor(prop_data.get('prop_floor')),
+        'barrio': canonical_barrio(prop_data.get('prop_location'), project_data.get('project_district')),
+    }
@@ -1,14 +1,65 @@
 import json
 import sqlite3
 import os
+import re
+from normalization import NORMALIZED_COLUMNS, fold, normalize_property
+
+# The scraped fields of a property, stored as they were scraped and returned by the properties view
+PROPERTY_COLUMNS = [
+    'prop_url', 'prop_address', 'prop_floor', 'prop_price', 'prop_m2', 'prop_rooms', 'prop_bedrooms',
+    'prop_location', 'prop_description', 'project_url', 'project_district', 'project_address', 'project_description'
+]
+# The fields of a project, stored once in the projects table instead of on each of its properties
+PROJECT_COLUMNS = ['project_url', 'project_district', 'project_address', 'project_description']
+# The fields stored in the units table: those of the property and the URL of its project
+UNIT_COLUMNS = [column for column in PROPERTY_COLUMNS if column not in PROJECT_COLUMNS[1:]]
+NORMALIZED_COLUMN_NAMES = [name for name, _ in NORMALIZED_COLUMNS]
+# B-tree indexes on the typed columns, so filtered searches are index lookups
+NORMALIZED_INDEXES = {
+    'barrio_rooms_price': ('barrio', 'rooms', 'price_usd'),
+    'price_usd': ('price_usd',),
+    'price_usd_m2': ('price_usd_m2',),
+    'surface_m2': ('surface_m2',),
+    'rooms': ('rooms',),
+    'bedrooms': ('bedrooms',),
+    'floor': ('floor',),
+}
+# The description columns indexed for full-text search
+FTS_COLUMNS = ['prop_description', 'project_description']
+FTS_WORD_PATTERN = re.compile(r'\w+')
+
+
+def fts_match(keywords, operator='AND'):
+    """Builds an FTS5 MATCH expression that finds the descriptions with all (or any) of the keywords.
+
+    The index folds case and accents, and Spanish plurals are reduced to prefixes of their
+    singular, so 'balcones' finds 'balcón' and 'cocheras' finds 'cochera'. Words of up to
+    three letters, like 'SUM', must match exactly.
+    """
+    terms = []
+    for word in FTS_WORD_PATTERN.findall(fold(' '.join(keywords) if isinstance(keywords, (list, tuple)) else keywords)):
+        if len(word) > 5 and word.endswith('es') and word[-3] not in 'aeious':
+            word = word[:-2]
+        elif len(word) > 4 and word.endswith('s'):
+            word = word[:-1]
+        terms.append(f'"{word}"*' if len(word) > 3 else f'"{word}"')
+    return f' {operator} '.join(terms)
 
 class PropDb:
-    def __init__(self, dbname='brickland.db', table='properties'):
+    def __init__(self, dbname='brickland.db', table='properties', ars_per_usd=None):
+        # ars_per_usd prices in USD the properties listed in pesos, see normalize_property
         self.db_path = os.path.abspath(os.path.join('data', 'db'))
         os.makedirs(self.db_path, exist_ok=True)
         self.dbname = os.path.join(self.db_path, dbname)
+        # The properties are stored in the units table and the projects they belong to in the
+        # projects table. `table` and `images_view` are views that join them with the columns
+        # of the former properties and prop_images_href tables.
         self.table = table
-        self.images_table = 'prop_images_href'
+        self.units_table = 'units'
+        self.projects_table = 'projects'
+        self.images_table = 'unit_images'
+        self.images_view = 'prop_images_href'
+        self.ars_per_usd = ars_per_usd
         self.conn = None
         self.cursor = None
         print(f"Database path: {self.dbname}")
@@ -31,47 +82,264 @@ class PropDb:
             print("SQLite connection is closed")
 
     def create_tables(self):
+        # Databases where the properties are still a table, with the project copied on every
+        # property, are migrated to the projects and units tables in a single transaction
+        legacy_projects = self.read_legacy_tables()
+        if legacy_projects is not None:
+            self.conn.commit()
+            self.cursor.execute('BEGIN')
+        try:
+            if legacy_projects is not None:
+                self.cursor.execute(f'DROP TABLE IF EXISTS {self.table}_fts')
+                self.cursor.execute(f'DROP TABLE {self.table}')
+                self.cursor.execute(f'DROP TABLE IF EXISTS {self.images_view}')
+
+            self.cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.projects_table} (
+                project_url TEXT PRIMARY KEY,
+                project_district TEXT,
+                project_address TEXT,
+                project_description TEXT,
+                project_images TEXT
+            )
+            ''')
+            self.cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.units_table} (
+                prop_url TEXT PRIMARY KEY,
+                prop_address TEXT,
+                prop_floor TEXT,
+                prop_price TEXT,
+                prop_m2 TEXT,
+                prop_rooms TEXT,
+                prop_bedrooms TEXT,
+                prop_location TEXT,
+                prop_description TEXT,
+                project_url TEXT REFERENCES {self.projects_table}(project_url),
+                {', '.join(f'{name} {sql_type}' for name, sql_type in NORMALIZED_COLUMNS)}
+            )
+            ''')
+            self.cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS {self.units_table}_project_url ON {self.units_table} (project_url)
+            ''')
+            self.cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {self.images_table} (
+                prop_url TEXT PRIMARY KEY REFERENCES {self.units_table}(prop_url),
+                prop_images TEXT
+            )
+            ''')
+
+            if legacy_projects is not None:
+                project_rows = [parameters for parameters in map(self._project_parameters, legacy_projects)
+                                if parameters]
+                count = self._upsert_rows(project_rows, [self._property_parameters(project, prop)
+                                                         for project in legacy_projects
+                                                         for prop in project['properties']], self.units_table)
+                self.conn.commit()
+                print(f"{count} properties of {len(project_rows)} projects migrated to the "
+                      f"'{self.projects_table}' and '{self.units_table}' tables")
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.add_normalized_columns()
+        self.create_views()
+        self.create_fts()
+        self.conn.commit()
+
+    def read_legacy_tables(self):
+        """Reads the projects of a database that stores the properties in a single table, or returns None."""
+        self.cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (self.table,))
+        row = self.cursor.fetchone()
+        if row is None or row[0] != 'table':
+            return None
+        images = {}
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.images_view,))
+        if self.cursor.fetchone() is not None:
+            # Before the unique index there may be several rows per property: the last one wins
+            self.cursor.execute(f'SELECT prop_url, prop_images, project_images FROM {self.images_view} ORDER BY rowid')
+            images = {prop_url: (prop_images, project_images) for prop_url, prop_images, project_images
+                      in self.cursor.fetchall()}
+        projects = {}
+        self.cursor.execute(f'SELECT {", ".join(PROPERTY_COLUMNS)} FROM {self.table} ORDER BY rowid')
+        for row in self.cursor.fetchall():
+            prop = dict(zip(PROPERTY_COLUMNS, row))
+            prop_images, project_images = images.get(prop['prop_url'], (None, None))
+            project = projects.setdefault(prop['project_url'], {'properties': []})
+            project.update({column: prop.pop(column) for column in PROJECT_COLUMNS})
+            if project_images is not None or 'project_images' not in project:
+                project['project_images'] = json.loads(project_images or '[]')
+            prop['prop_images'] = json.loads(prop_images or '[]')
+            project['properties'].append(prop)
+        return list(projects.values())
+
+    def create_views(self):
+        """Creates the views with the columns of the former properties and prop_images_href tables.
+
+        The properties view also returns the rowid of each unit, which the full-text index uses.
+        The views are created again every time, so they follow the columns of the tables.
+        """
+        normalized = ', '.join(f'u.{name}' for name in NORMALIZED_COLUMN_NAMES)
+        self.cursor.execute(f'DROP VIEW IF EXISTS {self.table}')
         self.cursor.execute(f'''
-        CREATE TABLE IF NOT EXISTS {self.table} (
-            prop_url TEXT PRIMARY KEY,
-            prop_address TEXT,
-            prop_floor TEXT,
-            prop_price TEXT,
-            prop_m2 TEXT,
-            prop_rooms TEXT,
-            prop_bedrooms TEXT,
-            prop_location TEXT,
-            prop_description TEXT,
-            project_url TEXT,
-            project_district TEXT,
-            project_address TEXT,
-            project_description TEXT
-        )
+        CREATE VIEW {self.table} AS
+        SELECT {', '.join(f'u.{column}' for column in UNIT_COLUMNS)},
+            {', '.join(f'p.{column}' for column in PROJECT_COLUMNS[1:])},
+            {normalized}, u.rowid AS rowid
+        FROM {self.units_table} u LEFT JOIN {self.projects_table} p ON p.project_url = u.project_url
         ''')
-        
+        self.cursor.execute(f'DROP VIEW IF EXISTS {self.images_view}')
         self.cursor.execute(f'''
-        CREATE TABLE IF NOT EXISTS {self.images_table} (
-            prop_url TEXT,
-            project_url TEXT,
-            prop_images TEXT,
-            project_images TEXT,
-            FOREIGN KEY(prop_url) REFERENCES {self.table}(prop_url),
-            FOREIGN KEY(project_url) REFERENCES {self.table}(project_url)
+        CREATE VIEW {self.images_view} AS
+        SELECT i.prop_url, u.project_url, i.prop_images, p.project_images
+        FROM {self.images_table} i JOIN {self.units_table} u ON u.prop_url = i.prop_url
+        LEFT JOIN {self.projects_table} p ON p.project_url = u.project_url
+        ''')
+
+    def create_fts(self):
+        """Creates the full-text index of the descriptions, kept in sync with the tables by triggers.
+
+        The FTS5 table reads its text from the properties view (external content) by the rowid
+        of the units and folds case and accents. The project description is read from the
+        projects table, so a change to it reindexes the units of the project. Prefix queries like
+        "cochera"* are answered by a range scan of the terms, so no extra prefix indexes are kept.
+        A database created before the index is indexed once here. VACUUM can renumber the rowids,
+        so run rebuild_fts after it.
+        """
+        fts = f'{self.table}_fts'
+        units, projects = self.units_table, self.projects_table
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,))
+        exists = self.cursor.fetchone() is not None
+        columns = ', '.join(FTS_COLUMNS)
+        self.cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {columns}, content='{self.table}', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2'
         )
         ''')
+
+        def project_description(row):
+            return f'(SELECT project_description FROM {projects} WHERE project_url = {row}.project_url)'
+
+        self.cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {units} BEGIN
+            INSERT INTO {fts} (rowid, {columns})
+            VALUES (new.rowid, new.prop_description, {project_description('new')});
+        END
+        ''')
+        self.cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {units} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {columns})
+            VALUES ('delete', old.rowid, old.prop_description, {project_description('old')});
+        END
+        ''')
+        # Upserts rewrite the description of every property, but only the changed ones are reindexed
+        self.cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF prop_description, project_url ON {units}
+        WHEN old.prop_description IS NOT new.prop_description OR old.project_url IS NOT new.project_url BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {columns})
+            VALUES ('delete', old.rowid, old.prop_description, {project_description('old')});
+            INSERT INTO {fts} (rowid, {columns})
+            VALUES (new.rowid, new.prop_description, {project_description('new')});
+        END
+        ''')
+        # The units of a project are reindexed when its description changes. Projects are written
+        # before their units, so a new project has none unless they were stored without it.
+        for event, old_description, new_description in (
+                ('INSERT', 'NULL', 'new.project_description'),
+                ('DELETE', 'old.project_description', 'NULL'),
+                ('UPDATE OF project_description', 'old.project_description', 'new.project_description')):
+            row = 'old' if event == 'DELETE' else 'new'
+            when = ('WHEN old.project_description IS NOT new.project_description'
+                    if event.startswith('UPDATE') else '')
+            self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {fts}_{projects}_{event.split()[0].lower()} AFTER {event} ON {projects}
+            {when} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {columns})
+                SELECT 'delete', rowid, prop_description, {old_description} FROM {units}
+                WHERE project_url = {row}.project_url;
+                INSERT INTO {fts} (rowid, {columns})
+                SELECT rowid, prop_description, {new_description} FROM {units}
+                WHERE project_url = {row}.project_url;
+            END
+            ''')
+        if not exists:
+            self.rebuild_fts()
+
+    def rebuild_fts(self, table=None):
+        """Indexes again every description, e.g. after a VACUUM."""
+        if table is None:
+            table = self.table
+        self.cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
         self.conn.commit()
 
-    def property_exists(self, prop_url, table=None):
+    def search_descriptions(self, keywords, operator='AND', limit=10, table=None):
+        """Returns the URLs of the properties whose descriptions have the keywords, best matches first."""
         if table is None:
             table = self.table
+        self.cursor.execute(f'''
+        SELECT p.prop_url FROM {table}_fts JOIN {table} p ON p.rowid = {table}_fts.rowid
+        WHERE {table}_fts MATCH ? ORDER BY rank LIMIT ?
+        ''', (fts_match(keywords, operator), limit))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def add_normalized_columns(self, table=None):
+        """Adds the typed columns and their indexes to a units table created before them, and fills them."""
+        if table is None:
+            table = self.units_table
+        existing = {row[1] for row in self.cursor.execute(f'PRAGMA table_info({table})')}
+        missing = [(name, sql_type) for name, sql_type in NORMALIZED_COLUMNS if name not in existing]
+        for name, sql_type in missing:
+            self.cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {sql_type}')
+        for name, columns in NORMALIZED_INDEXES.items():
+            self.cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_{name} ON {table} ({", ".join(columns)})')
+        if missing:
+            self.normalize_existing(table)
+        self.conn.commit()
+
+    def normalize_existing(self, table=None):
+        """Computes again the typed columns of every property from its scraped fields and its project."""
+        if table is None:
+            table = self.units_table
+        self.cursor.execute(f'''
+        SELECT {", ".join(f"u.{column}" for column in UNIT_COLUMNS)},
+            {", ".join(f"p.{column}" for column in PROJECT_COLUMNS[1:])}
+        FROM {table} u LEFT JOIN {self.projects_table} p ON p.project_url = u.project_url
+        ''')
+        rows = [dict(zip(UNIT_COLUMNS + PROJECT_COLUMNS[1:], row)) for row in self.cursor.fetchall()]
+        self.cursor.executemany(f'''
+        UPDATE {table} SET {", ".join(f"{name} = ?" for name in NORMALIZED_COLUMN_NAMES)} WHERE prop_url = ?
+        ''', [tuple(normalized[name] for name in NORMALIZED_COLUMN_NAMES) + (row['prop_url'],)
+              for row, normalized in ((row, normalize_property(row, row, self.ars_per_usd)) for row in rows)])
+        self.conn.commit()
+        print(f"{len(rows)} properties normalized in '{table}'")
+        return len(rows)
+
+    def property_exists(self, prop_url, table=None):
+        if table is None:
+            table = self.units_table
         self.cursor.execute(f'SELECT 1 FROM {table} WHERE prop_url = ?', (prop_url,))
         return self.cursor.fetchone() is not None
 
-    def insert_or_update_property(self, project_data, prop_data, table=None):
+    def get_project_urls(self, table=None):
+        """Returns the URLs of all the projects stored in the table."""
         if table is None:
-            table = self.table
-        if prop_data is None:
+            table = self.projects_table
+        self.cursor.execute(f"SELECT project_url FROM {table} WHERE project_url != ''")
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _project_parameters(self, project_data):
+        # Properties without a project URL are stored without a project
+        if not project_data.get('project_url'):
             return None
+        return (
+            project_data.get('project_url'),
+            project_data.get('project_district', ''),
+            project_data.get('project_address', ''),
+            project_data.get('project_description', ''),
+            json.dumps(project_data.get('project_images', []), ensure_ascii=False)
+        )
+
+    def _property_parameters(self, project_data, prop_data):
+        normalized = normalize_property(project_data, prop_data, self.ars_per_usd)
         parameters = (
             prop_data.get('prop_url'),
             prop_data.get('prop_address', ''),
@@ -82,67 +350,161 @@ class PropDb:
             str(prop_data.get('prop_bedrooms', 'nan')),
             prop_data.get('prop_location', ''),
             prop_data.get('prop_description', 'nan'),
-            project_data.get('project_url', ''),
-            project_data.get('project_district', ''),
-            project_data.get('project_address', ''),
-            project_data.get('project_description', '')
-        )
+            project_data.get('project_url', '')
+        ) + tuple(normalized[name] for name in NORMALIZED_COLUMN_NAMES)
 
         image_parameters = (
             prop_data.get('prop_url'),
-            project_data.get('project_url', ''),
-            json.dumps(prop_data.get('prop_images', []), ensure_ascii=False),
-            json.dumps(project_data.get('project_images', []), ensure_ascii=False)
+            json.dumps(prop_data.get('prop_images', []), ensure_ascii=False)
         )
+        return parameters, image_parameters
 
-        if self.property_exists(prop_data['prop_url'], table):
-            self.cursor.execute(f'''
-            UPDATE {table}
-            SET prop_address = ?, prop_floor = ?, prop_price = ?, prop_m2 = ?, prop_rooms = ?, 
-                prop_bedrooms = ?, prop_location = ?, prop_description = ?, 
-                project_url = ?, project_district = ?, project_address = ?, 
-                project_description = ?
-            WHERE prop_url = ?
-            ''', parameters)
-            
-            self.cursor.execute(f'''
-            UPDATE {self.images_table}
-            SET project_url = ?, prop_images = ?, project_images = ?
-            WHERE prop_url = ?
-            ''', image_parameters)
-        else:
-            self.cursor.execute(f'''
-            INSERT INTO {table} (
-                prop_url, prop_address, prop_floor, prop_price, prop_m2, prop_rooms, prop_bedrooms,
-                prop_location, prop_description, project_url, project_district,
-                project_address, project_description
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', parameters)
-            
-            self.cursor.execute(f'''
-            INSERT INTO {self.images_table} (
-                prop_url, project_url, prop_images, project_images
-            ) VALUES (?, ?, ?, ?)
-            ''', image_parameters)
+    def _upsert_rows(self, project_rows, rows, table):
+        """Writes the projects, then the (parameters, image_parameters) pairs of their properties.
+
+        There is one UPSERT statement per table. The projects go first, so the full-text index
+        of a new property already finds the description of its project.
+        """
+        self.cursor.executemany(f'''
+        INSERT INTO {self.projects_table} ({", ".join(PROJECT_COLUMNS)}, project_images) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(project_url) DO UPDATE SET
+            {", ".join(f"{name} = excluded.{name}" for name in PROJECT_COLUMNS[1:] + ['project_images'])}
+        ''', project_rows)
+
+        rows = list(rows)
+        columns = UNIT_COLUMNS + NORMALIZED_COLUMN_NAMES
+        self.cursor.executemany(f'''
+        INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})
+        ON CONFLICT(prop_url) DO UPDATE SET {", ".join(f"{name} = excluded.{name}" for name in columns[1:])}
+        ''', [parameters for parameters, _ in rows])
+
+        self.cursor.executemany(f'''
+        INSERT INTO {self.images_table} (prop_url, prop_images) VALUES (?, ?)
+        ON CONFLICT(prop_url) DO UPDATE SET prop_images = excluded.prop_images
+        ''', [image_parameters for _, image_parameters in rows])
+        return len(rows)
+
+    def insert_or_update_property(self, project_data, prop_data, table=None):
+        if table is None:
+            table = self.units_table
+        if prop_data is None:
+            return None
+        project_parameters = self._project_parameters(project_data)
+        self._upsert_rows([project_parameters] if project_parameters else [],
+                          [self._property_parameters(project_data, prop_data)], table)
         self.conn.commit()
 
-    def import_data(self, json_data, table=None):
-        for project in json_data:
-            for prop in project['properties']:
-                self.insert_or_update_property(project_data=project, prop_data=prop, table=table)
+    def upsert_project(self, project, table=None):
+        """Upserts a project and its properties in a single transaction."""
+        if table is None:
+            table = self.units_table
+        project_parameters = self._project_parameters(project)
+        count = self._upsert_rows([project_parameters] if project_parameters else [],
+                                  (self._property_parameters(project, prop) for prop in project['properties']
+                                   if prop is not None), table)
+        self.conn.commit()
+        return count
+
+    def bulk_upsert(self, projects, table=None, batch_size=5000, fast=False):
+        """Upserts many projects and their properties with executemany, committing every batch_size properties.
+
+        With fast, the load runs with synchronous=OFF: it is much faster, but a power loss
+        during the import can corrupt the database. The previous setting is restored afterwards.
+        Returns the number of properties written.
+        """
+        if table is None:
+            table = self.units_table
+        synchronous = self.cursor.execute('PRAGMA synchronous').fetchone()[0]
+        if fast:
+            self.cursor.execute('PRAGMA synchronous = OFF')
+        count = 0
+        project_batch = []
+        batch = []
+        try:
+            for project in projects:
+                project_parameters = self._project_parameters(project)
+                if project_parameters:
+                    project_batch.append(project_parameters)
+                batch.extend(self._property_parameters(project, prop) for prop in project['properties']
+                             if prop is not None)
+                if len(batch) >= batch_size:
+                    count += self._upsert_rows(project_batch, batch, table)
+                    self.conn.commit()
+                    project_batch = []
+                    batch = []
+            count += self._upsert_rows(project_batch, batch, table)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            if fast:
+                self.cursor.execute(f'PRAGMA synchronous = {synchronous}')
+        return count
+
+    def import_data(self, json_data, table=None, fast=False):
+        """Imports a list or an iterable of projects with bulk_upsert."""
+        count = self.bulk_upsert(json_data, table=table, fast=fast)
+        print(f"{count} properties imported into '{self.dbname}'")
+        return count
+
+    def import_stream(self, projects, jsonl_path=None, table=None):
+        """Upserts projects one by one as they arrive from an iterable, e.g. a scraper generator.
+
+        Every project is committed as soon as it is written, so listings are queryable
+        while the crawl is still running. If jsonl_path is given, each project is also
+        appended to that file as one JSON line.
+        """
+        jsonl_file = open(jsonl_path, 'a', encoding='utf-8') if jsonl_path else None
+        count = 0
+        try:
+            for project in projects:
+                if jsonl_file:
+                    jsonl_file.write(json.dumps(project, ensure_ascii=False) + '\n')
+                    jsonl_file.flush()
+                self.upsert_project(project, table=table)
+                count += 1
+        finally:
+            if jsonl_file:
+                jsonl_file.close()
+        print(f"{count} projects streamed into '{self.dbname}'")
+        return count
+
+
+def iter_jsonl(file_path):
+    """Yields the projects of a JSONL file one line at a time."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
 
 if __name__ == '__main__':
-    json_file_path = 'data/raw/argenprop_data.json'
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load scraped projects into the SQLite database.')
+    parser.add_argument('--input', default='data/raw/argenprop_data.json', help='A JSON list of projects or a JSONL file with one project per line.')
+    parser.add_argument('--fast', action='store_true', help='Load without waiting for each batch to reach the disk (synchronous=OFF).')
+    parser.add_argument('--ars-per-usd', type=float, default=None, help='Exchange rate to price in USD the properties listed in pesos.')
+    parser.add_argument('--renormalize', action='store_true', help='Compute again the typed columns of the properties already stored.')
+    parser.add_argument('--rebuild-fts', action='store_true', help='Index again the descriptions for full-text search, e.g. after a VACUUM.')
+    args = parser.parse_args()
+    json_file_path = args.input
     
-    prop_db = PropDb(dbname='brickland.db')
+    prop_db = PropDb(dbname='brickland.db', ars_per_usd=args.ars_per_usd)
     try:
         prop_db.connect()
         prop_db.create_tables()
+        if args.renormalize:
+            prop_db.normalize_existing()
+        if args.rebuild_fts:
+            prop_db.rebuild_fts()
 
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
-
-        prop_db.import_data(json_data)
+        if json_file_path.endswith('.jsonl'):
+            prop_db.import_data(iter_jsonl(json_file_path), fast=args.fast)
+        else:
+            with open(json_file_path, 'r', encoding='utf-8') as f:
+                json_data = json.load(f)
+            prop_db.import_data(json_data, fast=args.fast)
         print("Data inserted/updated in database successfully!")
     except Exception as e:
         print(f"An error occurred: {e}")
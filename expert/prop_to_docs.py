@@ -6,11 +6,12 @@ from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_text_splitters import CharacterTextSplitter
 
 class RealEstateDataTransformer:
-    def __init__(self, db_path='data/db/brickland.db', chroma_db_path='data/db', table_name='properties', env_path='.venv/.env', collection_name='properties_to_docs'):
+    def __init__(self, db_path='data/db/brickland.db', chroma_db_path='data/db', table_name='properties', projects_table_name='projects', env_path='.venv/.env', collection_name='properties_to_docs'):
         self.db_path = db_path
         self.env_path = env_path
         self.chroma_db_path = chroma_db_path
         self.table_name = table_name
+        self.projects_table_name = projects_table_name
         self.collection_name = collection_name
         self.load_environment_variables(env_path)
         self.embedding_model = HuggingFaceEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2')
@@ -24,10 +25,12 @@ class RealEstateDataTransformer:
         os.environ['LANGCHAIN_PROJECT'] = os.getenv('LANGCHAIN_PROJECT')
         os.environ['TAVILY_API_KEY'] = os.getenv('TAVILY_API_KEY')
 
-    def fetch_all_rows(self):
+    def fetch_all_rows(self, table_name=None):
+        if table_name is None:
+            table_name = self.table_name
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
-        cursor.execute(f"SELECT * FROM {self.table_name}")
+        cursor.execute(f"SELECT * FROM {table_name}")
         rows = cursor.fetchall()
         column_names = [description[0] for description in cursor.description]
         documents = []
@@ -37,12 +40,17 @@ class RealEstateDataTransformer:
         conn.close()
         return documents
 
-    def transform_to_docs(self, rows):
+    def transform_to_docs(self, rows, project_rows=None):
+        # One document per property and one per project: the description of a project is shared
+        # by all its properties, so it is embedded once instead of once per property. Both kinds
+        # have the project_url in their metadata and a doc_type of "property" or "project".
+        if project_rows is None:
+            project_rows = list({row["project_url"]: row for row in rows}.values())
         docs = []
         metadata = []
         for row in rows:
-            doc = f"{row['prop_description']} {row['project_description']}"
             m = {
+                "doc_type": "property",
                 "prop_url": row["prop_url"],
                 "prop_address": row["prop_address"],
                 "prop_floor": row["prop_floor"],
@@ -52,11 +60,21 @@ class RealEstateDataTransformer:
                 "prop_bedrooms": row["prop_bedrooms"],
                 "prop_location": row["prop_location"],
                 "project_url": row["project_url"],
-                "project_district": row["project_district"],
-                "project_address": row["project_address"],
-                "project_description": row["project_description"],
+                "project_district": row["project_district"] or "",
+                "project_address": row["project_address"] or "",
             }
-            docs.append(doc)
+            docs.append(row["prop_description"])
+            metadata.append(m)
+        for row in project_rows:
+            if not row["project_url"] or not row["project_description"]:
+                continue
+            m = {
+                "doc_type": "project",
+                "project_url": row["project_url"],
+                "project_district": row["project_district"] or "",
+                "project_address": row["project_address"] or "",
+            }
+            docs.append(row["project_description"])
             metadata.append(m)
         return metadata, docs
 
@@ -69,7 +87,8 @@ class RealEstateDataTransformer:
 
     def run(self):
         rows = self.fetch_all_rows()
-        metadata, docs = self.transform_to_docs(rows)
+        project_rows = self.fetch_all_rows(self.projects_table_name)
+        metadata, docs = self.transform_to_docs(rows, project_rows)
         self.load_to_chroma(metadata, docs, self.embedding_model, self.chroma_db_path)
 
 if __name__ == "__main__":
@@ -49,7 +49,7 @@ class QueryAgent:
 #     query_agent = QueryAgent()
 #     query_agent.connect()
 #     queries = [
-#         "SELECT * FROM properties WHERE prop_rooms = 2 AND prop_location LIKE '%Palermo%' AND CAST(prop_price AS REAL) < 200000 LIMIT 5"
+#         "SELECT * FROM properties WHERE rooms = 2 AND barrio = 'Palermo' AND price_usd < 200000 LIMIT 5"
 #     ]
 #     results = query_agent.execute_queries(queries)
 #     print(results)
@@ -1,4 +1,5 @@
 import os
+import sqlite3
 from dotenv import load_dotenv
 from langchain.chains import create_sql_query_chain
 from langchain_openai import OpenAI
@@ -10,10 +11,25 @@ class QueryTranslator:
         self.db_path = db_path
         self.dbname = dbname
         self.full_db_path = os.path.join(self.db_path, self.dbname)
-        self.db_conn = SQLDatabase.from_uri(f"sqlite:///{self.full_db_path}")
+        # The model sees the properties view. The tables behind it and the internal tables of
+        # the full-text index are left out of the schema given to the model.
+        self.db_conn = SQLDatabase.from_uri(f"sqlite:///{self.full_db_path}", view_support=True,
+                                            ignore_tables=self.hidden_tables(self.full_db_path))
         self.table_schema = None
         # print(f"Database path: {self.full_db_path}")
 
+    @staticmethod
+    def hidden_tables(full_db_path):
+        if not os.path.exists(full_db_path):
+            return None
+        conn = sqlite3.connect(full_db_path)
+        try:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                "AND (name GLOB '*_fts_*' OR name IN ('units', 'unit_images'))").fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in rows] or None
+
     def load_environment_variables(self, env_path):
         load_dotenv(env_path)
         os.environ['LANGCHAIN_TRACING_V2'] = os.getenv('LANGCHAIN_TRACING_V2')
@@ -41,19 +57,19 @@ class QueryTranslator:
             f"Table Schema:\n{schema_description}\n\n"
             f"Examples:\n"
             f"1. User Question: 'Estoy buscando un departamento en Palermo de 2 ambientes que salga menos de 200 mil dólares en una zona cerca al subte, ofrece financiamiento?'\n"
-            f"   SQL Query: SELECT * FROM properties WHERE prop_location LIKE '%Palermo%' AND prop_rooms = 2 AND CAST(prop_price AS REAL) < 200000 AND prop_description LIKE '%subte%' AND prop_description LIKE '%financiamiento%';\n\n"
+            f"   SQL Query: SELECT * FROM properties WHERE barrio = 'Palermo' AND rooms = 2 AND price_usd < 200000 AND rowid IN (SELECT rowid FROM properties_fts WHERE properties_fts MATCH '\"subte\"* AND \"financiamiento\"*');\n\n"
             f"2. User Question: 'Quiero encontrar un departamento en Recoleta que tenga 3 habitaciones y esté en un piso alto.'\n"
-            f"   SQL Query: SELECT * FROM properties WHERE prop_location LIKE '%Recoleta%' AND prop_bedrooms = 3 AND CAST(prop_floor AS INTEGER) > 5;\n\n"
+            f"   SQL Query: SELECT * FROM properties WHERE barrio = 'Recoleta' AND bedrooms = 3 AND floor > 5;\n\n"
             f"3. User Question: 'Estoy buscando un departamento que sea un monoambiente en cualquier zona de la ciudad.'\n"
-            f"   SQL Query: SELECT * FROM properties WHERE (prop_rooms IS NULL OR prop_rooms = 'nan' OR prop_bedrooms IS NULL OR prop_bedrooms = 'nan') AND (LOWER(prop_url) LIKE '%monoambiente%' OR LOWER(prop_description) LIKE '%monoambiente%');\n\n"
-            f"3. User Question: 'Estoy buscando un departamento con parrilla.'\n"
-            f"SELECT prop_url, project_url, prop_description, project_description FROM properties WHERE prop_description LIKE '%parrilla% LIMIT 10;"
+            f"   SQL Query: SELECT * FROM properties WHERE rooms = 1 OR (rooms IS NULL AND (LOWER(prop_url) LIKE '%monoambiente%' OR rowid IN (SELECT rowid FROM properties_fts WHERE properties_fts MATCH '\"monoambiente\"*')));\n\n"
+            f"4. User Question: 'Estoy buscando un departamento con parrilla y cochera.'\n"
+            f"   SQL Query: SELECT prop_url, project_url, prop_description, project_description FROM properties WHERE rowid IN (SELECT rowid FROM properties_fts WHERE properties_fts MATCH '\"parrilla\"* AND \"cochera\"*') LIMIT 10;\n\n"
             f"User Question:\n{question}\n\n"
-            f"Generate the SQL query based on the user question and the table schema. Use functions like CAST to convert data types if necessary, wherever you need to extract a value from a string. Use LIKE to match a pattern in a string column rather than finding the exact value, for example in searching for a location or a name.\n"
+            f"Generate the SQL query based on the user question and the table schema. Filter prices, surfaces, rooms, bedrooms and floors with the typed columns price_usd, price_usd_m2, surface_m2, rooms, bedrooms and floor, never with CAST on the text columns. Filter neighbourhoods with barrio = 'Name', using the official name of the barrio with its accents (e.g. 'Núñez', 'San Cristóbal'). To find words in the descriptions (amenities like pileta, parrilla, SUM or cochera, or any other feature) use the full-text index: rowid IN (SELECT rowid FROM properties_fts WHERE properties_fts MATCH '...'), with each word in double quotes, in singular and without accents, followed by * (e.g. '\"balcon\"* AND \"pileta\"*'), joined by AND or OR. Words of up to three letters like SUM go without *. Never use LIKE on prop_description or project_description.\n"
             f"If the user does not provide a specific value, it does not matter, but remember to bring a limit of 10.\n"
             f"Always return the prop_url and project_url columns in the query, as they are essential for the user to access the property and the project information.\n"
             f"Always return prop_description and project_description columns in the query, as they are essential for the user to understand the property and the project.\n"
-            f"For the price, if it's 'nan', assume average price of properties with similar location, rooms and floor, else average of properties selected in the query, but do not change the 'nan' value in the database."
+            f"For the price, if price_usd is NULL, assume average price of properties with similar barrio, rooms and floor, else average of properties selected in the query, but do not change the NULL value in the database."
         )
 
         chain = create_sql_query_chain(llm=llm, db=self.db_conn)
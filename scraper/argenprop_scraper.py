@@ -1,17 +1,48 @@
-from bs4 import BeautifulSoup
-import requests
+from bs4 import SoupStrainer
+from fetcher import Fetcher
+from html_parsing import class_strainer, find_text, make_soup
+from http_cache import HttpCache
+from run_journal import RunJournal
+from structured_data import ExtractionStats, extract_listing, property_from_listing
+from url_frontier import canonicalize_url
 import pandas as pd
 import re
 
+APARTMENT_HREF_PATTERN = re.compile(r'^\/emprendimientos\/[^/]+--\d{5,15}$')
+SURFACE_PATTERN = re.compile(r'\b(\d{1,5})\s?m2\b', re.IGNORECASE)
+ROOMS_PATTERN = re.compile(r'(\d{1,5})\s?ambientes', re.IGNORECASE)
+BEDROOMS_PATTERN = re.compile(r'(\d{1,5})\s?dormitorios', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Only the subtrees read by the extraction methods are parsed
+PROJECT_STRAINER = class_strainer('sidebar-top-info', 'sidebar-top-heading', 'sidebar-details-item',
+                                  'section-list__icons', 'main__slider-photos')
+APARTMENT_LINK_STRAINER = SoupStrainer('a', href=APARTMENT_HREF_PATTERN)
+APARTMENT_STRAINER = class_strainer('resume-primary', 'resume-price', 'resume-info-location', 'resume__list-item',
+                                    'section-description--content', 'main__details', 'popupbox-footer-content')
+
+# Fields of an apartment that the structured data of the page can provide
+STRUCTURED_FIELDS = ('prop_address', 'prop_floor', 'prop_price', 'prop_m2', 'prop_rooms', 'prop_bedrooms',
+                     'prop_location', 'prop_description', 'prop_images')
+
 class ArgenPropData:
     """
     A class for scraping property data from ArgenProp website.
 
+    The pages are parsed here, while fetching, journaling, the incremental mode and the
+    concurrency are left to a `PropertyScraper` limited to the Argenprop adapter.
+
     Attributes:
         url (str): The URL of the property.
         list_of_urls (list): A list of URLs of multiple properties.
         source (str): The source of the property data.
         soup (BeautifulSoup): The BeautifulSoup instance for parsing HTML.
+        known_urls (set): The URLs of the projects already stored. Those whose page did not
+            change since the last run are skipped.
+        extraction_stats (ExtractionStats): How often the apartment fields came from the
+            structured data of the page or from its DOM.
+        apply_rates (bool): Whether the rate of Argenprop is applied to the fetcher.
+        property_scraper (PropertyScraper): The engine the projects are scraped with.
 
     Methods:
         create_soup_instance(url): Create a BeautifulSoup instance.
@@ -19,29 +50,56 @@ class ArgenPropData:
         project_images(url, soup): Get the images of the property.
         available_apartments(url, soup): Get the available apartments.
         get_apartment_data(url, main_url): Retrieves data for a specific apartment.
+        structured_apartment_data(fields, idx): Maps the structured data of a listing to apartment fields.
+        parse_apartment(content, idx): Extracts the apartment data from a listing page.
+        parse_apartment_page(soup, idx): Extracts the apartment data from a parsed listing page.
         create_brief_list_of_projects(urls, n): Create a brief list of projects.
-        compile_project_data(): Compiles all data for each project and its apartments.
+        scrape_project_page(project_url, response): Scrapes the page of a project, without its apartments.
+        parse_project_page(project_url, content): Extracts a project and its apartment URLs from its page.
+        scrape_project(project_url, executor): Scrapes a project and all its apartments.
+        iter_project_data(workers, ordered): Yields the data of each project as soon as it is scraped.
+        compile_project_data(workers): Compiles all data for each project and its apartments.
     """
 
-    def __init__(self, url=None, list_of_urls=None):
+    def __init__(self, url=None, list_of_urls=None, fetcher=None, journal=None, known_urls=None, apply_rates=True):
         self.url = url
         self.urls = list_of_urls
         self.source = 'argenprop'
         self.soup = None
-
-    def create_soup_instance(self, url):
+        self.fetcher = fetcher if fetcher is not None else Fetcher(cache=HttpCache())
+        self.journal = journal
+        self.known_urls = set(known_urls or [])
+        self.extraction_stats = ExtractionStats()
+        self.apply_rates = apply_rates
+        self._property_scraper = None
+
+    @property
+    def property_scraper(self):
+        # Created on first use and imported here, because the source adapters import this module
+        if self._property_scraper is None:
+            from property_scraper import PropertyScraper
+            from source_adapters import ArgenpropAdapter
+
+            adapter = ArgenpropAdapter(fetcher=self.fetcher, scraper=self)
+            self._property_scraper = PropertyScraper(list_of_urls=self.urls, fetcher=self.fetcher,
+                                                     adapters={adapter.name: adapter}, journal=self.journal,
+                                                     known_urls=self.known_urls, apply_rates=self.apply_rates)
+        return self._property_scraper
+
+    def create_soup_instance(self, url, parse_only=None):
         """
         Create a BeautifulSoup instance.
 
         Args:
             url (str): The URL to create the BeautifulSoup instance for.
+            parse_only (SoupStrainer, optional): Restricts parsing to the matching subtrees.
 
         Returns:
             BeautifulSoup: The BeautifulSoup instance.
 
         """
-        request = requests.get(url)
-        self.soup = BeautifulSoup(request.content, 'html.parser')
+        request = self.fetcher.get(url)
+        self.soup = make_soup(request.content, parse_only=parse_only)
         return self.soup
 
     def create_project_brief(self, url=None, soup=None):
@@ -56,21 +114,16 @@ class ArgenPropData:
             str: The brief summary of the property.
 
         """
-        data_dict = {}
-        soup = self.soup
-        data1 = soup.find('p', {'class': 'sidebar-top-info'}).text.strip() if soup.find('p', {'class': 'sidebar-top-info'}) else ''
-        data2 = soup.find('p', {'class': 'sidebar-top-heading'}).text.strip() if soup.find('p', {'class': 'sidebar-top-heading'}) else ''
-        data3 = soup.find('h2', {'class': 'sidebar-top-info'}).text.strip() if soup.find('h2', {'class': 'sidebar-top-info'}) else ''
+        soup = soup if soup is not None else self.soup
+        data1 = find_text(soup, 'p', 'sidebar-top-info')
+        data2 = find_text(soup, 'p', 'sidebar-top-heading')
+        data3 = find_text(soup, 'h2', 'sidebar-top-info')
         data4 = ''.join([s.text for s in soup.find_all('div', {'class': 'sidebar-details-item'})])
         lines = [line.strip() for line in data4.split('\n') if line.strip()]
         text_elements = [f"{lines[i]} {lines[i+1]}" for i in range(0, len(lines), 2)]
         data4 = ', '.join(text_elements) + '.'        
         section_list_icons = ''.join([s.text.replace('\n', '').replace('\t', '').lstrip() for s in soup.find_all('ul', {'class': 'section-list__icons'})]).split(' ')
-        data5 = []
-        for string in section_list_icons:
-            if string != '':
-                data5.append(string)
-        data5 = ' '.join(data5)
+        data5 = ' '.join([string for string in section_list_icons if string != ''])
         brief_text = data1 + ' ' + data2 + ' ' + data3 + ' ' + data4 + ' ' + data5
         if not brief_text:
             brief_text = 'nan'
@@ -94,7 +147,8 @@ class ArgenPropData:
 
         """
         list_of_images = []
-        soup = self.soup.find('ul', {'class': 'main__slider-photos'}).find_all('img')
+        soup = soup if soup is not None else self.soup
+        soup = soup.find('ul', {'class': 'main__slider-photos'}).find_all('img')
         for img in soup:
             if img['data-popup-src']:
                 list_of_images.append(img['data-popup-src'])
@@ -108,24 +162,24 @@ class ArgenPropData:
 
         Args:
             url (str): The URL of the property.
-            soup (BeautifulSoup): The BeautifulSoup instance.
+            soup (BeautifulSoup): The BeautifulSoup instance. If not provided, the page is
+                fetched and only its apartment links are parsed.
 
         Returns:
-            list: A list of available apartment URLs.
+            list: A list of available apartment URLs, each one once.
 
         """
-        available_apartments = []
-        soup = BeautifulSoup(requests.get(url).content, 'html.parser').find_all('a')
-        for item in soup:
-            regex_pattern = re.compile(r'^\/emprendimientos\/[^/]+--\d{5,15}$')
-            if re.match(regex_pattern, item['href']):
-                available_apartments.append(item['href'])
-        return available_apartments
+        if soup is None:
+            soup = make_soup(self.fetcher.get(url).content, parse_only=APARTMENT_LINK_STRAINER)
+        return list(dict.fromkeys(item['href'] for item in soup.find_all('a', href=APARTMENT_HREF_PATTERN)))
 
     def get_apartment_data(self, url, main_url):
         """
         Retrieves data for a specific apartment from a given URL.
 
+        The JSON-LD of the page is read first; the page is only parsed, and its CSS classes
+        walked, when the structured data misses some fields.
+
         Args:
             url (str): The URL of the apartment listing.
             main_url (str): The main URL of the website.
@@ -133,11 +187,75 @@ class ArgenPropData:
         Returns:
             dict: A dictionary containing apartment data.
         """
+        idx = f'https://argenprop.com{url}'
+        return self.parse_apartment(self.fetcher.get(idx).content, idx)
+
+    def parse_apartment(self, content, idx):
+        """
+        Extracts the apartment data from a listing page, reading its JSON-LD first.
+
+        Args:
+            content (bytes): The listing page.
+            idx (str): The full URL of the apartment listing.
+
+        Returns:
+            dict: A dictionary containing apartment data, or None if the location is missing.
+        """
+        structured = self.structured_apartment_data(extract_listing(content), idx)
+        if all(field in structured for field in STRUCTURED_FIELDS):
+            self.extraction_stats.record({field: 'structured' for field in STRUCTURED_FIELDS})
+            return structured
+        soup = make_soup(content, parse_only=APARTMENT_STRAINER)
+        try:
+            apartment = self.parse_apartment_page(soup, idx)
+        except AttributeError as e:
+            if 'prop_location' not in structured:
+                raise
+            print(f'{e} for apartment {idx}, keeping its structured data only')
+            apartment = {'prop_url': idx}
+        if apartment is None:
+            # The page has no location in the DOM, but the structured data may have it
+            if 'prop_location' not in structured:
+                return None
+            apartment = {'prop_url': idx}
+        field_sources = {}
+        for field in STRUCTURED_FIELDS:
+            if field in structured:
+                apartment[field] = structured[field]
+                field_sources[field] = 'structured'
+            else:
+                apartment.setdefault(field, 'nan')
+                field_sources[field] = 'dom' if apartment[field] not in ('nan', '', []) else 'missing'
+        self.extraction_stats.record(field_sources)
+        return apartment
+
+    def structured_apartment_data(self, fields, idx):
+        """
+        Maps the structured data of a listing to apartment fields, cleaned like the DOM ones.
+
+        Args:
+            fields (dict): The fields returned by `structured_data.extract_listing`.
+            idx (str): The full URL of the apartment listing.
+
+        Returns:
+            dict: The apartment fields found in the structured data.
+        """
+        return property_from_listing(fields, idx)
+
+    def parse_apartment_page(self, soup, idx):
+        """
+        Extracts the apartment data from a parsed listing page.
+
+        Args:
+            soup (BeautifulSoup): The BeautifulSoup instance of the listing page.
+            idx (str): The full URL of the apartment listing.
+
+        Returns:
+            dict: A dictionary containing apartment data, or None if the location is missing.
+        """
         apartment_main_data = []
         apartment_description = []
         apartment_other_data = []
-        idx = f'https://argenprop.com{url}'
-        soup = BeautifulSoup(requests.get(f'https://argenprop.com{url}').content, 'html.parser')
         address_floor = soup.find('h2', {'class': 'resume-primary'}).get_text().split(',')
         address = address_floor[0].strip()
         floor = address_floor[1].strip() if len(address_floor) > 1 else 'nan'
@@ -153,7 +271,8 @@ class ArgenPropData:
             return None
         apmd = soup.find_all('div', {'class': 'resume__list-item'})
         for item in apmd:
-            apartment_main_data.append(item.text.split('\n')[2].strip().replace('m\u00b2', 'm2') if item.text.split('\n')[2].strip() else 'nan')
+            value = item.text.split('\n')[2].strip()
+            apartment_main_data.append(value.replace('m\u00b2', 'm2') if value else 'nan')
         try:
             apartment_description = soup.find('div', {'class': 'section-description--content'}).text.strip().replace('\n', ' ').replace('m\u00b2', 'm2')
         except AttributeError:
@@ -168,8 +287,8 @@ class ArgenPropData:
             pass
         apod = soup.find('div', {'class': 'main__details'}).find_all('li')
         for item in apod:
-            apartment_other_data.append(re.sub(r'\s+', ' ', item.text.replace('\n', ' ').replace('•', '').strip().replace('m\u00b2', 'm2')) if
-                                        re.sub(r'\s+', ' ', item.text.replace('\n', ' ').replace('•', '').strip().replace('m\u00b2', 'm2')) else 'nan')
+            value = WHITESPACE_PATTERN.sub(' ', item.text.replace('\n', ' ').replace('•', '').strip().replace('m\u00b2', 'm2'))
+            apartment_other_data.append(value if value else 'nan')
         apartment_images = []
         apimg = soup.find('div', {'class': 'popupbox-footer-content'}).find_all('img')
         for img in apimg:
@@ -187,15 +306,13 @@ class ArgenPropData:
             Returns:
                 str: The number of square meters, or 'nan' if not found.
             """
-            pattern = re.compile(r'\b(\d{1,5})\s?m2\b', re.IGNORECASE)
-            
             for item in main_data_list:
-                match = pattern.search(item)
+                match = SURFACE_PATTERN.search(item)
                 if match:
                     return int(match.group(1))
             
             for item in additional_data_list:
-                match = pattern.search(item)
+                match = SURFACE_PATTERN.search(item)
                 if match:
                     return int(match.group(1))
             
@@ -216,10 +333,10 @@ class ArgenPropData:
             bedrooms = None
             
             for item in data_list:
-                match_rooms = re.search(r'(\d{1,5})\s?ambientes', item, re.IGNORECASE)
+                match_rooms = ROOMS_PATTERN.search(item)
                 if match_rooms:
                     rooms = int(match_rooms.group(1))
-                match_bedrooms = re.search(r'(\d{1,5})\s?dormitorios', item, re.IGNORECASE)
+                match_bedrooms = BEDROOMS_PATTERN.search(item)
                 if match_bedrooms:
                     bedrooms = int(match_bedrooms.group(1))
 
@@ -254,40 +371,145 @@ class ArgenPropData:
         }
     
 
-    def compile_project_data(self):
+    def scrape_project_page(self, project_url, response=None):
+        """
+        Scrapes the page of a project, without its apartments.
+
+        Args:
+            project_url (str): The URL of the project.
+            response (requests.Response, optional): The project page, if it was already fetched.
+
+        Returns:
+            tuple: The project data with an empty list of properties, and the URLs of its apartments.
+        """
+        if response is None:
+            response = self.fetcher.get(project_url)
+        return self.parse_project_page(project_url, response.content)
+
+    def parse_project_page(self, project_url, content):
+        """
+        Extracts the project data and the URLs of its apartments from the page of a project.
+
+        Args:
+            project_url (str): The URL of the project.
+            content (bytes): The project page.
+
+        Returns:
+            tuple: The project data with an empty list of properties, and the URLs of its apartments.
+        """
+        soup = make_soup(content, parse_only=PROJECT_STRAINER)
+        project_data = self.create_project_brief(url=project_url, soup=soup)
+        project_images = self.project_images(url=project_url, soup=soup)
+        apartment_urls = self.available_apartments(url=project_url, soup=make_soup(content, parse_only=APARTMENT_LINK_STRAINER))
+        compiled_project = {
+            'project_url': project_url,
+            'project_district': project_data['district'],
+            'project_address': project_data['address'],
+            'project_description': project_data['brief_text'],
+            'project_images': project_images,
+            'properties': []
+        }
+        return compiled_project, apartment_urls
+
+    def scrape_project(self, project_url, executor=None):
+        """
+        Scrapes a project page and all of its apartments.
+
+        Projects and apartments already recorded in the run journal are not fetched again.
+        Known projects whose page is unchanged since it was last fetched are skipped.
+
+        Args:
+            project_url (str): The URL of the project.
+            executor (Executor, optional): Executor used to fetch the apartments in parallel.
+                If not provided, the apartments are fetched one at a time.
+
+        Returns:
+            dict: A dictionary containing the project data and its apartments, None if the
+                project is known and unchanged, or `property_scraper.FETCH_FAILED` if its page
+                could not be fetched.
+        """
+        return self.property_scraper.scrape_project(project_url, executor=executor)
+
+    def iter_project_data(self, workers=1, ordered=True):
+        """
+        Yields the data of each project and its apartments as soon as it is scraped.
+
+        With more than one worker, projects are scraped concurrently and the apartments of
+        every project are fetched in parallel, within the per-host limit of the fetcher and
+        the rate of Argenprop. Only a small window of projects is in flight at any time.
+
+        Args:
+            workers (int): Number of threads used to scrape projects and apartments.
+            ordered (bool): If True, projects are yielded in the order of `self.urls`.
+                Otherwise they are yielded as soon as they finish.
+
+        Yields:
+            dict: A dictionary containing the project data and its apartments.
+        """
+        return self.property_scraper.iter_project_data(workers=workers, ordered=ordered)
+
+    def compile_project_data(self, workers=1):
         """
         Compiles all data for each project and its apartments.
 
+        Args:
+            workers (int): Number of threads used to scrape projects and apartments.
+
         Returns:
-            list: A list of dictionaries containing all compiled data for each project and its apartments.
+            list: A list of dictionaries containing all compiled data for each project and its apartments,
+                in the order of `self.urls`.
         """
-        compiled_data = []
-        for i, project_url in enumerate(self.urls):
-            print(f'Scraping project {i+1} from {len(self.urls)+1}:', project_url)
-            self.create_soup_instance(project_url)
-            project_data = self.create_project_brief()
-            project_images = self.project_images()
-            apartment_urls = self.available_apartments(url=project_url)
-            apartments_data = []
-            for apt_url in apartment_urls:
-                apartments_data.append(self.get_apartment_data(url=apt_url, main_url=project_url))
-            compiled_data.append({
-                'project_url': project_url,
-                'project_district': project_data['district'],
-                'project_address': project_data['address'],
-                'project_description': project_data['brief_text'],
-                'project_images': project_images,
-                'properties': apartments_data
-            })
-        return compiled_data
+        return self.property_scraper.compile_project_data(workers=workers)
 
 
 if __name__ == '__main__':
+    import argparse
     import json
+    import os
+    import sys
+
+    parser = argparse.ArgumentParser(description='Scrape Argenprop projects and their apartments.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent workers (1 scrapes sequentially).')
+    parser.add_argument('--per-host', type=int, default=4, help='Maximum number of concurrent requests per host.')
+    parser.add_argument('--cache-ttl', type=float, default=24, help='Hours during which cached pages are reused without revalidation.')
+    parser.add_argument('--resume', action='store_true', help='Skip the projects and apartments completed by a previous run.')
+    parser.add_argument('--stream', action='store_true', help='Upsert each project into the database as soon as it is scraped.')
+    parser.add_argument('--jsonl', default=None, help='With --stream, also append each project to this JSONL file.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip the projects already in the database whose page did not change.')
+    args = parser.parse_args()
 
     urls = pd.read_csv('data/raw/list_of_all_urls.csv')
     list_of_urls = urls.loc[urls['URL'].str.contains('argenprop'), 'URL'].tolist()
-    apd = ArgenPropData(list_of_urls=list_of_urls)
-    compiled_data = apd.compile_project_data()
-    with open('data/raw/argenprop_data.json', 'w') as json_file:
-        json.dump(compiled_data, json_file, indent=4)
+    list_of_urls = list(dict.fromkeys(canonicalize_url(url) for url in list_of_urls))
+    if args.stream or args.incremental:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+        from sqlite_db import PropDb
+    known_urls = None
+    if args.incremental:
+        prop_db = PropDb(dbname='brickland.db')
+        try:
+            prop_db.connect()
+            prop_db.create_tables()
+            known_urls = prop_db.get_project_urls()
+        finally:
+            prop_db.close()
+        print(f'{len(known_urls)} known projects loaded.')
+    fetcher = Fetcher(cache=HttpCache(ttl=args.cache_ttl * 3600), per_host_limit=args.per_host,
+                      pool_size=max(args.workers, args.per_host))
+    with RunJournal('data/raw/journals/argenprop_run.jsonl', resume=args.resume) as journal:
+        apd = ArgenPropData(list_of_urls=list_of_urls, fetcher=fetcher, journal=journal, known_urls=known_urls)
+        if args.stream:
+            prop_db = PropDb(dbname='brickland.db')
+            try:
+                prop_db.connect()
+                prop_db.create_tables()
+                prop_db.import_stream(apd.iter_project_data(workers=args.workers, ordered=False), jsonl_path=args.jsonl)
+            finally:
+                prop_db.close()
+            apd.property_scraper.report()
+        else:
+            compiled_data = apd.compile_project_data(workers=args.workers)
+            output = 'data/raw/argenprop_data_delta.json' if args.incremental else 'data/raw/argenprop_data.json'
+            with open(output, 'w') as json_file:
+                json.dump(compiled_data, json_file, indent=4)
@@ -1,14 +1,37 @@
 import re
+import os
 import pandas as pd
 import math
+import requests
 from autoscraper import AutoScraper
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
-import requests
-import time
+from concurrent.futures import ThreadPoolExecutor
+from driver_pool import DriverPool
+from fetcher import Fetcher
+from http_cache import HttpCache
+from source_adapters import create_adapters
+from url_frontier import UrlFrontier, canonicalize_url
+from urllib.parse import urlsplit
+
+MELI_ID_PATTERN = re.compile(r'MLA-?(\d+)')
+TRAILING_ID_PATTERN = re.compile(r'(\d{5,15})(?:\.html)?/?$')
+
+
+def listing_id(url):
+    """
+    Get a stable identifier of a listing URL, so the same listing is recognized even when
+    its slug or query string change between runs.
+
+    Args:
+        url (str): The URL of the listing.
+
+    Returns:
+        tuple: The host of the URL and the id of the listing, or the URL itself if it has no id.
+    """
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    match = MELI_ID_PATTERN.search(parts.path) or TRAILING_ID_PATTERN.search(parts.path)
+    return host, match.group(1) if match else url
 
 
 class AutoScraperProp:
@@ -16,57 +39,147 @@ class AutoScraperProp:
     A class for scraping data from various real estate websites.
     """
 
-    def __init__(self):
+    def __init__(self, fetcher=None, page_workers=4, models_dir='data/models', driver_pool=None, frontier=None,
+                 adapters=None, apply_rates=True):
         """
         Initializes an instance of the AutoScraperProp class.
+
+        Args:
+            fetcher (Fetcher, optional): The fetcher used to download pages. If not provided,
+                a fetcher backed by the shared HTTP cache is created.
+            page_workers (int): Maximum number of pagination pages of a source fetched in parallel.
+            models_dir (str): Directory where the learned rules of each source are saved.
+            driver_pool (DriverPool, optional): Pool of Selenium drivers used as the last fallback.
+                If not provided, a pool of one driver is created; Chrome only starts when needed.
+            frontier (UrlFrontier, optional): If provided, the discovered URLs are also queued in it,
+                those of the first pages with a higher priority.
+            adapters (dict, optional): The adapter of each source, keyed by its name. Defaults to
+                every registered source.
+            apply_rates (bool): If True, the rate of each source is applied to the fetch policy of
+                its hosts. If False, the policy of the fetcher is left as it is, e.g. without limits
+                when replaying saved pages.
         """
-        self.scraper = AutoScraper()
+        self.fetcher = fetcher if fetcher is not None else Fetcher(cache=HttpCache())
+        self.page_workers = page_workers
+        self.models_dir = models_dir
+        self.first_page_urls = {}
         self.page = 1
-        self.driver = None
-        self.source_page = {
-            'argenprop': ['https://argenprop.com/emprendimientos/capital-federal?pagina-1',
-                            re.compile(r'\b(\d{1,5})\b Emprendimientos en Capital Federal'),
-                            r'\b(\d{1,5})\b', 20, re.compile(r'^/emprendimientos/emprendimiento-en[-a-z]*--(\d{5,15})$'), 'https://argenprop.com'],
-            'zonaprop': ['https://www.zonaprop.com.ar/emprendimientos-capital-federal-pagina-1.html',
-                            re.compile(r'\b(\d{1,5}.\d{1,5})\b Desarrollos inmobiliarios en venta - Propiedades e inmuebles en Capital Federal'),
-                            r'\d{1,5}.\d{1,5}', 20, re.compile(r'^\/propiedades\/emprendimiento\/[\s\d\w-]{1,100}-\d{5,15}.html$'), 'https://www.zonaprop.com.ar'],
-            'meli': ['https://inmuebles.mercadolibre.com.ar/departamentos/emprendimientos/capital-federal/_Desde_0_NoIndex_True',
-                        re.compile(r'\b(\d{1,5})\b resultados', re.IGNORECASE), r'\b(\d{1,5})\b', 48,
-                        re.compile(r'^https:\/\/departamento\.mercadolibre\.com\.ar\/MLA-(\d{5,15})-.*$'), ''],
-            'mudafy': ['https://mudafy.com.ar/venta/emprendimientos/caba/1-p',
-                        re.compile(r'\b(\d{1,5})\b resultados', re.IGNORECASE), r'\b(\d{1,5})\b', 22,
-                        re.compile(r'^\/emprendimiento\/[\s\d\w-]{1,100}-\d{5,15}$'), 'https://mudafy.com.ar'],            
-        }
-    
+        self.driver_pool = driver_pool if driver_pool is not None else DriverPool(size=1)
+        self.frontier = frontier
+        self.adapters = adapters if adapters is not None else create_adapters(fetcher=self.fetcher)
+        # Each source learns its own rules and has its own politeness budget (requests per second, burst),
+        # enforced by the fetch policy of its hosts
+        self.scrapers = {source: AutoScraper() for source in self.adapters}
+        self.load_models()
+        if apply_rates:
+            for adapter in self.adapters.values():
+                adapter.configure(self.fetcher.policy)
+
+    def model_path(self, source):
+        """
+        Gets the path of the saved rules of a source.
+
+        Args:
+            source (str): The source of the website.
+
+        Returns:
+            str: The path of the JSON model.
+        """
+        return os.path.join(self.models_dir, f'{source}.json')
+
+    def load_models(self):
+        """
+        Loads the saved rules of every source that has been trained before.
+        """
+        for source, scraper in self.scrapers.items():
+            if os.path.exists(self.model_path(source)):
+                scraper.load(self.model_path(source))
+                print(f'Loaded rules for {source} from {self.model_path(source)}.')
+
+    def train_model(self, source, html=None):
+        """
+        Learns the rules of a source from its first page and saves them.
+
+        The page count and the listing URLs are learned together, under the 'pages' and
+        'urls' aliases, so a single page-one fetch serves both.
+
+        Args:
+            source (str): The source of the website.
+            html (str, optional): The HTML of the first page. Fetched if not provided.
+        """
+        adapter = self.adapters[source]
+        if html is None:
+            html = self.fetcher.get(adapter.first_page_url).text
+        print(f'Training rules for {source}.')
+        self.scrapers[source].build(adapter.first_page_url, html=html,
+                                    wanted_dict={'pages': [adapter.count_pattern], 'urls': [adapter.url_pattern]})
+        os.makedirs(self.models_dir, exist_ok=True)
+        self.scrapers[source].save(self.model_path(source))
+        print(f'Rules for {source} saved to {self.model_path(source)}.')
+
+    def retrain(self, list_of_sources=None):
+        """
+        Learns again and saves the rules of the given sources.
+
+        Args:
+            list_of_sources (list, optional): The sources to retrain. Defaults to all of them.
+        """
+        if list_of_sources is None:
+            list_of_sources = list(self.adapters)
+        for source in list_of_sources:
+            self.train_model(source)
+
+    def scrape_first_page(self, source):
+        """
+        Scrapes the first page of a source with its saved rules, training them if needed.
+
+        The listing URLs found are kept so `get_urls_from_website` does not fetch page one again.
+
+        Args:
+            source (str): The source of the website.
+
+        Returns:
+            dict: The results of the first page grouped by alias ('pages' and 'urls').
+        """
+        url = self.adapters[source].first_page_url
+        scraper = self.scrapers[source]
+        html = self.fetcher.get(url).text
+        result = {}
+        if scraper.stack_list:
+            result = scraper.get_result_similar(url, html=html, group_by_alias=True, unique=True)
+            if not (result.get('pages') and result.get('urls')):
+                print(f'Saved rules for {source} no longer match the website.')
+        if not (result.get('pages') and result.get('urls')):
+            self.train_model(source, html=html)
+            result = scraper.get_result_similar(url, html=html, group_by_alias=True, unique=True)
+        self.first_page_urls[source] = result.get('urls', [])
+        return result
+
     def get_selenium_driver(self):
         """
-        Creates a Selenium WebDriver instance.
+        Borrows a warm Selenium WebDriver from the pool. Give it back with `self.driver_pool.release`.
         """
-        service = Service(ChromeDriverManager().install())
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        options.add_argument('--disable-gpu')
-        options.add_argument('--no-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        self.driver = webdriver.Chrome(service=service, options=options)
-        return self.driver
+        return self.driver_pool.acquire()
     
     def selenium_webpage_instance(self, url, driver=None):
         """
-        Creates a Selenium instance and opens the specified URL.
+        Opens the specified URL with Selenium.
 
         Args:
             url (str): The URL of the webpage to open.
-            driver (WebDriver, optional): The Selenium WebDriver instance to use. If not provided, a new WebDriver instance will be created.
+            driver (WebDriver, optional): The Selenium WebDriver instance to use. If not provided, a driver is borrowed from the pool.
 
         Returns:
-            None
+            str: The page source.
 
         """
-        self.get_selenium_driver()
-        self.driver.get(url)
-        self.driver.implicitly_wait(10)
-        print('Selenium instance created.')
+        if driver is None:
+            with self.driver_pool.driver() as pooled_driver:
+                return self.selenium_webpage_instance(url, driver=pooled_driver)
+        driver.get(url)
+        driver.implicitly_wait(10)
+        print('Selenium page loaded.')
+        return driver.page_source
     
     def get_number_of_pages_with_selenium(self, url, tags):
         """
@@ -83,8 +196,8 @@ class AutoScraperProp:
         """
         if isinstance(tags, list):
             tags = tags[0]
-        self.selenium_webpage_instance(url=url, driver=self.driver)
-        soup = BeautifulSoup(self.driver.page_source, 'html.parser').text.strip()
+        page_source = self.selenium_webpage_instance(url=url)
+        soup = BeautifulSoup(page_source, 'html.parser').text.strip()
         string_with_page_number = re.findall(tags, soup)
         return int(string_with_page_number[0])
     
@@ -103,7 +216,7 @@ class AutoScraperProp:
         """
         if isinstance(tags, list):
             tags = tags[0]
-        response = requests.get(url)
+        response = self.fetcher.get(url)
         soup = BeautifulSoup(response.text, 'html.parser').text.strip()
         string_with_page_number = re.findall(tags, soup)
         return int(string_with_page_number[0])
@@ -117,22 +230,25 @@ class AutoScraperProp:
         Returns:
             int: The number of pages available.
         """
-        source_url, page_tag, pattern, n, url_tag, main_url = self.source_page[source]
-        if tags is None:
-            tags = [page_tag]
+        adapter = self.adapters[source]
         if number_of_posts_per_page is None:
-            number_of_posts_per_page = n   
+            number_of_posts_per_page = adapter.per_page
         if digit_pattern is None:
-            digit_pattern = pattern 
-        url = source_url
+            digit_pattern = adapter.digit_pattern
+        url = adapter.first_page_url
         try:
-            number_of_posts = self.scraper.build(url, tags)
-            string_digit = re.findall(pattern, number_of_posts[0])[0]
+            if tags is None:
+                number_of_posts = self.scrape_first_page(source)['pages']
+            else:
+                # Custom tags are learned on a throwaway scraper to keep the saved rules intact
+                number_of_posts = AutoScraper().build(url, tags, html=self.fetcher.get(url).text)
+            string_digit = re.findall(digit_pattern, number_of_posts[0])[0]
             string_to_integer = int(''.join([i for i in string_digit if i.isdigit()]))
             number_of_pages = math.ceil(string_to_integer / number_of_posts_per_page)
         except Exception as e:
             print(f'Error: {e}')
             print("Using Requests to get the number of pages.")
+            tags = tags or [adapter.count_pattern]
             try:
                 number_of_pages = self.get_number_of_pages_with_requests(url=url, tags=tags)
             except Exception as e:
@@ -141,42 +257,85 @@ class AutoScraperProp:
                 number_of_pages = self.get_number_of_pages_with_selenium(url=url, tags=tags)
         return number_of_pages
     
-    def get_urls_from_website(self, source, number_of_pages, tags=None):
+    def get_page_url(self, source, page):
+        """
+        Builds the URL of a pagination page of a source.
+
+        Args:
+            source (str): The source of the website.
+            page (int): The page number, starting at 1.
+
+        Returns:
+            str: The URL of the page.
+        """
+        if source not in self.adapters:
+            raise ValueError(f'Unknown source: {source}')
+        adapter = self.adapters[source]
+        return adapter.first_page_url if page == 1 else adapter.page_url(page)
+
+    def get_urls_from_website(self, source, number_of_pages, known_urls=None):
         """
         Scrapes the website to retrieve a list of estates.
 
-        This function scrapes the website to retrieve a list of estates.
+        The URLs of the first page come from `scrape_first_page`, which reuses the saved rules
+        of the source; the remaining pages are fetched in parallel, at most `page_workers` at a
+        time and within the rate limit of the source's host.
+
+        When `known_urls` is given, pages are fetched one window of `page_workers` pages at a
+        time and pagination stops after the first page that yields only known listings, since
+        the listings are sorted newest first.
+
+        Pages that cannot be fetched, e.g. because the circuit of the host is open, are logged
+        and yield no URLs.
+
+        Args:
+            source (str): The source of the website to scrape.
+            number_of_pages (int): The number of pages of the source.
+            known_urls (iterable, optional): The URLs found by previous runs.
 
         Returns:
-            list: A list of estates scraped from the website.
+            list: A list of estates scraped from the website, one list per page.
         """
         print(f'Getting urls from website...{source}')
-        list_of_urls = []
-        # number_of_pages = 2
-        for p in range(1, number_of_pages + 1):
+        adapter = self.adapters[source]
+        scraper = self.scrapers[source]
+        known_ids = {listing_id(url) for url in known_urls or []}
+
+        def scrape_page(p):
             print(f'Scraping page {p}.')
-            tags = [self.source_page[source][4]]
-            main_url = self.source_page[source][5]
-            if p == 1:
-                url = self.source_page[source][0]
-                urls = self.scraper.build(url, tags)
-            else:
-                if source == 'argenprop':
-                    url = re.sub(re.compile(r'(pagina-)(\d{1,10})'), rf'pagina-{p}', url)
-                    urls = self.scraper.get_result_similar(url)
-                elif source == 'zonaprop':
-                    url = re.sub(re.compile(r'(pagina-)(\d{1,10})'), rf'pagina-{p}', url)
-                    urls = self.scraper.get_result_similar(url)
-                elif source == 'meli':
-                    url = re.sub(re.compile(r'(_Desde_)(\d{1,10})(_NoIndex_True)'), rf'_Desde_{(p-1)*48}_NoIndex_True', url)
-                    urls = self.scraper.get_result_similar(url)
-                elif source == 'mudafy':
-                    url = re.sub(re.compile(r'(\d{1,10})-p'), rf'{p}-p', url)
-                    urls = self.scraper.get_result_similar(url)
-            urls = [main_url + url for url in urls]
-            list_of_urls.append(urls)
-            time.sleep(1)
-        return list_of_urls
+            url = self.get_page_url(source, p)
+            try:
+                html = self.fetcher.get(url).text
+            except requests.RequestException as e:
+                print(f'Error fetching page {p} of {source}: {e}')
+                return []
+            return scraper.get_result_similar(url, html=html, group_by_alias=True, unique=True).get('urls', [])
+
+        def only_known(urls):
+            return bool(urls) and all(listing_id(adapter.listing_url(url)) in known_ids for url in urls)
+
+        print('Scraping page 1.')
+        if source not in self.first_page_urls:
+            self.scrape_first_page(source)
+        pages = [self.first_page_urls.pop(source)]
+        with ThreadPoolExecutor(max_workers=self.page_workers) as pool:
+            if not known_ids:
+                pages.extend(pool.map(scrape_page, range(2, number_of_pages + 1)))
+            elif not only_known(pages[0]):
+                for start in range(2, number_of_pages + 1, self.page_workers):
+                    window = range(start, min(start + self.page_workers, number_of_pages + 1))
+                    stop = False
+                    for p, urls in zip(window, pool.map(scrape_page, window)):
+                        pages.append(urls)
+                        if only_known(urls):
+                            stop = True
+                            break
+                    if stop:
+                        break
+            if known_ids and len(pages) < number_of_pages:
+                print(f'{source}: page {len(pages)} holds only known listings, '
+                      f'skipping the remaining {number_of_pages - len(pages)} pages.')
+        return [[adapter.listing_url(url) for url in urls] for urls in pages]
     
     def save_list_of_urls(self, filename, list_of_all_urls):
         """
@@ -189,43 +348,119 @@ class AutoScraperProp:
         Returns:
             None
         """
-        if isinstance(list_of_all_urls[0], list):
+        df_list_of_urls = list(list_of_all_urls)
+        if list_of_all_urls and isinstance(list_of_all_urls[0], list):
             print('Flattening list of URLs...')
             df_list_of_urls = []
             for urls in list_of_all_urls:
                 for url in urls:
                     df_list_of_urls.append(url)
             print(f'Total URLs after flattening: {len(df_list_of_urls)}')
+        # Keep one spelling of each page, ignoring fragments and tracking parameters
+        df_list_of_urls = list(dict.fromkeys(canonicalize_url(url) for url in df_list_of_urls))
         df = pd.DataFrame(df_list_of_urls, columns=['URL'])
         df.to_csv(filename, index=False)
         print(f'{len(df_list_of_urls)} URLs saved to {filename}.')
     
-    def main(self, filename, list_of_sources=None):
+    def discover_source(self, source, known_urls=None):
         """
-        Main function to scrape the website.
+        Gets the number of pages of a source and scrapes the URLs of all of them.
 
         Args:
             source (str): The source of the website to scrape.
+            known_urls (iterable, optional): The URLs found by previous runs.
+
+        Returns:
+            list: A list of estates scraped from the website, one list per page.
+        """
+        number_of_pages = self.get_number_of_pages(source=source)
+        return self.get_urls_from_website(source=source, number_of_pages=number_of_pages, known_urls=known_urls)
+
+    def main(self, filename, list_of_sources=None, known_urls=None):
+        """
+        Main function to scrape the website.
+
+        All sources are crawled concurrently, each within its own rate budget, so the
+        discovery pass takes about as long as the slowest source. A source whose first page
+        cannot be fetched, e.g. because the circuit of its host is open, is skipped.
+
+        In incremental mode, i.e. when `known_urls` is given, every source stops paginating at
+        the first page of known listings. The known URLs are kept in the saved file and the
+        newly found ones are also saved to `list_of_new_urls.csv`, next to `filename`.
+
+        Args:
             filename (str): The name of the file to save the list of URLs.
+            list_of_sources (list, optional): The sources to crawl. Defaults to all of them.
+            known_urls (iterable, optional): The URLs found by previous runs.
 
         Returns:
             None
         """
         list_of_all_urls = []
         if list_of_sources is None:
-            list_of_sources = self.source_page.keys()
-        for src in list_of_sources:
-            number_of_pages = self.get_number_of_pages(source=src)
-            list_of_urls = self.get_urls_from_website(source=src, number_of_pages=number_of_pages)
-            list_of_all_urls.extend(list_of_urls)
-        if self.driver:
-            self.driver.quit()
+            list_of_sources = list(self.adapters)
+        if not list_of_sources:
+            print('No sources to crawl.')
+            self.driver_pool.close()
+            return
+        known_urls = list(dict.fromkeys(known_urls or []))
+        with ThreadPoolExecutor(max_workers=len(list_of_sources)) as pool:
+            futures = [pool.submit(self.discover_source, src, known_urls) for src in list_of_sources]
+            for source, future in zip(list_of_sources, futures):
+                try:
+                    pages = future.result()
+                except requests.RequestException as e:
+                    print(f'Error discovering {source}: {e}. Skipping it.')
+                    continue
+                list_of_all_urls.extend(pages)
+                if self.frontier is not None:
+                    for page, urls in enumerate(pages):
+                        self.frontier.add_many(urls, priority=-page, source=source)
+        self.driver_pool.close()
+        if known_urls:
+            known_ids = {listing_id(url) for url in known_urls}
+            discovered_ids = {listing_id(url) for urls in list_of_all_urls for url in urls}
+            new_urls = [url for urls in list_of_all_urls for url in urls if listing_id(url) not in known_ids]
+            print(f'{len(new_urls)} new URLs found.')
+            if new_urls:
+                self.save_list_of_urls(os.path.join(os.path.dirname(filename), 'list_of_new_urls.csv'), [new_urls])
+            list_of_all_urls.append([url for url in known_urls if listing_id(url) not in discovered_ids])
         self.save_list_of_urls(filename, list_of_all_urls)
+        self.fetcher.report()
         print('All websites scraped!')
 
 
 if __name__ == '__main__':
-    autoscraper = AutoScraperProp()
-    autoscraper.main(filename='data/raw/list_of_all_urls.csv')
-    if autoscraper.driver:
-        autoscraper.driver.quit()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Discover the project URLs of every source.')
+    parser.add_argument('--sources', nargs='+', default=None, help='Sources to crawl (default: all).')
+    parser.add_argument('--retrain', action='store_true', help='Learn again and save the rules of the sources before crawling.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Stop paginating at the first page of URLs already in the CSV or in the database.')
+    args = parser.parse_args()
+
+    filename = 'data/raw/list_of_all_urls.csv'
+    known_urls = None
+    if args.incremental:
+        import sys
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+        from sqlite_db import PropDb
+
+        known_urls = []
+        if os.path.exists(filename):
+            known_urls.extend(pd.read_csv(filename)['URL'].dropna().tolist())
+        if os.path.exists('data/db/brickland.db'):
+            prop_db = PropDb(dbname='brickland.db')
+            try:
+                prop_db.connect()
+                prop_db.create_tables()
+                known_urls.extend(prop_db.get_project_urls())
+            finally:
+                prop_db.close()
+        print(f'{len(known_urls)} known URLs loaded.')
+
+    autoscraper = AutoScraperProp(frontier=UrlFrontier())
+    if args.retrain:
+        autoscraper.retrain(args.sources)
+    autoscraper.main(filename=filename, list_of_sources=args.sources, known_urls=known_urls)
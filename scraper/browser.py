@@ -1,13 +1,18 @@
 import cloudscraper
+from fetcher import Fetcher
+from http_cache import HttpCache
 
 
 class Browser():
-    def __init__(self):
+    def __init__(self, cache=None, fetcher=None):
         self.scraper = cloudscraper.create_scraper()
+        if fetcher is None:
+            fetcher = Fetcher(session=self.scraper, cache=cache if cache is not None else HttpCache())
+        self.fetcher = fetcher
 
     def get(self, url):
         try:
-            return self.scraper.get(url)
+            return self.fetcher.get(url)
         except Exception as e:
             print(f"Error getting url: {e}")
             return None
@@ -16,4 +21,4 @@ class Browser():
         return self.scraper.post(url, data)
 
     def get_text(self, url):
-        return self.scraper.get(url).text
\ No newline at end of file
+        return self.fetcher.get(url).text
@@ -0,0 +1,42 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def iter_bounded(submit, items, window, ordered=True):
+    """
+    Run a task for each item, keeping at most `window` of them in flight, and yield their results.
+
+    Only the tasks in flight are held in memory, so the number of items does not matter.
+
+    Args:
+        submit (callable): Submits the task of an item to an executor and returns its Future.
+        items (iterable): The items.
+        window (int): Maximum number of tasks in flight.
+        ordered (bool): If True, results are yielded in the order of the items. Otherwise
+            they are yielded as soon as their task finishes.
+
+    Yields:
+        tuple: An item and the result of its task.
+    """
+    items = iter(items)
+    pending = deque()
+
+    def submit_next():
+        for item in items:
+            future = submit(item)
+            future.item = item
+            pending.append(future)
+            return
+
+    for _ in range(window):
+        submit_next()
+    while pending:
+        if ordered:
+            future = pending.popleft()
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            pending.remove(future)
+        result = future.result()
+        submit_next()
+        yield future.item, result
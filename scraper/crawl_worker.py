@@ -0,0 +1,238 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from browser import Browser
+from fetcher import Fetcher
+from http_cache import HttpCache
+from knowledge_creator import KnowledgeCreator
+from source_adapters import SOURCE_ADAPTERS, adapter_for_url, create_adapters
+from url_frontier import UrlFrontier
+
+# The projects and units of every source, and the advice articles
+DEFAULT_SOURCES = tuple(f'{source}{suffix}' for source in SOURCE_ADAPTERS for suffix in ('', '_apartment')) + ('article',)
+
+
+class CrawlWorker:
+    """
+    A crawl worker that leases URLs from a shared UrlFrontier, processes them and writes the results back.
+
+    Several workers, in as many processes or machines, can share the same frontier: every
+    URL is leased to one worker at a time, and the lease of a worker that dies expires and
+    returns the URL to the queue. The URLs are fetched here and parsed by the adapter of their source:
+
+        - '<source>', e.g. 'argenprop': the page of a project. Its units are queued as '<source>_apartment'.
+        - '<source>_apartment': a unit, through `SourceAdapter.parse_unit`.
+        - 'article': an advice article, through `KnowledgeCreator.get_text_from_url`.
+
+    Attributes:
+        frontier (UrlFrontier): The shared queue of URLs.
+        worker_id (str): The identifier of the worker, unique across processes and machines.
+        adapters (dict): The adapter of each real estate source, keyed by its name.
+        sources (tuple): The sources of the URLs processed by the worker.
+        threads (int): Number of URLs of a batch processed in parallel.
+        batch (int): Number of URLs leased at once.
+        lease_seconds (float): Seconds after which a URL returns to the queue, counted from the
+            moment the worker starts processing it.
+
+    Methods:
+        process(task): Process one leased URL and record its result.
+        run(): Lease and process URLs until the queue is empty.
+    """
+
+    def __init__(self, frontier, worker_id=None, fetcher=None, sources=DEFAULT_SOURCES, threads=4,
+                 batch=8, lease_seconds=300, poll_interval=5):
+        self.frontier = frontier
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.fetcher = fetcher if fetcher is not None else Fetcher(cache=HttpCache())
+        self.sources = tuple(sources)
+        self.threads = threads
+        self.batch = batch
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.adapters = create_adapters(fetcher=self.fetcher)
+        self.knowledge_creator = KnowledgeCreator(browser=Browser(cache=self.fetcher.cache))
+        self.handlers = {'article': self.handle_article}
+        for adapter in self.adapters.values():
+            adapter.configure(self.fetcher.policy)
+            self.handlers[adapter.name] = self.handle_project
+            self.handlers[adapter.unit_source] = self.handle_apartment
+        self.processed = 0
+        self.failed = 0
+
+    def handle_project(self, task):
+        """
+        Scrape the page of a project and queue its units.
+        """
+        adapter = self.adapters[task['source']]
+        project, unit_urls = adapter.parse_project(task['url'], self.fetcher.get(task['url']).content)
+        # Units go first, so that started projects are completed before new ones begin
+        self.frontier.add_many(unit_urls, priority=1, source=adapter.unit_source, parent=task['url'])
+        return project
+
+    def handle_apartment(self, task):
+        """
+        Scrape a unit. Units whose fields cannot be extracted give None.
+        """
+        adapter = adapter_for_url(self.adapters, task['url'])
+        return adapter.parse_unit(task['url'], self.fetcher.get(task['url']).content)
+
+    def handle_article(self, task):
+        """
+        Scrape the text of an article.
+        """
+        article_text = self.knowledge_creator.get_text_from_url(task['url'])
+        if article_text is None:
+            raise ValueError('no text could be extracted')
+        return article_text
+
+    def process(self, task):
+        """
+        Process one leased URL and record its result, or its failure, in the frontier.
+
+        The lease is renewed when the URL is taken from the batch, so it runs for
+        `lease_seconds` from then, however long the URLs before it in the batch took.
+
+        Args:
+            task (dict): A leased URL, as returned by `UrlFrontier.lease`.
+
+        Returns:
+            bool: True if the URL was processed successfully and its result stored.
+        """
+        if not self.frontier.renew(self.worker_id, task['url'], lease_seconds=self.lease_seconds):
+            print(f'[{self.worker_id}] Lease on {task["url"]} lost before processing it, skipping it')
+            return False
+        try:
+            payload = self.handlers[task['source']](task)
+        except Exception as e:
+            print(f'[{self.worker_id}] Error processing {task["url"]}: {e}')
+            self.frontier.mark_failed(task['url'], error=e)
+            return False
+        if not self.frontier.store_result(task['url'], payload, worker=self.worker_id):
+            print(f'[{self.worker_id}] Lease on {task["url"]} lost, result dropped')
+            return False
+        return True
+
+    def run(self):
+        """
+        Lease and process batches of URLs until none is queued or being processed by another worker.
+
+        Returns:
+            int: The number of URLs processed successfully.
+        """
+        print(f'[{self.worker_id}] Worker started for {", ".join(self.sources)}')
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            while True:
+                tasks = self.frontier.lease(self.worker_id, limit=self.batch, lease_seconds=self.lease_seconds,
+                                            sources=self.sources)
+                if not tasks:
+                    # URLs leased by other workers may still queue new ones or come back on expiry
+                    if self.frontier.pending(sources=self.sources) == 0:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                for ok in pool.map(self.process, tasks):
+                    self.processed += ok
+                    self.failed += not ok
+        print(f'[{self.worker_id}] Worker finished: {self.processed} processed, {self.failed} failed')
+        self.fetcher.report()
+        return self.processed
+
+
+def run_worker(worker_id, frontier_path, sources, threads, batch, lease_seconds, cache_ttl, shared):
+    """
+    Run a CrawlWorker in the current process, with its own frontier connection and fetcher.
+    """
+    frontier = UrlFrontier(frontier_path, shared=shared)
+    fetcher = Fetcher(cache=HttpCache(ttl=cache_ttl), per_host_limit=threads, pool_size=threads)
+    try:
+        CrawlWorker(frontier, worker_id=worker_id, fetcher=fetcher, sources=sources, threads=threads,
+                    batch=batch, lease_seconds=lease_seconds).run()
+    finally:
+        frontier.close()
+
+
+def collect_projects(frontier):
+    """
+    Assemble the scraped projects of every source with their units, in the format of `ArgenPropData.scrape_project`.
+
+    Args:
+        frontier (UrlFrontier): The frontier holding the results.
+
+    Yields:
+        dict: A dictionary containing the project data and its apartments.
+    """
+    for source in SOURCE_ADAPTERS:
+        for project_url, project in frontier.results(source=source):
+            # Projects without unit pages already hold their own property
+            project['properties'].extend(unit for _, unit in frontier.results(source=f'{source}_apartment',
+                                                                              parent=project_url)
+                                         if unit is not None)
+            yield project
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import multiprocessing
+
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Crawl the URLs of a shared frontier with several worker processes.')
+    parser.add_argument('--frontier', default='data/frontier/frontier.sqlite', help='The frontier database.')
+    parser.add_argument('--shared', action='store_true',
+                        help='The frontier is on a directory shared by several machines (disables WAL).')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='Number of worker processes on this machine.')
+    parser.add_argument('--threads', type=int, default=4, help='Number of URLs processed in parallel by each worker.')
+    parser.add_argument('--batch', type=int, default=8, help='Number of URLs leased at once.')
+    parser.add_argument('--lease', type=float, default=300, help='Seconds after which the URLs of a dead worker are released.')
+    parser.add_argument('--cache-ttl', type=float, default=24, help='Hours during which cached pages are reused without revalidation.')
+    parser.add_argument('--sources', nargs='+', default=list(DEFAULT_SOURCES), help='Sources processed by the workers.')
+    parser.add_argument('--seed-csv', default=None, help='Queue the projects of a URL CSV, e.g. data/raw/list_of_all_urls.csv.')
+    parser.add_argument('--seed-articles', nargs='+', default=None, help='Queue the article URLs of these text files.')
+    parser.add_argument('--new-run', action='store_true', help='Queue again the URLs fetched by previous runs.')
+    parser.add_argument('--collect', default=None, help='Write the scraped projects to this JSONL file.')
+    parser.add_argument('--collect-articles', default=None, help='Write the scraped articles to this JSON file.')
+    args = parser.parse_args()
+
+    frontier = UrlFrontier(args.frontier, shared=args.shared)
+    if args.new_run:
+        for source in args.sources:
+            frontier.requeue(states=('fetched', 'failed'), source=source)
+    if args.seed_csv:
+        adapters = create_adapters()
+        urls = pd.read_csv(args.seed_csv)['URL'].dropna().tolist()
+        for name, adapter in adapters.items():
+            frontier.add_many([url for url in urls if adapter_for_url(adapters, url) is adapter], source=name)
+    if args.seed_articles:
+        article_urls = KnowledgeCreator(browser=None).read_text_files(list_of_files=args.seed_articles)
+        frontier.add_many([url for url in article_urls if url], source='article')
+    print(f'Frontier: {frontier.counts()}')
+
+    workers = {}
+    for i in range(args.processes):
+        worker_id = f'{socket.gethostname()}-{os.getpid()}-{i}'
+        process = multiprocessing.Process(target=run_worker, args=(
+            worker_id, args.frontier, args.sources, args.threads, args.batch, args.lease,
+            args.cache_ttl * 3600, args.shared))
+        process.start()
+        workers[worker_id] = process
+    for worker_id, process in workers.items():
+        process.join()
+        if process.exitcode != 0:
+            # Give the URLs of a crashed worker back without waiting for the lease to expire
+            print(f'Worker {worker_id} exited with code {process.exitcode}, '
+                  f'{frontier.release(worker_id)} URLs released.')
+    print(f'Frontier: {frontier.counts()}')
+
+    if args.collect:
+        with open(args.collect, 'w', encoding='utf-8') as f:
+            for project in collect_projects(frontier):
+                f.write(json.dumps(project, ensure_ascii=False) + '\n')
+        print(f'Projects written to {args.collect}')
+    if args.collect_articles:
+        with open(args.collect_articles, 'w', encoding='utf-8') as f:
+            json.dump(dict(frontier.results(source='article')), f, indent=4)
+        print(f'Articles written to {args.collect_articles}')
+    frontier.close()
@@ -0,0 +1,137 @@
+import atexit
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+
+class DriverPool:
+    """
+    A small pool of warm headless Chrome drivers shared across calls and sources.
+
+    Drivers are created lazily up to `size`, handed out with `acquire` or the `driver`
+    context manager, and recycled after `max_pages` page loads to bound their memory.
+    The chromedriver binary is resolved once per pool instead of once per driver.
+
+    Attributes:
+        size (int): Maximum number of live drivers.
+        max_pages (int): Number of page loads after which a driver is replaced.
+
+    Methods:
+        acquire(timeout): Borrow a driver, waiting if all of them are busy.
+        release(driver, discard): Give a driver back to the pool.
+        driver(): Context manager that borrows a driver and gives it back.
+        close(): Quit every driver.
+    """
+
+    def __init__(self, size=2, max_pages=50):
+        self.size = size
+        self.max_pages = max_pages
+        # Idle drivers, the last released first. The condition guards the idle list and the
+        # number of live drivers, and is notified whenever a driver is released or quit.
+        self._idle = []
+        self._pages = {}
+        self._created = 0
+        self._closed = False
+        self._driver_path = None
+        self._available = threading.Condition()
+        atexit.register(self.close)
+
+    def _create_driver(self):
+        """
+        Creates a headless Chrome WebDriver instance.
+        """
+        if self._driver_path is None:
+            self._driver_path = ChromeDriverManager().install()
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')
+        options.add_argument('--disable-gpu')
+        options.add_argument('--no-sandbox')
+        options.add_argument('--disable-dev-shm-usage')
+        driver = webdriver.Chrome(service=Service(self._driver_path), options=options)
+        print('Selenium driver created.')
+        return driver
+
+    def acquire(self, timeout=None):
+        """
+        Borrow a driver, creating one if the pool is not full or waiting for one to be released.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free driver.
+
+        Returns:
+            WebDriver: The driver. It must be given back with `release`.
+
+        Raises:
+            TimeoutError: If no driver was free within `timeout` seconds.
+        """
+        with self._available:
+            # Wake up when a driver is idle or when one was quit and another can be created
+            if not self._available.wait_for(lambda: self._closed or self._idle or self._created < self.size,
+                                            timeout=timeout):
+                raise TimeoutError('No driver was released in time')
+            if self._closed:
+                raise RuntimeError('The driver pool is closed')
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            driver = self._create_driver()
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._available.notify()
+            raise
+        with self._available:
+            self._pages[id(driver)] = 0
+        return driver
+
+    def release(self, driver, discard=False):
+        """
+        Give a driver back to the pool. Drivers that reached `max_pages`, that were discarded
+        or that come back after the pool was closed are quit.
+
+        Args:
+            driver (WebDriver): The driver to give back.
+            discard (bool): If True, the driver is quit instead of reused, e.g. after an error.
+        """
+        with self._available:
+            self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+            recycle = discard or self._closed or self._pages[id(driver)] >= self.max_pages
+            if recycle:
+                self._pages.pop(id(driver), None)
+                self._created -= 1
+            else:
+                self._idle.append(driver)
+            self._available.notify()
+        if recycle:
+            try:
+                driver.quit()
+            except Exception as e:
+                print(f'Error closing Selenium driver: {e}')
+
+    @contextmanager
+    def driver(self):
+        """
+        Borrow a driver for the duration of a `with` block. A driver that raised is discarded.
+        """
+        driver = self.acquire()
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, discard=True)
+            raise
+        self.release(driver)
+
+    def close(self):
+        """
+        Quit every idle driver. Drivers still in use are quit when they are released.
+        """
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for driver in idle:
+            self.release(driver, discard=True)
@@ -0,0 +1,201 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from rate_limit import AdaptiveRateLimiter
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of sending a request to a host whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and requests are refused
+    for `reset_timeout` seconds. Then a single trial request is let through: the circuit
+    closes if it succeeds and opens again if it fails.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open before a trial request.
+        state (str): 'closed', 'open' or 'half-open'.
+
+    Methods:
+        allow(): Check whether a request may be sent.
+        record_success(): Record a successful request.
+        record_failure(): Record a failed request.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check whether a request may be sent.
+
+        Returns:
+            bool: False while the circuit is open or a trial request is in flight.
+        """
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                return True
+            return self.state == 'closed'
+
+    def record_success(self):
+        """
+        Record a successful request, closing the circuit.
+        """
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        """
+        Record a failed request, opening the circuit after too many consecutive failures.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f'Circuit opened after {self.failures} consecutive failures')
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class FetchPolicy:
+    """
+    The per-host throttling, retry and circuit breaking rules shared by every request of a Fetcher.
+
+    Each host gets its own adaptive token bucket, which slows down on 429 and 5xx responses and
+    honors Retry-After, and its own circuit breaker. Failed requests are retried with exponential
+    backoff and full jitter.
+
+    Attributes:
+        rate (float): Default requests per second per host, or None for no rate limit.
+        burst (int): Default bucket size per host.
+        max_retries (int): Retries of a request after a connection error or a retryable status.
+        backoff (float): Base delay in seconds of the exponential backoff.
+        max_backoff (float): Maximum delay in seconds between two attempts.
+        retry_statuses (set): Status codes that are retried.
+
+    Methods:
+        configure(host, rate, burst): Set the rate of a host.
+        limiter(host): Get the token bucket of a host.
+        breaker(host): Get the circuit breaker of a host.
+        retry_after(response): Get the delay requested by a Retry-After header.
+        backoff_delay(attempt, retry_after): Get the delay before the next attempt.
+        open_circuits(): List the hosts whose circuit is open.
+    """
+
+    def __init__(self, rate=5.0, burst=5, min_rate=0.1, max_retries=3, backoff=1.0, max_backoff=60,
+                 failure_threshold=5, reset_timeout=60, retry_statuses=(429, 500, 502, 503, 504)):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retry_statuses = set(retry_statuses)
+        self._limiters = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host, rate, burst=1):
+        """
+        Set the rate of a host, e.g. a stricter budget for a website that bans quickly.
+
+        Args:
+            host (str): The host, e.g. 'www.zonaprop.com.ar'.
+            rate (float): Requests per second, or None for no rate limit.
+            burst (int): Bucket size.
+        """
+        with self._lock:
+            self._limiters[host.lower()] = AdaptiveRateLimiter(rate, burst, self.min_rate) if rate else None
+
+    def limiter(self, host):
+        """
+        Get the token bucket of a host, creating it with the default rate.
+
+        Returns:
+            AdaptiveRateLimiter: The bucket, or None if the host is not rate limited.
+        """
+        host = host.lower()
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = AdaptiveRateLimiter(self.rate, self.burst, self.min_rate) if self.rate else None
+            return self._limiters[host]
+
+    def breaker(self, host):
+        """
+        Get the circuit breaker of a host.
+
+        Returns:
+            CircuitBreaker: The circuit breaker.
+        """
+        host = host.lower()
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def retry_after(self, response):
+        """
+        Get the delay requested by the Retry-After header of a response.
+
+        Args:
+            response (requests.Response): The response.
+
+        Returns:
+            float: The delay in seconds, or None if the header is missing or invalid.
+        """
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Get the delay before the next attempt: a random share of an exponentially growing
+        window, or the Retry-After delay if it is longer.
+
+        Args:
+            attempt (int): The number of the failed attempt, starting at 0.
+            retry_after (float, optional): The delay requested by the host.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        return max(delay, min(retry_after, self.max_backoff)) if retry_after else delay
+
+    def open_circuits(self):
+        """
+        List the hosts whose circuit is open.
+
+        Returns:
+            list: The hosts.
+        """
+        with self._lock:
+            return [host for host, breaker in self._breakers.items() if breaker.state == 'open']
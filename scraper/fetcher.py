@@ -0,0 +1,186 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fetch_policy import CircuitOpenError, FetchPolicy
+
+
+class Fetcher:
+    """
+    A thread-safe HTTP client shared by the scrapers.
+
+    Every request goes through a single keep-alive session, so connections to a
+    host are reused across threads, and a per-host semaphore caps how many
+    requests hit the same host at once. When a cache is given, fresh responses
+    are served from disk and stale ones are revalidated with a conditional request.
+    The fetch policy rate limits every host, retries connection errors, 429 and 5xx
+    responses with jittered backoff and stops requesting hosts that keep failing.
+
+    Attributes:
+        session (requests.Session): The shared session used for every request.
+        cache (HttpCache): Optional response cache.
+        policy (FetchPolicy): The per-host rate limits, retries and circuit breakers.
+        per_host_limit (int): Maximum number of concurrent requests per host.
+        timeout (float): Default timeout in seconds for each request.
+        pages (int): Number of pages downloaded from the network so far.
+        cache_hits (int): Number of responses served from the cache without a request.
+        not_modified (int): Number of cached responses revalidated with a 304.
+        retries (int): Number of requests retried after a failure.
+
+    Methods:
+        get(url, **kwargs): Fetch a URL respecting the per-host limit and fetch policy.
+        throughput(): Pages per second since the fetcher was created.
+        report(): Print a throughput summary.
+    """
+
+    def __init__(self, session=None, cache=None, per_host_limit=4, pool_size=16, timeout=30, policy=None):
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self.cache = cache
+        self.policy = policy if policy is not None else FetchPolicy()
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.pages = 0
+        self.cache_hits = 0
+        self.not_modified = 0
+        self.retries = 0
+        self.started_at = time.perf_counter()
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def _host_slot(self, url):
+        """
+        Get the semaphore that limits concurrent requests to the URL's host.
+
+        Args:
+            url (str): The URL about to be requested.
+
+        Returns:
+            threading.BoundedSemaphore: The semaphore for the host.
+        """
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def _request(self, url, **kwargs):
+        """
+        Send a GET request within the fetch policy of the URL's host, retrying failures.
+
+        Args:
+            url (str): The URL to fetch.
+            **kwargs: Extra arguments passed to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The first response that is not retryable, or the last one.
+
+        Raises:
+            CircuitOpenError: If the circuit of the host is open.
+            requests.RequestException: If every attempt failed with a connection error.
+        """
+        host = urlsplit(url).netloc.lower()
+        limiter = self.policy.limiter(host)
+        breaker = self.policy.breaker(host)
+        for attempt in range(self.policy.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f'Circuit open for {host}, not requesting {url}')
+            if limiter is not None:
+                limiter.acquire()
+            retry_after = None
+            try:
+                with self._host_slot(url):
+                    response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                response, error = None, e
+            else:
+                with self._lock:
+                    self.pages += 1
+                if response.status_code not in self.policy.retry_statuses:
+                    breaker.record_success()
+                    if limiter is not None:
+                        limiter.on_success()
+                    return response
+                breaker.record_failure()
+                retry_after = self.policy.retry_after(response)
+                if limiter is not None:
+                    limiter.on_throttle(retry_after)
+            if attempt == self.policy.max_retries or breaker.state == 'open':
+                break
+            delay = self.policy.backoff_delay(attempt, retry_after)
+            print(f'Retrying {url} in {delay:.1f}s '
+                  f'({response.status_code if response is not None else error})')
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+        if response is None:
+            raise error
+        return response
+
+    def get(self, url, **kwargs):
+        """
+        Fetch a URL through the shared session and the cache.
+
+        Args:
+            url (str): The URL to fetch.
+            **kwargs: Extra arguments passed to `requests.Session.get`.
+
+        Returns:
+            requests.Response: The response. `response.from_cache` tells whether the body
+            came from the cache, either directly or after a 304 revalidation, and
+            `response.unchanged` whether the body is the same as the cached one.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            with self._lock:
+                self.cache_hits += 1
+            response = self.cache.to_response(entry)
+            response.from_cache = response.unchanged = True
+            return response
+        if entry is not None:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), **self.cache.conditional_headers(entry)}
+        response = self._request(url, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.cache.refresh(url)
+            with self._lock:
+                self.not_modified += 1
+            response = self.cache.to_response(entry)
+            response.from_cache = response.unchanged = True
+            return response
+        body_hash = None
+        if self.cache is not None and response.status_code == 200:
+            body_hash = self.cache.store(url, response)
+        response.from_cache = False
+        response.unchanged = entry is not None and body_hash == entry['body_hash']
+        return response
+
+    def throughput(self):
+        """
+        Get the number of pages served per second since the fetcher was created,
+        counting both network downloads and cache hits.
+
+        Returns:
+            float: The throughput in pages per second.
+        """
+        elapsed = time.perf_counter() - self.started_at
+        return (self.pages + self.cache_hits) / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        """
+        Print a throughput summary.
+        """
+        elapsed = time.perf_counter() - self.started_at
+        print(f'Fetched {self.pages} pages in {elapsed:.1f}s ({self.throughput():.2f} pages/s), '
+              f'{self.cache_hits} served from cache, {self.not_modified} not modified, {self.retries} retried')
+        open_circuits = self.policy.open_circuits()
+        if open_circuits:
+            print(f'Open circuits: {", ".join(open_circuits)}')
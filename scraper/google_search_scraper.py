@@ -1,16 +1,21 @@
-import requests
 from bs4 import BeautifulSoup
 from googlesearch import search
-import time
-import chardet
 from autoscraper import AutoScraper
+from concurrency import iter_bounded
+from concurrent.futures import ThreadPoolExecutor
+from fetcher import Fetcher
+from html_parsing import resolve_encoding
+from http_cache import HttpCache
+from url_frontier import UrlFrontier, canonicalize_url
 import os
 
 class RealStateDataScraper:
-    def __init__(self, query_list, num_results=10):
+    def __init__(self, query_list, num_results=10, fetcher=None, frontier=None):
         self.query_list = query_list
         self.num_results = num_results
         self.urls = []
+        self.fetcher = fetcher if fetcher is not None else Fetcher(cache=HttpCache())
+        self.frontier = frontier
 
     def google_search(self):
         """Performs Google searches for all queries and stores the URLs."""
@@ -19,53 +24,60 @@ class RealStateDataScraper:
                 print(f"Searching for: {query}")
                 # Append 'site:.ar' to search only Argentine websites
                 query = f"{query} site:.ar"
-                for url in search(query, num_results=self.num_results, lang='es'):
+                for rank, url in enumerate(search(query, num_results=self.num_results, lang='es')):
                     self.urls.append(url)
+                    if self.frontier is not None:
+                        # Better ranked results are scraped first
+                        self.frontier.add(url, priority=self.num_results - rank, source='search')
         except Exception as e:
             print(f"An error occurred during the Google search: {e}")
 
-    def detect_encoding(self, content):
-        """Detects the encoding of the content."""
-        result = chardet.detect(content)
-        return result['encoding']
+    def detect_encoding(self, content, content_type=None):
+        """Detects the encoding of the content from its declared charset, or from a sample of it."""
+        return resolve_encoding(content, content_type=content_type)
 
     def scrape_url_content(self, url):
         """Scrapes the content of a single URL."""
         try:
-            response = requests.get(url)
+            response = self.fetcher.get(url)
             if response.status_code == 200:
-                encoding = self.detect_encoding(response.content)
-                soup = BeautifulSoup(response.content.decode(encoding), 'html.parser')
+                encoding = self.detect_encoding(response.content, response.headers.get('Content-Type'))
+                soup = BeautifulSoup(response.content.decode(encoding, errors='replace'), 'html.parser')
                 paragraphs = soup.find_all('p')
                 text = "\n".join([para.get_text() for para in paragraphs])
                 return text
             else:
                 print(f"Failed to retrieve content from {url}, status code: {response.status_code}")
-                return self.scrape_alternative(url)
+                return self.scrape_alternative(url, response=response)
         except Exception as e:
             print(f"Failed to scrape {url} with requests: {e}")
             return self.scrape_alternative(url)
 
-    def scrape_alternative(self, url):
-        """Alternative method to scrape the content of a single URL using AutoScraper."""
+    def scrape_alternative(self, url, response=None):
+        """Alternative method to scrape the content of a single URL using AutoScraper.
+
+        The response already fetched by `scrape_url_content` is reused when given.
+        """
         try:
             # Initialize AutoScraper
             scraper = AutoScraper()
             
             # We need to provide the URL and a list of elements we want to scrape.
             # For this example, we will use the same URL and the desired content.
-            response = requests.get(url)
+            if response is None:
+                response = self.fetcher.get(url)
             if response.status_code == 200:
-                encoding = self.detect_encoding(response.content)
-                soup = BeautifulSoup(response.content.decode(encoding), 'html.parser')
+                encoding = self.detect_encoding(response.content, response.headers.get('Content-Type'))
+                html = response.content.decode(encoding, errors='replace')
+                soup = BeautifulSoup(html, 'html.parser')
                 paragraphs = soup.find_all('p')
                 wanted_list = [para.get_text() for para in paragraphs[:3]]  # Take first 3 paragraphs as example
                 
                 # Build the scraper
-                scraper.build(url, wanted_list)
+                scraper.build(url, wanted_list, html=html)
                 
                 # Get the results
-                result = scraper.get_result_similar(url)
+                result = scraper.get_result_similar(url, html=html)
                 text = "\n".join(result)
                 return text
             else:
@@ -76,22 +88,59 @@ class RealStateDataScraper:
             return ""
 
     def scrape_all_urls(self):
-        """Scrapes content from all stored URLs and returns it as a list of dictionaries."""
+        """Scrapes content from all stored URLs and returns it as a list of dictionaries.
+
+        Requests are paced per host by the fetch policy of the fetcher instead of a fixed delay.
+        """
         results = []
         for idx, url in enumerate(self.urls):
             print(f"Scraping URL {idx + 1}/{len(self.urls)}: {url}")
             content = self.scrape_url_content(url)
             results.append({'url': url, 'content': content})
-            time.sleep(1)  # Adding delay to avoid being blocked
         return results
 
-    def get_unique_results(self):
-        """Removes duplicate URLs and returns a dictionary with unique URLs and their contents."""
-        unique_urls = set(self.urls)
+    def scrape_unique_url(self, url):
+        """Scrapes the content of a URL and records the outcome in the frontier."""
+        content = self.scrape_url_content(url)
+        if self.frontier is not None:
+            if content:
+                self.frontier.mark_fetched(url, content=content)
+            else:
+                self.frontier.mark_failed(url)
+        return content
+
+    def get_unique_results(self, workers=1, existing_results=None):
+        """Removes duplicate URLs and returns a list of dictionaries with the unique URLs and their contents.
+
+        URLs are compared in their canonical form, so fragments and tracking parameters do not
+        cause a page to be scraped twice. With a frontier, the URLs found by this run's searches
+        are scraped in priority order and the ones already fetched in this run are skipped;
+        URLs queued by earlier searches are left in the queue. Up to `workers` URLs are scraped
+        at a time, and the ones with content in `existing_results`, e.g. loaded with
+        `load_results_from_file`, are not scraped again.
+        """
+        existing_results = existing_results or {}
+        if self.frontier is not None:
+            unique_urls = self.frontier.drain(source='search', urls=self.urls)
+        else:
+            unique_urls = dict.fromkeys(canonicalize_url(url) for url in self.urls)
         unique_results = []
+        missing_urls = []
         for url in unique_urls:
-            content = self.scrape_url_content(url)
-            unique_results.append({'url': url, 'content': content})
+            if existing_results.get(url):
+                unique_results.append({'url': url, 'content': existing_results[url]})
+                if self.frontier is not None:
+                    self.frontier.mark_fetched(url, content=existing_results[url])
+            else:
+                missing_urls.append(url)
+        if unique_results:
+            print(f"{len(unique_results)} results already saved.")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def submit(url):
+                return pool.submit(self.scrape_unique_url, url)
+
+            for url, content in iter_bounded(submit, missing_urls, 2 * workers):
+                unique_results.append({'url': url, 'content': content})
         return unique_results
 
     def save_results_to_file(self, results, file_name):
@@ -103,6 +152,18 @@ class RealStateDataScraper:
                 f.write(f"Content:\n{result['content']}\n")
                 f.write("="*80 + "\n")
 
+    def load_results_from_file(self, file_name):
+        """Loads the results saved by `save_results_to_file`, keyed by their canonical URL."""
+        results = {}
+        if not os.path.exists(file_name):
+            return results
+        with open(file_name, 'r', encoding='utf-8') as f:
+            for block in f.read().split("=" * 80 + "\n"):
+                if block.startswith("URL: ") and "\nContent:\n" in block:
+                    url, content = block[len("URL: "):].split("\nContent:\n", 1)
+                    results[canonicalize_url(url.strip())] = content[:-1] if content.endswith("\n") else content
+        return results
+
     def save_urls_to_file(self, file_name):
         """Saves the scraped URLs to a text file."""
         os.makedirs(os.path.dirname(file_name), exist_ok=True)
@@ -112,6 +173,16 @@ class RealStateDataScraper:
 
 # Example usage
 if __name__ == "__main__":
+    import argparse
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+    from document_store import DocumentStore
+
+    parser = argparse.ArgumentParser(description='Search advice articles on Google and scrape their content.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of URLs scraped in parallel.')
+    parser.add_argument('--refetch', action='store_true', help='Scrape again the URLs whose content is already saved.')
+    args = parser.parse_args()
+
     queries = [
         "Consejos para comprar departamentos en pozo",
         "Tips para invertir en proyectos inmobiliarios en pozo",
@@ -127,13 +198,23 @@ if __name__ == "__main__":
 
     num_results = 10  # Set the number of results to retrieve
 
-    scraper = RealStateDataScraper(query_list=queries, num_results=num_results)
+    frontier = UrlFrontier()
+    frontier.requeue(source='search')
+    scraper = RealStateDataScraper(query_list=queries, num_results=num_results, frontier=frontier)
     scraper.google_search()
     
     # Save all URLs to a file
     scraper.save_urls_to_file(file_name='data/raw/scraped_real_state_advice_urls.txt')
     
-    unique_results = scraper.get_unique_results()
+    results_file = 'data/raw/scraped_articles_data.txt'
+    existing_results = {} if args.refetch else scraper.load_results_from_file(results_file)
+    unique_results = scraper.get_unique_results(workers=args.workers, existing_results=existing_results)
     
     # Save the unique results to a file
-    scraper.save_results_to_file(unique_results, file_name='data/raw/scraped_articles_data.txt')
+    scraper.save_results_to_file(unique_results, file_name=results_file)
+
+    # And to the document store read by the vector index
+    store = DocumentStore()
+    store.upsert_many({'url': result['url'], 'text': result['content'], 'source': 'search'}
+                      for result in unique_results if result['content'])
+    store.close()
@@ -0,0 +1,122 @@
+import codecs
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+HEADER_CHARSET_PATTERN = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+# Byte order marks, longest first so UTF-32 is not taken for UTF-16
+BOMS = ((codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'), (codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+# The HTML standard looks for <meta charset> within the first 1024 bytes; some pages put it a bit later
+META_SCAN_BYTES = 4096
+
+
+def make_soup(markup, parser=None, parse_only=None):
+    """
+    Create a BeautifulSoup instance with the fastest available parser.
+
+    Args:
+        markup (str or bytes): The HTML to parse.
+        parser (str, optional): The parser to use. Defaults to lxml when it is installed,
+            otherwise to the standard library html.parser.
+        parse_only (SoupStrainer, optional): Restricts the tree to the matching subtrees.
+
+    Returns:
+        BeautifulSoup: The BeautifulSoup instance.
+    """
+    return BeautifulSoup(markup, parser or DEFAULT_PARSER, parse_only=parse_only)
+
+
+def class_strainer(*classes):
+    """
+    Create a SoupStrainer that keeps only the subtrees of the elements with the given classes.
+
+    Args:
+        *classes (str): The CSS classes of the elements to keep.
+
+    Returns:
+        SoupStrainer: The strainer.
+    """
+    return SoupStrainer(class_=list(classes))
+
+
+def find_text(soup, name, css_class, default=''):
+    """
+    Get the stripped text of the first element matching a tag and a CSS class.
+
+    Args:
+        soup (BeautifulSoup): The BeautifulSoup instance to search.
+        name (str): The tag name.
+        css_class (str): The CSS class.
+        default (str): The value returned when no element matches.
+
+    Returns:
+        str: The stripped text of the element, or the default.
+    """
+    element = soup.find(name, {'class': css_class})
+    return element.text.strip() if element is not None else default
+
+
+def _known_encoding(name):
+    """
+    Get the canonical name of an encoding, or None if Python does not know it.
+    """
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def resolve_encoding(content, content_type=None, sample_size=16384):
+    """
+    Resolve the encoding of a page, from the cheapest evidence to the most expensive.
+
+    As in browsers, a byte order mark wins, then the charset of the Content-Type header,
+    then the `<meta charset>` of the head of the page. Only when none is declared the first
+    `sample_size` bytes are checked: a valid UTF-8 sample is taken as UTF-8, otherwise
+    the statistical detector runs on the sample instead of on the whole page.
+
+    Args:
+        content (bytes): The body of the response.
+        content_type (str, optional): The Content-Type header of the response.
+        sample_size (int): Number of bytes inspected when no encoding is declared.
+
+    Returns:
+        str: The name of the encoding, 'utf-8' if it could not be detected.
+    """
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            return encoding
+    if content_type:
+        match = HEADER_CHARSET_PATTERN.search(content_type)
+        encoding = _known_encoding(match.group(1)) if match else None
+        if encoding:
+            return encoding
+    match = META_CHARSET_PATTERN.search(content[:META_SCAN_BYTES])
+    encoding = _known_encoding(match.group(1).decode('ascii', 'ignore')) if match else None
+    if encoding:
+        return encoding
+    sample = content[:sample_size]
+    try:
+        # A multi-byte character cut at the end of the sample is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=len(sample) == len(content))
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    if chardet is not None:
+        encoding = _known_encoding(chardet.detect(sample)['encoding'])
+        if encoding:
+            return encoding
+    return 'utf-8'
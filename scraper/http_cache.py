@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HttpCache:
+    """
+    A content-addressed on-disk cache for HTTP responses, backed by SQLite.
+
+    Response bodies are stored once per SHA-256 hash, so identical pages served under
+    different URLs share the same blob. Entries younger than `ttl` are served without
+    touching the network; older entries are revalidated with a conditional request
+    using their ETag and Last-Modified validators.
+
+    Attributes:
+        path (str): The path of the SQLite database.
+        ttl (float): Seconds during which a cached response is served without revalidation.
+        max_entries (int): Maximum number of cached URLs before the least recently used are evicted.
+
+    Methods:
+        lookup(url): Get the cached entry for a URL.
+        is_fresh(entry): Check whether an entry can be served without revalidation.
+        conditional_headers(entry): Build the validator headers for a conditional request.
+        store(url, response): Save a response.
+        refresh(url): Mark an entry as revalidated after a 304 response.
+        to_response(entry): Build a `requests.Response` from a cached entry.
+        evict(): Drop the least recently used entries above `max_entries`.
+        clear(): Remove every cached response.
+    """
+
+    # Headers describing the transfer rather than the content; the stored body is already decoded.
+    SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection'}
+    # Seconds within which repeated hits do not update the access time again. Eviction only
+    # needs an approximate recency, and a write per hit would serialize the readers.
+    ACCESS_RESOLUTION = 3600
+
+    def __init__(self, path='data/cache/http_cache.sqlite', ttl=24 * 3600, max_entries=50000):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._stores_since_eviction = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            status INTEGER,
+            headers TEXT,
+            body_hash TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at REAL,
+            accessed_at REAL
+        )
+        ''')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS bodies (
+            body_hash TEXT PRIMARY KEY,
+            content BLOB
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)')
+        self.conn.commit()
+
+    def lookup(self, url):
+        """
+        Get the cached entry for a URL.
+
+        Args:
+            url (str): The requested URL.
+
+        Returns:
+            dict: The cached entry, or None if the URL is not cached.
+        """
+        with self._lock:
+            row = self.conn.execute('''
+            SELECT r.status, r.headers, r.body_hash, r.etag, r.last_modified, r.fetched_at, r.accessed_at, b.content
+            FROM responses r JOIN bodies b ON b.body_hash = r.body_hash
+            WHERE r.url = ?
+            ''', (url,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if row[6] is None or now - row[6] >= self.ACCESS_RESOLUTION:
+                self.conn.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (now, url))
+                self.conn.commit()
+        status, headers, body_hash, etag, last_modified, fetched_at, _, content = row
+        return {
+            'url': url,
+            'status': status,
+            'headers': json.loads(headers),
+            'body_hash': body_hash,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at,
+            'content': content,
+        }
+
+    def is_fresh(self, entry):
+        """
+        Check whether an entry can be served without revalidation.
+
+        Args:
+            entry (dict): A cached entry returned by `lookup`.
+
+        Returns:
+            bool: True if the entry is younger than the TTL.
+        """
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """
+        Build the validator headers for a conditional request.
+
+        Args:
+            entry (dict): A cached entry returned by `lookup`.
+
+        Returns:
+            dict: The If-None-Match and If-Modified-Since headers available for the entry.
+        """
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, response):
+        """
+        Save a response.
+
+        Args:
+            url (str): The requested URL.
+            response (requests.Response): The response to cache.
+
+        Returns:
+            str: The hash of the stored body.
+        """
+        content = response.content
+        body_hash = hashlib.sha256(content).hexdigest()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in self.SKIPPED_HEADERS}
+        now = time.time()
+        with self._lock:
+            self.conn.execute('INSERT OR IGNORE INTO bodies (body_hash, content) VALUES (?, ?)', (body_hash, content))
+            self.conn.execute('''
+            INSERT OR REPLACE INTO responses (
+                url, status, headers, body_hash, etag, last_modified, fetched_at, accessed_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (url, response.status_code, json.dumps(headers), body_hash,
+                  response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now))
+            self.conn.commit()
+            self._stores_since_eviction += 1
+            evict = self._stores_since_eviction >= 100
+        if evict:
+            self.evict()
+        return body_hash
+
+    def refresh(self, url):
+        """
+        Mark an entry as revalidated after a 304 response.
+
+        Args:
+            url (str): The requested URL.
+        """
+        with self._lock:
+            self.conn.execute('UPDATE responses SET fetched_at = ? WHERE url = ?', (time.time(), url))
+            self.conn.commit()
+
+    def to_response(self, entry):
+        """
+        Build a `requests.Response` from a cached entry.
+
+        Args:
+            entry (dict): A cached entry returned by `lookup`.
+
+        Returns:
+            requests.Response: The rebuilt response.
+        """
+        response = requests.Response()
+        response.status_code = entry['status']
+        response._content = entry['content']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.url = entry['url']
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        return response
+
+    def evict(self):
+        """
+        Drop the least recently used entries above `max_entries` and the bodies no entry references.
+        """
+        with self._lock:
+            self._stores_since_eviction = 0
+            (count,) = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()
+            if count > self.max_entries:
+                self.conn.execute('''
+                DELETE FROM responses WHERE url IN (
+                    SELECT url FROM responses ORDER BY accessed_at ASC LIMIT ?
+                )
+                ''', (count - self.max_entries,))
+                self.conn.execute('DELETE FROM bodies WHERE body_hash NOT IN (SELECT body_hash FROM responses)')
+            self.conn.commit()
+
+    def clear(self):
+        """
+        Remove every cached response.
+        """
+        with self._lock:
+            self.conn.execute('DELETE FROM responses')
+            self.conn.execute('DELETE FROM bodies')
+            self.conn.commit()
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self.conn.close()
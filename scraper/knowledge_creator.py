@@ -1,14 +1,57 @@
 import os
 from bs4 import BeautifulSoup
 from browser import Browser
+from concurrency import iter_bounded
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from run_journal import RunJournal
+from url_frontier import UrlFrontier, canonicalize_url
 import json
 import re
+import threading
 from fpdf import FPDF
 
+# Returned for the URLs taken by another process, which are left out of the articles
+CLAIMED_ELSEWHERE = object()
+
+# Articles rendered by each process of the pool at least; smaller batches are rendered
+# serially, as starting the processes costs more than they save
+MIN_PDFS_PER_WORKER = 64
+
+# The font of the PDF worker processes, set once per process by _init_pdf_worker
+_pdf_font = None
+
+
+def _init_pdf_worker(font, font_path):
+    global _pdf_font
+    _pdf_font = (font, font_path)
+    # Loading the font once parses the TTF and writes its metrics cache next to it, so the
+    # documents of this worker only read the cached metrics
+    FPDF().add_font(font, '', font_path, uni=True)
+
+
+def _new_article_pdf():
+    font, font_path = _pdf_font
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_font(font, '', font_path, uni=True)
+    pdf.set_font(font, '', 14)
+    return pdf
+
+
+def _render_article_pdf(job):
+    article_text, pdf_file_path = job
+    pdf = _new_article_pdf()
+    pdf.multi_cell(0, 10, article_text)
+    pdf.output(pdf_file_path)
+    return pdf_file_path
+
 class KnowledgeCreator:
-    def __init__(self, browser, directory=None):
+    def __init__(self, browser, directory=None, journal=None, frontier=None):
         self.browser = browser
         self.directory = directory
+        self.journal = journal
+        self.frontier = frontier
 
     def read_text_files(self, list_of_files=None):
         all_urls = []
@@ -29,7 +72,8 @@ class KnowledgeCreator:
 
     def create_unique_url_set(self, list_of_files=None):
         all_urls = self.read_text_files(list_of_files=list_of_files)
-        unique_urls = set(all_urls)
+        # Spellings of the same page (fragments, tracking parameters) count once
+        unique_urls = {canonicalize_url(url) for url in all_urls if url}
         print(f"Number of unique urls: {len(unique_urls)}")
         return unique_urls
     
@@ -59,14 +103,54 @@ class KnowledgeCreator:
             "]+", flags=re.UNICODE)
         return emoji_pattern.sub(r'', text)
     
-    def create_article_dicts(self, list_of_files=None):
+    def scrape_article(self, url):
+        if self.journal is not None and self.journal.is_done('article', url):
+            return self.journal.get('article', url)
+        if self.frontier is not None and not self.frontier.claim_url(url, source='article'):
+            # Already fetched in this run or taken by another process
+            return CLAIMED_ELSEWHERE
+        article_text = self.get_text_from_url(url)
+        # Failed scrapes return None and are retried on resume
+        if self.journal is not None and article_text is not None:
+            self.journal.record('article', url, article_text)
+        if self.frontier is not None:
+            if article_text is None:
+                self.frontier.mark_failed(url)
+            else:
+                self.frontier.mark_fetched(url, content=article_text)
+        return article_text
+
+    def create_article_dicts(self, list_of_files=None, workers=1, existing_articles=None):
+        """
+        Scrapes the articles of the URL files, `workers` at a time.
+
+        The articles of `existing_articles`, e.g. loaded with `load_articles_from_json`, are
+        reused without fetching them again; only the missing or failed ones are scraped.
+        """
         unique_urls = self.create_unique_url_set(list_of_files=list_of_files)
-        articles = []
-        for url in unique_urls:
-            article_text = self.get_text_from_url(url)
-            articles.append({'url': url, 'article_text': article_text})
+        existing_articles = existing_articles or {}
+        articles = [{'url': url, 'article_text': existing_articles[url]}
+                    for url in unique_urls if existing_articles.get(url)]
+        if articles:
+            print(f"Number of articles already on disk: {len(articles)}")
+        missing_urls = [url for url in unique_urls if not existing_articles.get(url)]
+        if self.frontier is not None:
+            self.frontier.add_many(missing_urls, source='article')
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            def submit(url):
+                return pool.submit(self.scrape_article, url)
+
+            for url, article_text in iter_bounded(submit, missing_urls, 2 * workers, ordered=False):
+                if article_text is not CLAIMED_ELSEWHERE:
+                    articles.append({'url': url, 'article_text': article_text})
         print(f"Number of articles scraped: {len(articles)}")
         return articles
+
+    def load_articles_from_json(self, input_file):
+        if not os.path.exists(input_file):
+            return {}
+        with open(input_file, 'r', encoding='utf-8') as f:
+            return {canonicalize_url(url): article_text for url, article_text in json.load(f).items()}
     
     def save_articles_to_json(self, articles, output_file):
         dict_articles = {article['url']: article['article_text'] for article in articles}
@@ -82,24 +166,47 @@ class KnowledgeCreator:
                 f.write("#################\n")
         print('Text file saved')
 
+    def save_articles_to_store(self, articles, store):
+        # The vector index reads the articles from the document store instead of their PDFs
+        changed = store.upsert_many({'url': article['url'], 'text': article['article_text'], 'source': 'article'}
+                                    for article in articles if article['article_text'])
+        print(f"Number of new or changed articles in the document store: {changed}")
+        return changed
+
+    def save_articles_to_pdf_in_background(self, articles, output_dir, **kwargs):
+        # PDFs are only a human readable copy, rendered while the rest of the run goes on
+        thread = threading.Thread(target=self.save_articles_to_pdf, args=(articles, output_dir), kwargs=kwargs,
+                                  name='articles-pdf')
+        thread.start()
+        return thread
+
     def save_articles_to_pdf(self, articles, output_dir, font='DejaVu',
-                             font_path='assets/fonts/DejaVu_Sans/DejaVuSansCondensed.ttf'):
+                             font_path='assets/fonts/DejaVu_Sans/DejaVuSansCondensed.ttf', skip_urls=(), workers=None):
+        """
+        Renders every article as a PDF file, in a pool of `workers` processes (one per core by default).
+        Fewer processes are started when there are not `MIN_PDFS_PER_WORKER` articles for each.
+        """
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
         
+        jobs = []
         for idx, article in enumerate(articles):
             url = article['url']
             article_text = article['article_text']
             if article_text is not None:
                 file_name = self.get_valid_file_name(url, idx)[0:20]
-                pdf = FPDF()
-                pdf.add_page()
-                pdf.set_auto_page_break(auto=True, margin=15)
-                pdf.add_font(font, '', font_path, uni=True)
-                pdf.set_font(font, '', 14)
-                pdf.multi_cell(0, 10, article_text)
-                pdf_file_path = os.path.join(output_dir, f"{file_name}.pdf")
-                pdf.output(pdf_file_path)
+                if url in skip_urls and os.path.exists(os.path.join(output_dir, f"{file_name}.pdf")):
+                    # The article did not change since its PDF was written
+                    continue
+                jobs.append((article_text, os.path.join(output_dir, f"{file_name}.pdf")))
+        workers = min(workers or os.cpu_count() or 1, len(jobs) // MIN_PDFS_PER_WORKER)
+        if workers <= 1:
+            _init_pdf_worker(font, font_path)
+            for pdf_file_path in map(_render_article_pdf, jobs):
+                print(f"Saved PDF: {pdf_file_path}")
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_worker, initargs=(font, font_path)) as pool:
+            for pdf_file_path in pool.map(_render_article_pdf, jobs, chunksize=max(1, len(jobs) // (4 * workers))):
                 print(f"Saved PDF: {pdf_file_path}")
     
     def get_valid_file_name(self, url, idx):
@@ -116,19 +223,49 @@ class KnowledgeCreator:
 
 # Usage example
 if __name__ == '__main__':
+    import argparse
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+    from document_store import DocumentStore
+
+    parser = argparse.ArgumentParser(description='Scrape the advice articles and save them as text, json and to the document store.')
+    parser.add_argument('--resume', action='store_true', help='Skip the articles scraped by a previous run.')
+    parser.add_argument('--workers', type=int, default=8, help='Number of articles scraped in parallel.')
+    parser.add_argument('--refetch', action='store_true', help='Scrape again the articles already saved to the JSON file.')
+    parser.add_argument('--pdf', action='store_true', help='Also render the articles as PDF files, in the background.')
+    parser.add_argument('--pdf-workers', type=int, default=None, help='Number of processes rendering PDF files (default: one per core).')
+    args = parser.parse_args()
+
     directory_paths = ['data/raw/real_state_advice_urls.txt', 'data/raw/scraped_real_state_advice_urls.txt']
     browser_instance = Browser()
-    knowledge_creator = KnowledgeCreator(browser=browser_instance)
-    unique_urls = knowledge_creator.create_unique_url_set(list_of_files=directory_paths)
-    articles = knowledge_creator.create_article_dicts(list_of_files=directory_paths)
+    journal = RunJournal('data/raw/journals/articles_run.jsonl', resume=args.resume)
+    frontier = UrlFrontier()
+    # A new run fetches every article again; a resumed one retries only the unfinished ones
+    frontier.requeue(states=('fetching', 'failed') if args.resume else ('fetching', 'fetched', 'failed'),
+                     source='article')
+    knowledge_creator = KnowledgeCreator(browser=browser_instance, journal=journal, frontier=frontier)
+    json_output_file = 'data/raw/json_articles.json'
+    existing_articles = {} if args.refetch else knowledge_creator.load_articles_from_json(json_output_file)
+    articles = knowledge_creator.create_article_dicts(list_of_files=directory_paths, workers=args.workers,
+                                                     existing_articles=existing_articles)
+    journal.close()
     
+    pdf_thread = None
+    if args.pdf:
+        pdf_output_dir = 'data/processed/pdf_files'
+        pdf_thread = knowledge_creator.save_articles_to_pdf_in_background(
+            articles, pdf_output_dir, skip_urls={url for url, text in existing_articles.items() if text},
+            workers=args.pdf_workers)
+
+    store = DocumentStore()
+    knowledge_creator.save_articles_to_store(articles, store)
+    store.close()
+
     output_file = 'data/raw/articles.txt'
     knowledge_creator.save_articles_to_file(articles, output_file)
 
-    json_output_file = 'data/raw/json_articles.json'
     knowledge_creator.save_articles_to_json(articles, json_output_file)
 
-    pdf_output_dir = 'data/processed/pdf_files'
-    knowledge_creator.save_articles_to_pdf(articles, pdf_output_dir)
-
+    if pdf_thread is not None:
+        pdf_thread.join()
     print("Articles saved to file successfully!")
@@ -0,0 +1,293 @@
+import os
+import re
+import sys
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from urllib.parse import urlsplit
+
+# Prices are parsed the same way as for the typed columns of the database
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+from normalization import parse_price  # noqa: E402
+
+THOUSANDS_PATTERN = re.compile(r'\b(\d{1,2})\.(\d{3})\b')
+NUMBER_RANGE_PATTERN = re.compile(r'\b(\d{1,5})\s*(?:/|-|al|y|a)\s*\d{1,5}\b')
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+
+# Spellings of the same word in street names, mapped to a single one
+STREET_WORDS = {
+    'av': 'av', 'avda': 'av', 'avd': 'av', 'avenida': 'av',
+    'bv': 'bv', 'bvd': 'bv', 'bvard': 'bv', 'boulevard': 'bv', 'bulevar': 'bv',
+    'pje': 'pasaje', 'psje': 'pasaje', 'pasaje': 'pasaje',
+    'diag': 'diagonal', 'diagonal': 'diagonal',
+    'gral': 'general', 'pte': 'presidente', 'pres': 'presidente', 'dr': 'doctor', 'dra': 'doctora',
+    'ing': 'ingeniero', 'cnel': 'coronel', 'tte': 'teniente', 'cap': 'capitan', 'mcal': 'mariscal',
+    'sta': 'santa', 'sto': 'santo', 'sn': 'san',
+}
+# The type of a street, which one website writes and another leaves out: 'Av. San Juan' is 'San Juan'
+STREET_TYPES = {'av', 'bv'}
+# Words that carry no information about the street
+STOP_WORDS = {'calle', 'c', 'n', 'nro', 'no', 'num', 'numero', 'de', 'del', 'la', 'el', 'los', 'las', 'al'}
+
+
+def normalize_address(address):
+    """
+    Normalize an address so the spellings of different websites compare equal.
+
+    Accents, punctuation, the floor or unit after the first comma and the words that carry no
+    information are dropped, street abbreviations are expanded, thousands separators are removed
+    from door numbers and a range of door numbers like '2450/2470' is reduced to its first number.
+
+    Args:
+        address (str): The address, e.g. 'Av. San Juan 2450/2470, 3° B'.
+
+    Returns:
+        str: The normalized address, e.g. 'av san juan 2450'. Empty if there is no address.
+    """
+    if not isinstance(address, str) or address == 'nan':
+        return ''
+    address = unicodedata.normalize('NFKD', address.split(',')[0])
+    address = ''.join(char for char in address if not unicodedata.combining(char)).lower()
+    address = NUMBER_RANGE_PATTERN.sub(r'\1', THOUSANDS_PATTERN.sub(r'\1\2', address))
+    words = NON_WORD_PATTERN.sub(' ', address).split()
+    return ' '.join(STREET_WORDS.get(word, word) for word in words if word not in STOP_WORDS)
+
+
+def address_key(address):
+    """
+    Split a normalized address into its street and door number.
+
+    Args:
+        address (str): The address, normalized or not.
+
+    Returns:
+        tuple: The street and the door number, which is None if the address has none.
+    """
+    words = normalize_address(address).split()
+    for i in range(len(words) - 1, 0, -1):
+        if words[i].isdigit():
+            return ' '.join(words[:i]), int(words[i])
+    return ' '.join(words), None
+
+
+def street_name(street):
+    """
+    Drop the type of a normalized street, e.g. 'san juan' for 'av san juan'.
+    """
+    return ' '.join(word for word in street.split() if word not in STREET_TYPES)
+
+
+def parse_m2(m2):
+    """
+    Parse a surface in m2, given as a number or a string.
+
+    Returns:
+        float: The surface, or None if it is unknown.
+    """
+    try:
+        m2 = float(str(m2).lower().replace('m2', '').replace(',', '.').strip())
+    except ValueError:
+        return None
+    return m2 if m2 > 0 else None
+
+
+def _close(a, b, tolerance):
+    return abs(a - b) <= tolerance * max(a, b)
+
+
+class ListingDeduplicator:
+    """
+    Detects the projects listed on more than one website.
+
+    Projects are blocked by the hundred of their door number, so only a handful of candidates
+    are compared, and matched by the similarity of their normalized street, without its type
+    like 'av', and the distance between their door numbers. When both projects have units with a price or a surface, a
+    pair of units with the same price and m2 confirms the match; otherwise the addresses
+    have to match exactly.
+
+    Attributes:
+        similarity (float): Minimum similarity between two streets, from 0 to 1.
+        number_tolerance (int): Maximum distance between the door numbers of the same building.
+        price_tolerance (float): Maximum relative difference between the prices of the same unit.
+        m2_tolerance (float): Maximum relative difference between the surfaces of the same unit.
+        duplicates (int): Number of duplicates found so far.
+
+    Methods:
+        find_duplicate(project): Find a project of another website that is the same one.
+        add(project): Index a project so its duplicates are found, or update its units.
+        find_or_add(project): Find a duplicate of a project, or index it if there is none.
+        deduplicate(projects): Keep the first project of each group of duplicates.
+    """
+
+    def __init__(self, similarity=0.85, number_tolerance=20, price_tolerance=0.05, m2_tolerance=0.05):
+        self.similarity = similarity
+        self.number_tolerance = number_tolerance
+        self.price_tolerance = price_tolerance
+        self.m2_tolerance = m2_tolerance
+        self.duplicates = 0
+        self._blocks = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, project):
+        """
+        Get the fields of a project compared by the matching, or None if its address has no number.
+        """
+        street, number = address_key(project.get('project_address'))
+        units = project.get('properties') or []
+        if number is None:
+            for unit in units:
+                street, number = address_key(unit.get('prop_address') if unit else None)
+                if number is not None:
+                    break
+        if number is None or not street:
+            return None
+        return {
+            'url': project['project_url'],
+            'source': project.get('project_source') or urlsplit(project['project_url']).netloc.lower(),
+            'street': street_name(street),
+            'number': number,
+            'units': [(parse_price(unit.get('prop_price')), parse_m2(unit.get('prop_m2'))) for unit in units if unit],
+        }
+
+    def _blocks_of(self, number):
+        return {(number - self.number_tolerance) // 100, (number + self.number_tolerance) // 100}
+
+    def _confirmed(self, a, b):
+        """
+        Compare the units of two projects with similar addresses.
+
+        Returns:
+            bool: True if a pair of units has the same price and m2, as far as both are known,
+                False if no pair does, or None if no pair of units can be compared.
+        """
+        compared = False
+        for (price_a, currency_a), m2_a in a['units']:
+            for (price_b, currency_b), m2_b in b['units']:
+                same = []
+                if price_a and price_b and currency_a == currency_b:
+                    same.append(_close(price_a, price_b, self.price_tolerance))
+                if m2_a and m2_b:
+                    same.append(_close(m2_a, m2_b, self.m2_tolerance))
+                if same and all(same):
+                    return True
+                compared = compared or bool(same)
+        return False if compared else None
+
+    def _matches(self, a, b):
+        if a['source'] == b['source'] or abs(a['number'] - b['number']) > self.number_tolerance:
+            return False
+        if SequenceMatcher(None, a['street'], b['street']).ratio() < self.similarity:
+            return False
+        confirmed = self._confirmed(a, b)
+        if confirmed is not None:
+            return confirmed
+        # Without comparable units, only the same address is trusted
+        return a['street'] == b['street'] and a['number'] == b['number']
+
+    def _find(self, entry):
+        for block in self._blocks_of(entry['number']):
+            for url in self._blocks.get(block, []):
+                candidate = self._entries[url]
+                if candidate['url'] != entry['url'] and self._matches(entry, candidate):
+                    self.duplicates += 1
+                    return candidate['url']
+        return None
+
+    def _add(self, entry):
+        if entry['url'] not in self._entries:
+            self._blocks.setdefault(entry['number'] // 100, []).append(entry['url'])
+        elif self._entries[entry['url']]['number'] // 100 != entry['number'] // 100:
+            self._blocks[self._entries[entry['url']]['number'] // 100].remove(entry['url'])
+            self._blocks.setdefault(entry['number'] // 100, []).append(entry['url'])
+        self._entries[entry['url']] = entry
+
+    def find_duplicate(self, project):
+        """
+        Find an indexed project of another website that is the same as the given one.
+
+        Args:
+            project (dict): A project, in the format of `ArgenPropData.scrape_project`. Its
+                properties may still be empty.
+
+        Returns:
+            str: The URL of the indexed project, or None if there is none.
+        """
+        entry = self._entry(project)
+        if entry is None:
+            return None
+        with self._lock:
+            return self._find(entry)
+
+    def add(self, project):
+        """
+        Index a project so that its duplicates on other websites are found. A project already
+        indexed is updated, e.g. with the units scraped after it was first indexed.
+
+        Args:
+            project (dict): A project, in the format of `ArgenPropData.scrape_project`.
+        """
+        entry = self._entry(project)
+        if entry is None:
+            return
+        with self._lock:
+            self._add(entry)
+
+    def find_or_add(self, project):
+        """
+        Find an indexed project of another website that is the same as the given one, or index
+        the given one if there is none. Both happen under the same lock, so two projects
+        scraped at the same time see each other.
+
+        Args:
+            project (dict): A project, in the format of `ArgenPropData.scrape_project`.
+
+        Returns:
+            str: The URL of the indexed project, or None if the project was indexed.
+        """
+        entry = self._entry(project)
+        if entry is None:
+            return None
+        with self._lock:
+            duplicate_of = self._find(entry)
+            if duplicate_of is None:
+                self._add(entry)
+            return duplicate_of
+
+    def deduplicate(self, projects):
+        """
+        Keep the first project of each group of duplicates.
+
+        Args:
+            projects (iterable): The projects, in the format of `ArgenPropData.scrape_project`.
+
+        Returns:
+            tuple: The projects kept, and the URL of the kept project of each dropped one.
+        """
+        kept, duplicates = [], {}
+        for project in projects:
+            duplicate_of = self.find_or_add(project)
+            if duplicate_of is None:
+                kept.append(project)
+            else:
+                duplicates[project['project_url']] = duplicate_of
+        return kept, duplicates
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Drop the projects listed on more than one website.')
+    parser.add_argument('input', help='The scraped projects, e.g. data/raw/properties_data.json.')
+    parser.add_argument('--output', default=None, help='The deduplicated projects (default: overwrite the input).')
+    args = parser.parse_args()
+
+    with open(args.input, encoding='utf-8') as f:
+        projects = json.load(f)
+    kept, duplicates = ListingDeduplicator().deduplicate(projects)
+    for url, duplicate_of in duplicates.items():
+        print(f'{url} is a duplicate of {duplicate_of}')
+    with open(args.output or args.input, 'w', encoding='utf-8') as f:
+        json.dump(kept, f, indent=4)
+    print(f'{len(duplicates)} duplicates dropped, {len(kept)} projects kept.')
@@ -0,0 +1,331 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from concurrency import iter_bounded
+from fetcher import Fetcher
+from http_cache import HttpCache
+from listing_dedup import ListingDeduplicator
+from run_journal import RunJournal
+from source_adapters import adapter_for_url, create_adapters
+from url_frontier import canonicalize_url
+
+# Returned for the projects and units whose page could not be fetched, e.g. because the circuit
+# of their host is open. They are not journaled, so that a resumed run retries them
+FETCH_FAILED = object()
+
+class PropertyScraper:
+    """
+    Scrapes the projects of every source, and their units, with one concurrent fetch and parse engine.
+
+    The pages are fetched here and handed to the adapter of their source, which only parses
+    them, so every source gets the same shared fetcher, cache, rate limits, concurrency,
+    run journal and incremental mode.
+
+    A project listed by more than one website is only scraped once: a sample of its units is
+    fetched first, and when the address and those units match a project already scraped from
+    another source, the rest of its units are not fetched.
+
+    Attributes:
+        urls (list): The URLs of the projects, of any source.
+        fetcher (Fetcher): The fetcher shared by every source.
+        adapters (dict): The adapter of each source, keyed by its name.
+        journal (RunJournal): Optional journal of the projects and units already scraped.
+        known_urls (set): The URLs of the projects already stored. Those whose page did not
+            change since the last run are skipped.
+        deduplicator (ListingDeduplicator): Finds the projects already scraped from another
+            source, or None to scrape every project.
+        sample_units (int): The number of units fetched before looking for a duplicate, so
+            their price and m2 can confirm it.
+        failed (int): The number of projects and units whose page could not be fetched.
+
+    Methods:
+        adapter_for(url): Get the adapter of the source of a URL.
+        scrape_unit(adapter, url): Scrapes a unit, reusing the run journal.
+        scrape_units(adapter, urls, executor): Scrapes several units of a project.
+        scrape_project(project_url, executor): Scrapes a project and all its units.
+        iter_project_data(workers, ordered): Yields the data of each project as soon as it is scraped.
+        compile_project_data(workers): Compiles all data for each project and its units.
+        fetch(kind, url): Fetches the page of a project or a unit, counting the failures.
+        report(): Prints the throughput, the failures, the duplicates and the extraction paths of each source.
+    """
+
+    def __init__(self, list_of_urls=None, fetcher=None, adapters=None, journal=None, known_urls=None,
+                 deduplicator=None, sample_units=2, apply_rates=True):
+        self.fetcher = fetcher if fetcher is not None else Fetcher(cache=HttpCache())
+        self.adapters = adapters if adapters is not None else create_adapters(fetcher=self.fetcher)
+        # Without apply_rates the policy of the fetcher is left as it is, e.g. without limits
+        # when replaying saved pages
+        if apply_rates:
+            for adapter in self.adapters.values():
+                adapter.configure(self.fetcher.policy)
+        self.urls = []
+        for url in list_of_urls or []:
+            if self.adapter_for(url) is None:
+                print(f'No source adapter for {url}, skipping it.')
+            else:
+                self.urls.append(url)
+        self.journal = journal
+        self.known_urls = set(known_urls or [])
+        self.deduplicator = deduplicator
+        self.sample_units = sample_units
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def adapter_for(self, url):
+        """
+        Get the adapter of the source of a URL.
+
+        Args:
+            url (str): The URL of a project or a unit.
+
+        Returns:
+            SourceAdapter: The adapter, or None if no source serves the URL.
+        """
+        return adapter_for_url(self.adapters, url)
+
+    def fetch(self, kind, url):
+        """
+        Fetch the page of a project or a unit, logging and counting the failures.
+
+        Args:
+            kind (str): 'project' or 'unit'.
+            url (str): The URL of the page.
+
+        Returns:
+            requests.Response: The response, or None if the page could not be fetched.
+        """
+        try:
+            return self.fetcher.get(url)
+        except requests.RequestException as e:
+            print(f'Error fetching {kind} {url}: {e}')
+            with self._lock:
+                self.failed += 1
+            return None
+
+    def scrape_unit(self, adapter, url):
+        """
+        Scrapes a unit of a project, reusing the result recorded in the run journal.
+
+        Args:
+            adapter (SourceAdapter): The adapter of the source.
+            url (str): The URL of the unit.
+
+        Returns:
+            dict: The fields of the unit, None if they could not be extracted, or FETCH_FAILED
+                if the page could not be fetched.
+        """
+        if self.journal is not None and self.journal.is_done('unit', url):
+            return self.journal.get('unit', url)
+        response = self.fetch('unit', url)
+        if response is None:
+            return FETCH_FAILED
+        unit = adapter.parse_unit(url, response.content)
+        if self.journal is not None:
+            self.journal.record('unit', url, unit)
+        return unit
+
+    def scrape_units(self, adapter, urls, executor=None):
+        """
+        Scrapes units of a project, in parallel if an executor is given.
+
+        Returns:
+            tuple: The fields of the units, leaving out those that could not be extracted,
+                e.g. without a location, or fetched, and whether every unit could be fetched.
+        """
+        if executor is None:
+            units = [self.scrape_unit(adapter, url) for url in urls]
+        else:
+            futures = [executor.submit(self.scrape_unit, adapter, url) for url in urls]
+            units = [future.result() for future in futures]
+        complete = all(unit is not FETCH_FAILED for unit in units)
+        return [unit for unit in units if unit is not None and unit is not FETCH_FAILED], complete
+
+    def scrape_project(self, project_url, executor=None):
+        """
+        Scrapes a project page and all of its units.
+
+        Projects and units already recorded in the run journal are not fetched again.
+        Known projects whose page is unchanged since it was last fetched are skipped, and the
+        units of the duplicates of projects of other sources are not fetched. A project some of
+        whose units could not be fetched is returned without them, and is not journaled.
+
+        Args:
+            project_url (str): The URL of the project.
+            executor (Executor, optional): Executor used to fetch the units in parallel.
+                If not provided, the units are fetched one at a time.
+
+        Returns:
+            dict: A dictionary containing the project data and its units, None if the project
+                is known and unchanged, or FETCH_FAILED if its page could not be fetched. A
+                duplicate has no units and its 'duplicate_of' holds the URL of the project it duplicates.
+        """
+        if self.journal is not None and self.journal.is_done('project', project_url):
+            project = self.journal.get('project', project_url)
+            if self.deduplicator is not None and 'duplicate_of' not in project:
+                self.deduplicator.add(project)
+            return project
+        adapter = self.adapter_for(project_url)
+        response = self.fetch('project', project_url)
+        if response is None:
+            return FETCH_FAILED
+        if project_url in self.known_urls and response.unchanged:
+            return None
+        project, unit_urls = adapter.parse_project(project_url, response.content)
+        complete = True
+        if self.deduplicator is not None:
+            # The project is indexed before the rest of its units are fetched, so the projects
+            # scraped at the same time find it
+            units, complete = self.scrape_units(adapter, unit_urls[:self.sample_units], executor)
+            project['properties'].extend(units)
+            unit_urls = unit_urls[self.sample_units:]
+            duplicate_of = self.deduplicator.find_or_add(project)
+            if duplicate_of is not None:
+                project['properties'] = []
+                project['duplicate_of'] = duplicate_of
+                if self.journal is not None and complete:
+                    self.journal.record('project', project_url, project)
+                return project
+        units, complete_rest = self.scrape_units(adapter, unit_urls, executor)
+        project['properties'].extend(units)
+        if self.deduplicator is not None:
+            self.deduplicator.add(project)
+        if self.journal is not None and complete and complete_rest:
+            self.journal.record('project', project_url, project)
+        return project
+
+    def iter_project_data(self, workers=1, ordered=True):
+        """
+        Yields the data of each project and its units as soon as it is scraped. Duplicates and the
+        projects whose page could not be fetched are left out.
+
+        With more than one worker, projects of all the sources are scraped concurrently and
+        the units of every project are fetched in parallel, within the per-host limit and the
+        rate of each source. Only a small window of projects is in flight at any time.
+
+        Args:
+            workers (int): Number of threads used to scrape projects and units.
+            ordered (bool): If True, projects are yielded in the order of `self.urls`.
+                Otherwise they are yielded as soon as they finish.
+
+        Yields:
+            dict: A dictionary containing the project data and its units.
+        """
+        if workers <= 1:
+            for i, project_url in enumerate(self.urls, 1):
+                print(f'Scraping project {i} from {len(self.urls)}:', project_url)
+                project = self.scrape_project(project_url)
+                if project is not None and project is not FETCH_FAILED and 'duplicate_of' not in project:
+                    yield project
+            return
+        with ThreadPoolExecutor(max_workers=workers) as project_pool, \
+                ThreadPoolExecutor(max_workers=workers) as unit_pool:
+            def submit(project_url):
+                return project_pool.submit(self.scrape_project, project_url, unit_pool)
+
+            for i, (project_url, project) in enumerate(iter_bounded(submit, self.urls, 2 * workers, ordered), 1):
+                if project is None:
+                    print(f'Unchanged project {i} from {len(self.urls)}:', project_url)
+                    continue
+                if project is FETCH_FAILED:
+                    print(f'Failed project {i} from {len(self.urls)}:', project_url)
+                    continue
+                if 'duplicate_of' in project:
+                    print(f'Duplicate project {i} from {len(self.urls)}:', project_url, 'of', project['duplicate_of'])
+                    continue
+                print(f'Scraped project {i} from {len(self.urls)}:', project_url)
+                yield project
+
+    def compile_project_data(self, workers=1):
+        """
+        Compiles all data for each project and its units.
+
+        Args:
+            workers (int): Number of threads used to scrape projects and units.
+
+        Returns:
+            list: A list of dictionaries containing all compiled data for each project and its units,
+                in the order of `self.urls`.
+        """
+        compiled_data = list(self.iter_project_data(workers=workers))
+        self.report()
+        return compiled_data
+
+    def report(self):
+        """
+        Prints the throughput, the failures, the duplicates and the extraction paths of each source.
+        """
+        self.fetcher.report()
+        if self.failed:
+            print(f'{self.failed} projects and units could not be fetched; a resumed run retries them.')
+        if self.deduplicator is not None:
+            print(f'{self.deduplicator.duplicates} projects listed by another source were not scraped again.')
+        for name, adapter in self.adapters.items():
+            if any(adapter.extraction_stats.pages.values()):
+                print(f'{name}:')
+                adapter.extraction_stats.report()
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import os
+    import sys
+
+    import pandas as pd
+
+    from source_adapters import SOURCE_ADAPTERS
+
+    parser = argparse.ArgumentParser(description='Scrape the projects of every source and their units.')
+    parser.add_argument('--sources', nargs='+', default=None, choices=list(SOURCE_ADAPTERS),
+                        help='Sources to scrape (default: all).')
+    parser.add_argument('--workers', type=int, default=8, help='Number of concurrent workers (1 scrapes sequentially).')
+    parser.add_argument('--per-host', type=int, default=4, help='Maximum number of concurrent requests per host.')
+    parser.add_argument('--cache-ttl', type=float, default=24, help='Hours during which cached pages are reused without revalidation.')
+    parser.add_argument('--resume', action='store_true', help='Skip the projects and units completed by a previous run.')
+    parser.add_argument('--stream', action='store_true', help='Upsert each project into the database as soon as it is scraped.')
+    parser.add_argument('--jsonl', default=None, help='With --stream, also append each project to this JSONL file.')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Skip the projects already in the database whose page did not change.')
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help='Also scrape the projects whose address matches a project of another source.')
+    args = parser.parse_args()
+
+    fetcher = Fetcher(cache=HttpCache(ttl=args.cache_ttl * 3600), per_host_limit=args.per_host,
+                      pool_size=max(args.workers, args.per_host))
+    adapters = create_adapters(fetcher=fetcher, sources=args.sources)
+    urls = pd.read_csv('data/raw/list_of_all_urls.csv')['URL'].dropna()
+    list_of_urls = [url for url in dict.fromkeys(canonicalize_url(url) for url in urls)
+                    if adapter_for_url(adapters, url) is not None]
+    if args.stream or args.incremental:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+        from sqlite_db import PropDb
+    known_urls = None
+    if args.incremental:
+        prop_db = PropDb(dbname='brickland.db')
+        try:
+            prop_db.connect()
+            prop_db.create_tables()
+            known_urls = prop_db.get_project_urls()
+        finally:
+            prop_db.close()
+        print(f'{len(known_urls)} known projects loaded.')
+    with RunJournal('data/raw/journals/properties_run.jsonl', resume=args.resume) as journal:
+        deduplicator = None if args.keep_duplicates else ListingDeduplicator()
+        scraper = PropertyScraper(list_of_urls=list_of_urls, fetcher=fetcher, adapters=adapters, journal=journal,
+                                  known_urls=known_urls, deduplicator=deduplicator)
+        if args.stream:
+            prop_db = PropDb(dbname='brickland.db')
+            try:
+                prop_db.connect()
+                prop_db.create_tables()
+                prop_db.import_stream(scraper.iter_project_data(workers=args.workers, ordered=False), jsonl_path=args.jsonl)
+            finally:
+                prop_db.close()
+            scraper.report()
+        else:
+            compiled_data = scraper.compile_project_data(workers=args.workers)
+            output = 'data/raw/properties_data_delta.json' if args.incremental else 'data/raw/properties_data.json'
+            with open(output, 'w') as json_file:
+                json.dump(compiled_data, json_file, indent=4)
@@ -0,0 +1,113 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket.
+
+    Tokens are added at `rate` per second up to `burst`; every request takes one token
+    and waits until one is available.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (int): Maximum number of tokens in the bucket.
+
+    Methods:
+        acquire(): Take a token, sleeping until one is available.
+        set_rate(rate): Change the refill rate.
+        pause(seconds): Hold every request for some time, e.g. after a Retry-After header.
+    """
+
+    def __init__(self, rate=1.0, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self):
+        """
+        Take a token, sleeping until one is available.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def set_rate(self, rate):
+        """
+        Change the refill rate.
+
+        Args:
+            rate (float): The new number of tokens added per second.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def pause(self, seconds):
+        """
+        Hold every request for some time, e.g. after a Retry-After header.
+
+        Args:
+            seconds (float): The number of seconds to wait before the next request.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    A token bucket whose rate follows the responses of the host: it is halved when the host
+    throttles or fails, and grows back by a small step after every success, up to `max_rate`.
+
+    Attributes:
+        min_rate (float): The lowest rate the bucket slows down to.
+        max_rate (float): The configured rate, which the bucket never exceeds.
+
+    Methods:
+        on_success(): Raise the rate after a successful request.
+        on_throttle(retry_after): Halve the rate after a 429 or 5xx response.
+    """
+
+    def __init__(self, rate=1.0, burst=1, min_rate=0.1):
+        super().__init__(rate=rate, burst=burst)
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = rate
+
+    def on_success(self):
+        """
+        Raise the rate by a tenth of `max_rate` after a successful request.
+        """
+        if self.rate < self.max_rate:
+            self.set_rate(min(self.max_rate, self.rate + self.max_rate / 10))
+
+    def on_throttle(self, retry_after=None):
+        """
+        Halve the rate after a 429 or 5xx response.
+
+        Args:
+            retry_after (float, optional): Seconds the host asked to wait before the next request.
+        """
+        self.set_rate(max(self.min_rate, self.rate / 2))
+        if retry_after:
+            self.pause(retry_after)
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+class FixtureCorpus:
+    """
+    A directory of saved pages indexed by URL, used to run the scrapers offline.
+
+    The corpus is described by a `manifest.json` file that maps every URL to the file
+    holding its body, plus the status code and headers to serve with it. Several URLs
+    may point to the same file.
+
+    Attributes:
+        directory (str): The directory of the corpus.
+        manifest (dict): The manifest entries, keyed by URL.
+
+    Methods:
+        get(url): Get the manifest entry and body of a URL.
+        record(response): Save a live response into the corpus.
+        recording_hook(response, *args, **kwargs): A requests hook that records every response.
+        save(): Write the manifest to disk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.manifest = {}
+        self._lock = threading.Lock()
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+
+    def get(self, url):
+        """
+        Get the manifest entry and body of a URL.
+
+        Args:
+            url (str): The URL to look up.
+
+        Returns:
+            tuple: The manifest entry and the body as bytes, or (None, None) if the URL is not in the corpus.
+        """
+        entry = self.manifest.get(url)
+        if entry is None:
+            return None, None
+        with open(os.path.join(self.directory, entry['file']), 'rb') as f:
+            return entry, f.read()
+
+    def record(self, response):
+        """
+        Save a live response into the corpus. Bodies are stored under the host of the URL
+        and named after their hash, so identical pages are stored once. A redirected
+        response is recorded under both the requested and the final URL.
+
+        Args:
+            response (requests.Response): The response to save.
+        """
+        content = response.content
+        host = urlsplit(response.url).netloc.lower() or 'unknown'
+        file_name = f'{host}/{hashlib.sha1(content).hexdigest()[:16]}.html'
+        path = os.path.join(self.directory, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        entry = {
+            'file': file_name,
+            'status': response.status_code,
+            'headers': {'Content-Type': response.headers.get('Content-Type', 'text/html')},
+        }
+        with self._lock:
+            self.manifest[response.url] = entry
+            if response.history:
+                self.manifest[response.history[0].url] = entry
+
+    def recording_hook(self, response, *args, **kwargs):
+        """
+        A requests response hook that records every response, e.g.
+        `session.hooks['response'].append(corpus.recording_hook)`.
+        Redirect responses are skipped; the final response is recorded instead.
+        """
+        if not response.is_redirect:
+            self.record(response)
+        return response
+
+    def save(self):
+        """
+        Write the manifest to disk.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            with open(self.manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=4, sort_keys=True)
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    A requests transport adapter that serves responses from a FixtureCorpus instead of the network.
+
+    URLs missing from the corpus get a 404 response, so a scraper never reaches a live website.
+    """
+
+    def __init__(self, corpus):
+        super().__init__()
+        self.corpus = corpus
+        self.requests_served = 0
+        self.requests_missed = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        entry, content = self.corpus.get(request.url)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if entry is None:
+            self.requests_missed += 1
+            response.status_code = 404
+            response._content = b''
+            response.headers = CaseInsensitiveDict()
+        else:
+            self.requests_served += 1
+            response.status_code = entry.get('status', 200)
+            response._content = content
+            response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.reason = 'OK' if entry is not None else 'Not Found'
+        return response
+
+    def close(self):
+        pass
+
+
+def mount_replay(session, corpus):
+    """
+    Mount a ReplayAdapter on every scheme of a session.
+
+    Args:
+        session (requests.Session): The session, e.g. `Fetcher.session` or `Browser.scraper`.
+        corpus (FixtureCorpus or str): The corpus, or the directory of the corpus.
+
+    Returns:
+        ReplayAdapter: The mounted adapter.
+    """
+    if isinstance(corpus, str):
+        corpus = FixtureCorpus(corpus)
+    adapter = ReplayAdapter(corpus)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return adapter
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Record live pages into a fixture corpus.')
+    parser.add_argument('urls_file', help='A text file with one URL per line.')
+    parser.add_argument('--corpus', default='benchmarks/fixtures', help='The corpus directory.')
+    args = parser.parse_args()
+
+    corpus = FixtureCorpus(args.corpus)
+    session = requests.Session()
+    with open(args.urls_file, 'r', encoding='utf-8') as f:
+        urls = [line.strip() for line in f if line.strip()]
+    for url in urls:
+        try:
+            corpus.record(session.get(url, timeout=30))
+            print(f'Recorded {url}')
+        except Exception as e:
+            print(f'Error recording {url}: {e}')
+    corpus.save()
@@ -0,0 +1,125 @@
+import json
+import os
+import threading
+
+
+class RunJournal:
+    """
+    An append-only journal of the work completed during a scraping run.
+
+    Every finished item is written as one JSON line and flushed to disk right away,
+    so a crashed or killed run can be resumed without repeating finished work. Only
+    the file offset of each item is kept in memory; payloads are read back on demand.
+
+    Attributes:
+        path (str): The path of the JSONL journal file.
+        entries (dict): The file offset of each recorded item, keyed by (kind, key).
+
+    Methods:
+        is_done(kind, key): Check whether an item was already completed.
+        get(kind, key): Get the payload recorded for an item.
+        record(kind, key, payload): Record a completed item.
+        close(): Close the journal file.
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        Opens the journal.
+
+        Args:
+            path (str): The path of the JSONL journal file.
+            resume (bool): If True, the items recorded by a previous run are loaded.
+                Otherwise the journal starts empty.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            self._load()
+        self._file = open(path, 'ab' if resume else 'wb')
+        self._reader = open(path, 'rb')
+        if resume:
+            print(f'Resuming run: {len(self.entries)} items already completed in {path}')
+
+    def _load(self):
+        """
+        Load the items recorded by a previous run, ignoring a partially written last line.
+        """
+        with open(self.path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line) if line.endswith(b'\n') else None
+                except json.JSONDecodeError:
+                    entry = None
+                if entry is not None:
+                    self.entries[(entry['kind'], entry['key'])] = offset
+                offset += len(line)
+            if offset and not line.endswith(b'\n'):
+                # Drop the partially written line so new records start on a fresh line
+                with open(self.path, 'r+b') as truncated:
+                    truncated.truncate(offset - len(line))
+
+    def is_done(self, kind, key):
+        """
+        Check whether an item was already completed.
+
+        Args:
+            kind (str): The kind of item, e.g. 'project', 'unit' or 'article'.
+            key (str): The key of the item, usually its URL.
+
+        Returns:
+            bool: True if the item was recorded.
+        """
+        return (kind, key) in self.entries
+
+    def get(self, kind, key):
+        """
+        Get the payload recorded for an item.
+
+        Args:
+            kind (str): The kind of item.
+            key (str): The key of the item.
+
+        Returns:
+            The recorded payload, or None if the item was not recorded.
+        """
+        with self._lock:
+            offset = self.entries.get((kind, key))
+            if offset is None:
+                return None
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        return json.loads(line)['payload']
+
+    def record(self, kind, key, payload):
+        """
+        Record a completed item and flush it to disk.
+
+        Args:
+            kind (str): The kind of item.
+            key (str): The key of the item.
+            payload: The JSON-serializable result of the item.
+        """
+        line = json.dumps({'kind': kind, 'key': key, 'payload': payload}, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self.entries[(kind, key)] = self._file.tell()
+            self._file.write(line + b'\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Close the journal file.
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                self._reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
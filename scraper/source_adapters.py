@@ -0,0 +1,304 @@
+import re
+from urllib.parse import urljoin, urlsplit
+
+from argenprop_scraper import STRUCTURED_FIELDS, ArgenPropData
+from structured_data import ExtractionStats, extract_listing, extract_meta, property_from_listing
+
+HREF_PATTERN = re.compile(rb'<a\s[^>]*href=["\']([^"\']+)["\']', re.I)
+
+# The adapter class of each source, in the order the sources are crawled
+SOURCE_ADAPTERS = {}
+
+
+def register_adapter(cls):
+    """
+    Register the adapter of a source, so that discovery and scraping pick it up.
+
+    Args:
+        cls (type): A subclass of SourceAdapter with a unique `name`.
+
+    Returns:
+        type: The class itself, so this function can be used as a decorator.
+    """
+    SOURCE_ADAPTERS[cls.name] = cls
+    return cls
+
+
+def create_adapters(fetcher=None, sources=None):
+    """
+    Create the adapters of the given sources.
+
+    Args:
+        fetcher (Fetcher, optional): The fetcher shared by the adapters.
+        sources (iterable, optional): The names of the sources. Defaults to all of them.
+
+    Returns:
+        dict: The adapters, keyed by the name of their source.
+    """
+    sources = list(SOURCE_ADAPTERS) if sources is None else sources
+    return {source: SOURCE_ADAPTERS[source](fetcher=fetcher) for source in sources}
+
+
+def adapter_for_url(adapters, url):
+    """
+    Find the adapter of the source a URL belongs to.
+
+    Args:
+        adapters (dict): The adapters, keyed by the name of their source.
+        url (str): A URL of a listing page, a project or a unit.
+
+    Returns:
+        SourceAdapter: The adapter, or None if no source serves the URL's host.
+    """
+    host = urlsplit(url).netloc.lower()
+    for adapter in adapters.values():
+        if host in adapter.hosts:
+            return adapter
+    return None
+
+
+class SourceAdapter:
+    """
+    Everything that is specific to a real estate website: how its projects are discovered,
+    how its listing pages are paginated and how its pages are parsed.
+
+    Fetching, concurrency, caching, rate limiting, retries and journaling are left to the
+    shared engines (`AutoScraperProp` for discovery, `PropertyScraper` and `CrawlWorker` for
+    the projects), so adding a website only takes a registered subclass.
+
+    The default parsing reads the structured data of the pages: the JSON-LD, the hydration
+    state and the Open Graph tags. A project whose page links to no unit through
+    `unit_pattern` is scraped as a single property.
+
+    Attributes:
+        name (str): The name of the source.
+        hosts (tuple): The hosts of the website, used to match URLs and to set the rate limit.
+        first_page_url (str): The first listing page of the projects.
+        count_pattern (re.Pattern): The text holding the number of projects on the first page,
+            used to learn the discovery rules.
+        digit_pattern (str): The number within the text matched by `count_pattern`.
+        per_page (int): The number of projects per listing page.
+        page_pattern (re.Pattern): The page number within `first_page_url`, as its first group.
+        page_offset (bool): True if the listing pages are numbered by the offset of their first
+            project, starting at 0, instead of by page.
+        url_pattern (re.Pattern): The links of the projects on the listing pages.
+        main_url (str): The prefix of the relative links of the listing pages.
+        unit_pattern (re.Pattern): The links of the units on the page of a project, if any.
+        rate (tuple): The politeness budget of the hosts: requests per second and burst.
+        unit_source (str): The frontier source of the units of the projects.
+        extraction_stats (ExtractionStats): Where the fields of the units came from.
+
+    Methods:
+        page_url(page): Build the URL of a listing page.
+        listing_url(href): Build the absolute URL of a link found on a listing page.
+        configure(policy): Apply the rate of the source to a fetch policy.
+        parse_project(url, content): Extract a project and the URLs of its units.
+        parse_unit(url, content): Extract the fields of a unit.
+    """
+
+    name = None
+    hosts = ()
+    first_page_url = None
+    count_pattern = None
+    digit_pattern = r'\b(\d{1,5})\b'
+    per_page = 20
+    page_pattern = None
+    page_offset = False
+    url_pattern = None
+    main_url = ''
+    unit_pattern = None
+    rate = (2, 2)
+
+    def __init__(self, fetcher=None):
+        self.fetcher = fetcher
+        self.unit_source = f'{self.name}_apartment'
+        self.extraction_stats = ExtractionStats()
+
+    def page_url(self, page):
+        """
+        Build the URL of a listing page.
+
+        Args:
+            page (int): The page number, starting at 1.
+
+        Returns:
+            str: The URL of the page.
+        """
+        number = (page - 1) * self.per_page if self.page_offset else page
+        match = self.page_pattern.search(self.first_page_url)
+        return f'{self.first_page_url[:match.start(1)]}{number}{self.first_page_url[match.end(1):]}'
+
+    def listing_url(self, href):
+        """
+        Build the absolute URL of a link found on a listing page.
+        """
+        return self.main_url + href
+
+    def configure(self, policy):
+        """
+        Apply the rate of the source to every host of the website.
+
+        Args:
+            policy (FetchPolicy): The fetch policy of the shared fetcher.
+        """
+        rate, burst = self.rate
+        for host in self.hosts:
+            policy.configure(host, rate, burst)
+
+    def unit_urls(self, url, content):
+        """
+        Get the absolute URLs of the units linked from the page of a project, each one once.
+        """
+        if self.unit_pattern is None:
+            return []
+        hrefs = (href.decode('utf-8', 'replace') for href in HREF_PATTERN.findall(content))
+        return list(dict.fromkeys(urljoin(url, href) for href in hrefs if self.unit_pattern.match(href)))
+
+    def parse_project(self, url, content):
+        """
+        Extract a project and the URLs of its units from the page of the project.
+
+        Args:
+            url (str): The URL of the project.
+            content (bytes): The page of the project.
+
+        Returns:
+            tuple: The project data, in the format of `ArgenPropData.scrape_project`, and the
+                URLs of its units. A project without units holds its own page as its property.
+        """
+        fields = extract_listing(content)
+        meta = extract_meta(content)
+        images = fields.get('images') or ([meta['og:image']] if 'og:image' in meta else [])
+        project = {
+            'project_url': url,
+            'project_source': self.name,
+            'project_district': fields.get('location', 'nan'),
+            'project_address': fields.get('address', meta.get('og:title', 'nan')),
+            'project_description': fields.get('description', meta.get('og:description', 'nan')),
+            'project_images': images,
+            'properties': [],
+        }
+        unit_urls = self.unit_urls(url, content)
+        if not unit_urls:
+            unit = self.parse_unit(url, content)
+            if unit is not None:
+                project['properties'].append(unit)
+        return project, unit_urls
+
+    def parse_unit(self, url, content):
+        """
+        Extract the fields of a unit from its page.
+
+        Args:
+            url (str): The URL of the unit.
+            content (bytes): The page of the unit.
+
+        Returns:
+            dict: The fields of the unit, 'nan' when missing, or None if the page has no structured data.
+        """
+        unit = property_from_listing(extract_listing(content), url)
+        if len(unit) == 1:
+            return None
+        field_sources = {}
+        for field in STRUCTURED_FIELDS:
+            field_sources[field] = 'structured' if field in unit else 'missing'
+            unit.setdefault(field, 'nan')
+        self.extraction_stats.record(field_sources)
+        return unit
+
+
+@register_adapter
+class ArgenpropAdapter(SourceAdapter):
+    """
+    Argenprop. Projects list their apartments, parsed by `ArgenPropData`.
+
+    Args:
+        fetcher (Fetcher, optional): The fetcher shared by the adapters.
+        scraper (ArgenPropData, optional): The parser of the pages, whose extraction stats are
+            shared. Created on first use if not given.
+    """
+
+    name = 'argenprop'
+    hosts = ('argenprop.com', 'www.argenprop.com')
+    first_page_url = 'https://argenprop.com/emprendimientos/capital-federal?pagina-1'
+    count_pattern = re.compile(r'\b(\d{1,5})\b Emprendimientos en Capital Federal')
+    per_page = 20
+    page_pattern = re.compile(r'pagina-(\d{1,10})')
+    url_pattern = re.compile(r'^/emprendimientos/emprendimiento-en[-a-z]*--(\d{5,15})$')
+    main_url = 'https://argenprop.com'
+    rate = (2, 2)
+
+    def __init__(self, fetcher=None, scraper=None):
+        super().__init__(fetcher=fetcher)
+        self._scraper = scraper
+        if scraper is not None:
+            self.extraction_stats = scraper.extraction_stats
+
+    @property
+    def scraper(self):
+        # Created on first use, so that discovery alone does not need it
+        if self._scraper is None:
+            self._scraper = ArgenPropData(fetcher=self.fetcher)
+            self._scraper.extraction_stats = self.extraction_stats
+        return self._scraper
+
+    def parse_project(self, url, content):
+        project, apartment_urls = self.scraper.parse_project_page(url, content)
+        project['project_source'] = self.name
+        return project, [self.listing_url(href) for href in apartment_urls]
+
+    def parse_unit(self, url, content):
+        return self.scraper.parse_apartment(content, url)
+
+
+@register_adapter
+class ZonapropAdapter(SourceAdapter):
+    """
+    Zonaprop. Developments list their units as regular listings.
+    """
+
+    name = 'zonaprop'
+    hosts = ('www.zonaprop.com.ar', 'zonaprop.com.ar')
+    first_page_url = 'https://www.zonaprop.com.ar/emprendimientos-capital-federal-pagina-1.html'
+    count_pattern = re.compile(r'\b(\d{1,5}.\d{1,5})\b Desarrollos inmobiliarios en venta - Propiedades e inmuebles en Capital Federal')
+    digit_pattern = r'\d{1,5}.\d{1,5}'
+    per_page = 20
+    page_pattern = re.compile(r'pagina-(\d{1,10})')
+    url_pattern = re.compile(r'^\/propiedades\/emprendimiento\/[\s\d\w-]{1,100}-\d{5,15}.html$')
+    main_url = 'https://www.zonaprop.com.ar'
+    unit_pattern = re.compile(r'^(?:https://www\.zonaprop\.com\.ar)?/propiedades/(?!emprendimiento/)[\w-]{1,150}-\d{5,15}\.html$')
+    rate = (1, 1)
+
+
+@register_adapter
+class MeliAdapter(SourceAdapter):
+    """
+    MercadoLibre Inmuebles. Each listing is a single unit with its own JSON-LD.
+    """
+
+    name = 'meli'
+    hosts = ('inmuebles.mercadolibre.com.ar', 'departamento.mercadolibre.com.ar')
+    first_page_url = 'https://inmuebles.mercadolibre.com.ar/departamentos/emprendimientos/capital-federal/_Desde_0_NoIndex_True'
+    count_pattern = re.compile(r'\b(\d{1,5})\b resultados', re.IGNORECASE)
+    per_page = 48
+    page_pattern = re.compile(r'_Desde_(\d{1,10})_NoIndex_True')
+    page_offset = True
+    url_pattern = re.compile(r'^https:\/\/departamento\.mercadolibre\.com\.ar\/MLA-(\d{5,15})-.*$')
+    rate = (2, 2)
+
+
+@register_adapter
+class MudafyAdapter(SourceAdapter):
+    """
+    Mudafy. Development pages embed their data in the Next.js hydration state.
+    """
+
+    name = 'mudafy'
+    hosts = ('mudafy.com.ar', 'www.mudafy.com.ar')
+    first_page_url = 'https://mudafy.com.ar/venta/emprendimientos/caba/1-p'
+    count_pattern = re.compile(r'\b(\d{1,5})\b resultados', re.IGNORECASE)
+    per_page = 22
+    page_pattern = re.compile(r'/(\d{1,10})-p$')
+    url_pattern = re.compile(r'^\/emprendimiento\/[\s\d\w-]{1,100}-\d{5,15}$')
+    main_url = 'https://mudafy.com.ar'
+    rate = (2, 2)
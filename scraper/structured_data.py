@@ -0,0 +1,282 @@
+import json
+import re
+import threading
+from html import unescape
+
+JSON_LD_PATTERN = re.compile(rb'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.S | re.I)
+NEXT_DATA_PATTERN = re.compile(rb'<script[^>]*id=["\']__NEXT_DATA__["\'][^>]*>(.*?)</script>', re.S)
+WINDOW_STATE_PATTERN = re.compile(rb'window\.(__[A-Z_]+__)\s*=\s*(?=[{\[])')
+META_PATTERN = re.compile(rb'<meta\s[^>]*>', re.I)
+ATTRIBUTE_PATTERN = re.compile(rb'([\w:-]+)\s*=\s*(["\'])(.*?)\2', re.S)
+
+# schema.org types describing a property for sale
+LISTING_TYPES = {'Apartment', 'House', 'SingleFamilyResidence', 'Residence', 'Accommodation', 'Place',
+                 'Product', 'Offer', 'RealEstateListing', 'Suite', 'Room'}
+
+
+def _as_bytes(html):
+    return html.encode('utf-8') if isinstance(html, str) else html
+
+
+def _flatten(data):
+    """
+    Yield every object of a JSON-LD document, expanding lists and @graph containers.
+    """
+    if isinstance(data, list):
+        for item in data:
+            yield from _flatten(item)
+    elif isinstance(data, dict):
+        yield data
+        if '@graph' in data:
+            yield from _flatten(data['@graph'])
+
+
+def extract_json_ld(html):
+    """
+    Extract the JSON-LD objects embedded in a page, without parsing its HTML.
+
+    Args:
+        html (bytes or str): The page.
+
+    Returns:
+        list: The JSON-LD objects. Blocks that are not valid JSON are skipped.
+    """
+    items = []
+    for block in JSON_LD_PATTERN.findall(_as_bytes(html)):
+        try:
+            items.extend(_flatten(json.loads(block)))
+        except ValueError:
+            continue
+    return items
+
+
+def extract_embedded_state(html):
+    """
+    Extract the hydration state embedded in a page, e.g. `__NEXT_DATA__` or `window.__PRELOADED_STATE__`.
+
+    Args:
+        html (bytes or str): The page.
+
+    Returns:
+        dict: The decoded states, keyed by their name.
+    """
+    html = _as_bytes(html)
+    states = {}
+    match = NEXT_DATA_PATTERN.search(html)
+    if match:
+        try:
+            states['__NEXT_DATA__'] = json.loads(match.group(1))
+        except ValueError:
+            pass
+    decoder = json.JSONDecoder()
+    for match in WINDOW_STATE_PATTERN.finditer(html):
+        # The assignment ends where the JSON value ends, so decode from its first character
+        start = match.end()
+        try:
+            states[match.group(1).decode()], _ = decoder.raw_decode(html[start:start + 2_000_000].decode('utf-8', 'replace'))
+        except ValueError:
+            continue
+    return states
+
+
+def _types(item):
+    types = item.get('@type', [])
+    return set(types) if isinstance(types, list) else {types}
+
+
+def _walk(data):
+    """
+    Yield every dictionary nested in a JSON value.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            yield value
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+def _number(value):
+    if isinstance(value, dict):
+        value = value.get('value')
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(float(str(value).replace(',', '.')))
+    except (TypeError, ValueError):
+        return None
+
+
+def listing_fields(item):
+    """
+    Map a schema.org listing object to the fields of a property.
+
+    Args:
+        item (dict): A JSON-LD object, e.g. an Apartment with an Offer.
+
+    Returns:
+        dict: The fields found among 'address', 'location', 'price', 'm2', 'rooms', 'bedrooms',
+            'description' and 'images'. Missing fields are left out.
+    """
+    fields = {}
+    address = item.get('address') or (item.get('itemOffered') or {}).get('address')
+    if isinstance(address, dict):
+        if address.get('streetAddress'):
+            fields['address'] = address['streetAddress'].strip()
+        location = [address.get(key) for key in ('addressLocality', 'addressRegion') if address.get(key)]
+        if location:
+            fields['location'] = ', '.join(location)
+    elif isinstance(address, str) and address.strip():
+        fields['address'] = address.strip()
+    offers = item.get('offers') or (item if 'price' in item else None)
+    if isinstance(offers, list):
+        offers = offers[0] if offers else None
+    if isinstance(offers, dict) and offers.get('price') not in (None, ''):
+        price = _number(offers['price'])
+        currency = offers.get('priceCurrency', '')
+        fields['price'] = f'{currency} {price:,}'.replace(',', '.').strip() if price is not None else str(offers['price'])
+    for field, key in (('m2', 'floorSize'), ('rooms', 'numberOfRooms'), ('bedrooms', 'numberOfBedrooms')):
+        value = _number(item.get(key))
+        if value is not None:
+            fields[field] = value
+    if item.get('description'):
+        fields['description'] = item['description']
+    images = item.get('image')
+    if images:
+        images = images if isinstance(images, list) else [images]
+        fields['images'] = [image.get('url') if isinstance(image, dict) else image for image in images]
+    return fields
+
+
+def extract_listing(html):
+    """
+    Extract the fields of a listing from the structured data of its page.
+
+    JSON-LD is read first; if it holds no listing, the objects typed like schema.org listings
+    inside the hydration state are used instead. When several listing objects are found, their
+    fields are merged, the first one winning.
+
+    Args:
+        html (bytes or str): The page.
+
+    Returns:
+        dict: The fields found, as returned by `listing_fields`. Empty if the page has no structured data.
+    """
+    items = [item for item in extract_json_ld(html) if _types(item) & LISTING_TYPES]
+    if not items:
+        for state in extract_embedded_state(html).values():
+            items.extend(item for item in _walk(state) if _types(item) & LISTING_TYPES)
+    fields = {}
+    for item in items:
+        for field, value in listing_fields(item).items():
+            fields.setdefault(field, value)
+    return fields
+
+
+def extract_meta(html):
+    """
+    Extract the Open Graph meta tags of a page, e.g. 'og:title' or 'og:image', without parsing its HTML.
+
+    Args:
+        html (bytes or str): The page.
+
+    Returns:
+        dict: The content of each tag, keyed by its property. The first tag of a property wins.
+    """
+    meta = {}
+    for tag in META_PATTERN.findall(_as_bytes(html)):
+        attributes = {name.lower(): value for name, _, value in ATTRIBUTE_PATTERN.findall(tag)}
+        key = attributes.get(b'property') or attributes.get(b'name')
+        if key and key.startswith(b'og:') and b'content' in attributes:
+            meta.setdefault(key.decode(), unescape(attributes[b'content'].decode('utf-8', 'replace')))
+    return meta
+
+
+def property_from_listing(fields, url):
+    """
+    Map the structured data of a listing to the fields of a property, cleaned like the ones parsed from the DOM.
+
+    Args:
+        fields (dict): The fields returned by `extract_listing`.
+        url (str): The full URL of the listing.
+
+    Returns:
+        dict: The property fields found in the structured data, with its 'prop_url'.
+    """
+    prop = {'prop_url': url}
+    if 'address' in fields:
+        address_floor = fields['address'].split(',')
+        prop['prop_address'] = address_floor[0].strip()
+        # Without a floor in the address, the floor is left to the DOM
+        if len(address_floor) > 1 and address_floor[1].strip():
+            prop['prop_floor'] = address_floor[1].strip()
+    if 'price' in fields:
+        prop['prop_price'] = fields['price']
+    if 'm2' in fields:
+        prop['prop_m2'] = fields['m2']
+    if 'rooms' in fields:
+        prop['prop_rooms'] = fields['rooms']
+    if 'bedrooms' in fields:
+        prop['prop_bedrooms'] = fields['bedrooms']
+    if 'location' in fields:
+        prop['prop_location'] = fields['location']
+    if 'description' in fields:
+        description = fields['description'].strip().replace('\n', ' ').replace('m\u00b2', 'm2')
+        prop['prop_description'] = description.split('AVISO LEGAL')[0].split('Para verlo')[0].strip()
+    if fields.get('images'):
+        prop['prop_images'] = fields['images']
+    return prop
+
+
+class ExtractionStats:
+    """
+    Thread-safe counters of where the fields of the scraped pages came from.
+
+    Attributes:
+        pages (dict): Pages extracted only from structured data ('structured'), from structured
+            data completed with the DOM ('mixed'), only from the DOM ('dom') or with every field
+            missing ('missing').
+        fields (dict): For each field, how often it came from 'structured' data, the 'dom' or was 'missing'.
+
+    Methods:
+        record(field_sources): Count the sources of the fields of a page.
+        report(): Print the counters.
+    """
+
+    def __init__(self):
+        self.pages = {'structured': 0, 'mixed': 0, 'dom': 0, 'missing': 0}
+        self.fields = {}
+        self._lock = threading.Lock()
+
+    def record(self, field_sources):
+        """
+        Count the sources of the fields of a page.
+
+        Args:
+            field_sources (dict): 'structured', 'dom' or 'missing' for each field.
+        """
+        sources = set(field_sources.values())
+        if 'structured' in sources:
+            path = 'mixed' if 'dom' in sources else 'structured'
+        else:
+            path = 'dom' if 'dom' in sources else 'missing'
+        with self._lock:
+            self.pages[path] += 1
+            for field, source in field_sources.items():
+                counts = self.fields.setdefault(field, {'structured': 0, 'dom': 0, 'missing': 0})
+                counts[source] += 1
+
+    def report(self):
+        """
+        Print the counters.
+        """
+        with self._lock:
+            total = sum(self.pages.values())
+            if not total:
+                return
+            print(f'Extraction paths over {total} pages: ' +
+                  ', '.join(f'{path} {count} ({count / total:.0%})' for path, count in self.pages.items()))
+            for field, counts in self.fields.items():
+                print(f'  {field}: ' + ', '.join(f'{source} {count}' for source, count in counts.items()))
@@ -0,0 +1,491 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit
+
+# Query parameters that only track the visit and never change the page served.
+TRACKING_PARAMETERS = {'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'igshid',
+                       'mc_cid', 'mc_eid', '_ga', '_gl', 'gad_source', 'ref_src', 'spm'}
+DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+def canonicalize_url(url):
+    """
+    Normalize a URL so that the different spellings of the same page compare equal.
+
+    The scheme and host are lowercased, default ports, fragments (e.g. `#google_vignette`)
+    and tracking parameters (`utm_*`, `gclid`, ...) are dropped and the remaining parameters
+    are sorted. Parameters without a value, like the `?pagina-2` of Argenprop, are kept.
+
+    Args:
+        url (str): The URL to normalize.
+
+    Returns:
+        str: The canonical URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if netloc.endswith(DEFAULT_PORTS.get(scheme, '\0')):
+        netloc = netloc[:-len(DEFAULT_PORTS[scheme])]
+    path = parts.path or '/'
+    params = [p for p in parts.query.split('&') if p]
+    params = sorted(p for p in params
+                    if not p.split('=', 1)[0].lower().startswith('utm_')
+                    and p.split('=', 1)[0].lower() not in TRACKING_PARAMETERS)
+    return urlunsplit((scheme, netloc, path, '&'.join(params), ''))
+
+
+class UrlFrontier:
+    """
+    A persistent queue of the URLs to crawl, backed by SQLite.
+
+    URLs are stored once in their canonical form with a state: `queued` when they wait to
+    be fetched, `fetching` once a worker claimed them, then `fetched` or `failed`. Claims are
+    atomic across threads and processes sharing the database file, so no URL is handed out
+    twice until the frontier is requeued for a new run. Queued URLs are claimed by priority,
+    highest first, then in the order they were added.
+
+    Workers in other processes, or on other machines sharing the directory of the database,
+    `lease` URLs for a limited time instead of claiming them: a lease that is not completed
+    before it expires, e.g. because its worker died, goes back to the queue. Workers write
+    their results back with `store_result`.
+
+    Attributes:
+        path (str): The path of the SQLite database.
+        shared (bool): True if the database is on a directory shared by several machines.
+
+    Methods:
+        add(url, priority, source): Queue a URL unless it is already known.
+        add_many(urls, priority, source): Queue several URLs at once.
+        claim(limit, source, urls): Take the next queued URLs, marking them as being fetched.
+        drain(source, urls): Claim the queued URLs one at a time until none is left.
+        claim_url(url, source): Take a specific URL if it is still waiting to be fetched.
+        lease(worker, limit, lease_seconds, sources): Take the next queued URLs for a limited time.
+        renew(worker, url, lease_seconds): Extend the lease of a worker on a URL.
+        release(worker): Queue again the URLs leased by a worker.
+        store_result(url, payload, content, worker): Record a successful fetch and the result of its processing.
+        results(source, parent): Iterate over the stored results.
+        pending(sources): Count the URLs queued or being fetched.
+        mark_fetched(url, content): Record a successful fetch and the hash of its content.
+        mark_failed(url, error): Record a failed fetch.
+        requeue(states, source): Queue again the URLs in the given states, e.g. for a new run.
+        state(url): Get the state of a URL.
+        counts(source): Count the URLs in each state.
+    """
+
+    STATES = ('queued', 'fetching', 'fetched', 'failed')
+
+    def __init__(self, path='data/frontier/frontier.sqlite', shared=False):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        # WAL needs shared memory, which network filesystems do not provide
+        self.conn.execute('PRAGMA journal_mode=DELETE' if shared else 'PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS urls (
+            url TEXT PRIMARY KEY,
+            original_url TEXT,
+            source TEXT,
+            state TEXT NOT NULL DEFAULT 'queued',
+            priority INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            content_hash TEXT,
+            error TEXT,
+            added_at REAL,
+            last_seen REAL,
+            fetched_at REAL
+        )
+        ''')
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(urls)')}
+        for column, kind in (('parent', 'TEXT'), ('leased_by', 'TEXT'), ('lease_expires', 'REAL')):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE urls ADD COLUMN {column} {kind}')
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS results (
+            url TEXT PRIMARY KEY,
+            source TEXT,
+            parent TEXT,
+            payload TEXT,
+            worker TEXT,
+            finished_at REAL
+        )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_urls_queue ON urls (state, priority DESC, added_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_results_parent ON results (parent)')
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Run a block in a write transaction, holding the database lock against other processes.
+        """
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def add(self, url, priority=0, source=None, parent=None):
+        """
+        Queue a URL unless it is already known. Known URLs only get their last-seen time
+        updated and their priority raised if the new one is higher.
+
+        Args:
+            url (str): The URL to crawl.
+            priority (int): URLs with a higher priority are claimed first.
+            source (str, optional): The source or kind of the URL, e.g. 'argenprop' or 'article'.
+            parent (str, optional): The URL of the page the URL was found in.
+
+        Returns:
+            bool: True if the URL was new.
+        """
+        return self.add_many([url], priority=priority, source=source, parent=parent) == 1
+
+    def add_many(self, urls, priority=0, source=None, parent=None):
+        """
+        Queue several URLs at once.
+
+        Args:
+            urls (iterable): The URLs to crawl.
+            priority (int): URLs with a higher priority are claimed first.
+            source (str, optional): The source or kind of the URLs.
+            parent (str, optional): The URL of the page the URLs were found in.
+
+        Returns:
+            int: The number of new URLs.
+        """
+        now = time.time()
+        parent = canonicalize_url(parent) if parent else None
+        rows = {}
+        for url in urls:
+            rows.setdefault(canonicalize_url(url), url)
+        with self._transaction() as conn:
+            conn.executemany('UPDATE urls SET last_seen = ?, priority = MAX(priority, ?) WHERE url = ?',
+                             [(now, priority, url) for url in rows])
+            added = conn.executemany('''
+            INSERT OR IGNORE INTO urls (url, original_url, source, parent, priority, added_at, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(url, original, source, parent, priority, now, now) for url, original in rows.items()]).rowcount
+        return added
+
+    def claim(self, limit=1, source=None, urls=None):
+        """
+        Take the next queued URLs, highest priority first, and mark them as being fetched.
+
+        Args:
+            limit (int): The maximum number of URLs to take.
+            source (str, optional): Only take URLs of this source.
+            urls (iterable, optional): Only take these URLs, e.g. the ones found in this run.
+
+        Returns:
+            list: The canonical form of the claimed URLs.
+        """
+        query = 'SELECT url FROM urls WHERE state = ?'
+        parameters = ['queued']
+        if source is not None:
+            query += ' AND source = ?'
+            parameters.append(source)
+        if urls is not None:
+            urls = list(dict.fromkeys(canonicalize_url(url) for url in urls))
+            query += f" AND url IN ({', '.join('?' * len(urls))})"
+            parameters.extend(urls)
+        query += ' ORDER BY priority DESC, added_at LIMIT ?'
+        parameters.append(limit)
+        with self._transaction() as conn:
+            rows = conn.execute(query, parameters).fetchall()
+            conn.executemany("UPDATE urls SET state = 'fetching', attempts = attempts + 1 WHERE url = ?",
+                             rows)
+        return [url for (url,) in rows]
+
+    def drain(self, source=None, urls=None):
+        """
+        Claim the queued URLs one at a time until none is left.
+
+        Args:
+            source (str, optional): Only take URLs of this source.
+            urls (iterable, optional): Only take these URLs.
+
+        Yields:
+            str: The canonical form of each claimed URL.
+        """
+        if urls is not None:
+            urls = list(dict.fromkeys(canonicalize_url(url) for url in urls))
+        while True:
+            claimed = self.claim(source=source, urls=urls)
+            if not claimed:
+                return
+            yield claimed[0]
+
+    def claim_url(self, url, source=None):
+        """
+        Take a specific URL if it is still waiting to be fetched, queueing it first if it is unknown.
+
+        Args:
+            url (str): The URL to take.
+            source (str, optional): The source or kind of the URL, used if it is unknown.
+
+        Returns:
+            bool: True if the URL was claimed, False if it was already claimed or fetched in this run.
+        """
+        self.add(url, source=source)
+        with self._transaction() as conn:
+            cursor = conn.execute('''
+            UPDATE urls SET state = 'fetching', attempts = attempts + 1
+            WHERE url = ? AND state = 'queued'
+            ''', (canonicalize_url(url),))
+        return cursor.rowcount == 1
+
+    def lease(self, worker, limit=1, lease_seconds=300, sources=None):
+        """
+        Take the next queued URLs for a limited time. Expired leases are queued again first.
+
+        Args:
+            worker (str): The identifier of the worker taking the URLs.
+            limit (int): The maximum number of URLs to take.
+            lease_seconds (float): Seconds after which the URLs go back to the queue if the
+                worker did not record their result.
+            sources (list, optional): Only take URLs of these sources.
+
+        Returns:
+            list: A dictionary with the `url`, `source` and `parent` of each leased URL.
+        """
+        now = time.time()
+        query = 'SELECT url, source, parent FROM urls WHERE state = ?'
+        parameters = ['queued']
+        if sources is not None:
+            sources = list(sources)
+            query += f" AND source IN ({', '.join('?' * len(sources))})"
+            parameters.extend(sources)
+        query += ' ORDER BY priority DESC, added_at LIMIT ?'
+        parameters.append(limit)
+        with self._transaction() as conn:
+            conn.execute('''
+            UPDATE urls SET state = 'queued', leased_by = NULL, lease_expires = NULL
+            WHERE state = 'fetching' AND lease_expires < ?
+            ''', (now,))
+            rows = conn.execute(query, parameters).fetchall()
+            conn.executemany('''
+            UPDATE urls SET state = 'fetching', attempts = attempts + 1, leased_by = ?, lease_expires = ?
+            WHERE url = ?
+            ''', [(worker, now + lease_seconds, url) for url, _, _ in rows])
+        return [{'url': url, 'source': source, 'parent': parent} for url, source, parent in rows]
+
+    def renew(self, worker, url, lease_seconds=300):
+        """
+        Extend the lease of a worker on a URL, e.g. when it starts processing it.
+
+        Args:
+            worker (str): The identifier of the worker.
+            url (str): The leased URL.
+            lease_seconds (float): Seconds from now after which the URL goes back to the queue.
+
+        Returns:
+            bool: True if the worker still held the lease, False if the URL was taken by another worker.
+        """
+        with self._transaction() as conn:
+            return conn.execute('''
+            UPDATE urls SET lease_expires = ?
+            WHERE url = ? AND state = 'fetching' AND leased_by = ?
+            ''', (time.time() + lease_seconds, canonicalize_url(url), worker)).rowcount == 1
+
+    def release(self, worker):
+        """
+        Queue again the URLs leased by a worker, e.g. after it stopped or crashed.
+
+        Args:
+            worker (str): The identifier of the worker.
+
+        Returns:
+            int: The number of released URLs.
+        """
+        with self._transaction() as conn:
+            return conn.execute('''
+            UPDATE urls SET state = 'queued', leased_by = NULL, lease_expires = NULL
+            WHERE state = 'fetching' AND leased_by = ?
+            ''', (worker,)).rowcount
+
+    def store_result(self, url, payload, content=None, worker=None):
+        """
+        Record a successful fetch and the result of its processing. Both are written in one
+        transaction, and only while the worker still holds the lease on the URL: a result that
+        arrives after its lease expired, and the URL was leased to another worker, is dropped.
+
+        Args:
+            url (str): The fetched URL.
+            payload: The JSON-serializable result, e.g. the data of an apartment or the text of an article.
+            content (bytes or str, optional): The fetched content, whose hash is stored.
+                Defaults to the serialized payload.
+            worker (str, optional): The identifier of the worker. Without it the lease is not checked.
+
+        Returns:
+            bool: True if the result was stored.
+        """
+        serialized = json.dumps(payload, ensure_ascii=False)
+        content = content if content is not None else serialized
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        content_hash = hashlib.sha256(content).hexdigest()
+        url = canonicalize_url(url)
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute('''
+            UPDATE urls SET state = 'fetched', content_hash = ?, error = NULL, fetched_at = ?,
+                            leased_by = NULL, lease_expires = NULL
+            WHERE url = ? AND (? IS NULL OR (state = 'fetching' AND leased_by = ?))
+            ''', (content_hash, now, url, worker, worker)).rowcount
+            if updated:
+                conn.execute('''
+                INSERT OR REPLACE INTO results (url, source, parent, payload, worker, finished_at)
+                SELECT url, source, parent, ?, ?, ? FROM urls WHERE url = ?
+                ''', (serialized, worker, now, url))
+        return updated == 1
+
+    def results(self, source=None, parent=None):
+        """
+        Iterate over the stored results in the order their URLs were added.
+
+        Args:
+            source (str, optional): Only return the results of this source.
+            parent (str, optional): Only return the results of the URLs found in this page.
+
+        Yields:
+            tuple: The canonical URL and the payload of each result.
+        """
+        query = 'SELECT r.url, r.payload FROM results r JOIN urls u ON u.url = r.url WHERE 1 = 1'
+        parameters = []
+        if source is not None:
+            query += ' AND r.source = ?'
+            parameters.append(source)
+        if parent is not None:
+            query += ' AND r.parent = ?'
+            parameters.append(canonicalize_url(parent))
+        with self._lock:
+            rows = self.conn.execute(query + ' ORDER BY u.added_at, u.rowid', parameters).fetchall()
+        for url, payload in rows:
+            yield url, json.loads(payload)
+
+    def pending(self, sources=None):
+        """
+        Count the URLs queued or being fetched.
+
+        Args:
+            sources (list, optional): Only count URLs of these sources.
+
+        Returns:
+            int: The number of URLs not finished yet.
+        """
+        query = "SELECT COUNT(*) FROM urls WHERE state IN ('queued', 'fetching')"
+        parameters = []
+        if sources is not None:
+            sources = list(sources)
+            query += f" AND source IN ({', '.join('?' * len(sources))})"
+            parameters.extend(sources)
+        with self._lock:
+            return self.conn.execute(query, parameters).fetchone()[0]
+
+    def mark_fetched(self, url, content=None):
+        """
+        Record a successful fetch.
+
+        Args:
+            url (str): The fetched URL.
+            content (bytes or str, optional): The fetched content, whose hash is stored.
+
+        Returns:
+            bool: True if the content differs from the one of the previous fetch.
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        content_hash = hashlib.sha256(content).hexdigest() if content is not None else None
+        url = canonicalize_url(url)
+        with self._transaction() as conn:
+            row = conn.execute('SELECT content_hash FROM urls WHERE url = ?', (url,)).fetchone()
+            conn.execute('''
+            UPDATE urls SET state = 'fetched', content_hash = ?, error = NULL, fetched_at = ?,
+                            leased_by = NULL, lease_expires = NULL
+            WHERE url = ?
+            ''', (content_hash, time.time(), url))
+        return row is None or row[0] != content_hash
+
+    def mark_failed(self, url, error=None):
+        """
+        Record a failed fetch. Failed URLs are not claimed again until they are requeued.
+
+        Args:
+            url (str): The URL.
+            error (str or Exception, optional): The reason of the failure.
+        """
+        with self._transaction() as conn:
+            conn.execute('''
+            UPDATE urls SET state = 'failed', error = ?, leased_by = NULL, lease_expires = NULL
+            WHERE url = ?
+            ''', (str(error) if error is not None else None, canonicalize_url(url)))
+
+    def requeue(self, states=('fetching', 'fetched', 'failed'), source=None):
+        """
+        Queue again the URLs in the given states, e.g. at the start of a new run or to retry failures.
+
+        Args:
+            states (tuple): The states to requeue.
+            source (str, optional): Only requeue URLs of this source.
+
+        Returns:
+            int: The number of requeued URLs.
+        """
+        query = (f"UPDATE urls SET state = 'queued', leased_by = NULL, lease_expires = NULL "
+                 f"WHERE state IN ({', '.join('?' * len(states))})")
+        parameters = list(states)
+        if source is not None:
+            query += ' AND source = ?'
+            parameters.append(source)
+        with self._transaction() as conn:
+            return conn.execute(query, parameters).rowcount
+
+    def state(self, url):
+        """
+        Get the state of a URL.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            str: The state, or None if the URL is unknown.
+        """
+        with self._lock:
+            row = self.conn.execute('SELECT state FROM urls WHERE url = ?', (canonicalize_url(url),)).fetchone()
+        return row[0] if row else None
+
+    def counts(self, source=None):
+        """
+        Count the URLs in each state.
+
+        Args:
+            source (str, optional): Only count URLs of this source.
+
+        Returns:
+            dict: The number of URLs keyed by state.
+        """
+        query = 'SELECT state, COUNT(*) FROM urls'
+        parameters = []
+        if source is not None:
+            query += ' WHERE source = ?'
+            parameters.append(source)
+        with self._lock:
+            rows = dict(self.conn.execute(query + ' GROUP BY state', parameters).fetchall())
+        return {state: rows.get(state, 0) for state in self.STATES}
+
+    def close(self):
+        """
+        Close the database connection.
+        """
+        with self._lock:
+            self.conn.close()
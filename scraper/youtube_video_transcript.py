@@ -1,12 +1,17 @@
 from youtube_transcript_api import YouTubeTranscriptApi
+from concurrent.futures import ThreadPoolExecutor
 from fpdf import FPDF
 import os
+import threading
 
 class VideoTranscript:
-    def __init__(self, video_ids_file, output_directory, pdf_output_directory):
+    def __init__(self, video_ids_file, output_directory, pdf_output_directory=None, document_store=None):
+        # Without a pdf_output_directory no PDFs are rendered
         self.video_ids_file = video_ids_file
         self.output_directory = output_directory
         self.pdf_output_directory = pdf_output_directory
+        self.document_store = document_store
+        self.pdf_thread = None
         os.makedirs(output_directory, exist_ok=True)
 
     def load_video_ids(self):
@@ -33,6 +38,16 @@ class VideoTranscript:
             file.write(f"Transcript:\n{transcript['text']}\n")
             file.write("\n" + "#"*25 + "\n")
 
+    def load_transcript_txt(self, video_id):
+        # Transcripts that failed were saved empty and are fetched again
+        file_path = os.path.join(self.output_directory, f"{video_id}.txt")
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        text = content.split("Transcript:\n", 1)[-1].rsplit("\n" + "#"*25, 1)[0].strip()
+        return {'video_id': video_id, 'text': text} if text else None
+
     def save_transcript_pdf(self, transcript):
         pdf = FPDF()
         pdf.add_page()
@@ -45,22 +60,76 @@ class VideoTranscript:
         file_path = os.path.join(self.pdf_output_directory, f"{transcript['video_id']}.pdf")
         pdf.output(file_path)
 
-    def get_all_transcripts(self):
-        video_ids = self.load_video_ids()
-        all_transcripts = []
-        for video_id in video_ids:
-            transcript = self.fetch_transcript(video_id)
-            all_transcripts.append(transcript)
-            self.save_transcript_txt(transcript)
+    def save_transcripts_pdf(self, transcripts):
+        os.makedirs(self.pdf_output_directory, exist_ok=True)
+        for transcript in transcripts:
             self.save_transcript_pdf(transcript)
-        return all_transcripts
+
+    def save_transcripts_to_store(self, transcripts):
+        return self.document_store.upsert_many(
+            {'url': f"https://www.youtube.com/watch?v={transcript['video_id']}", 'text': transcript['text'],
+             'source': 'transcript'}
+            for transcript in transcripts if transcript['text'])
+
+    def wait_for_pdfs(self):
+        if self.pdf_thread is not None:
+            self.pdf_thread.join()
+            self.pdf_thread = None
+
+    def fetch_and_save_transcript(self, video_id):
+        transcript = self.fetch_transcript(video_id)
+        self.save_transcript_txt(transcript)
+        return transcript
+
+    def get_all_transcripts(self, workers=1, skip_existing=True):
+        """
+        Fetches and saves the transcript of every video, `workers` at a time.
+
+        With `skip_existing`, the videos whose transcript is already saved are not fetched again.
+        The transcripts are written to the document store, and the PDFs of the fetched ones are
+        rendered in a background thread; call `wait_for_pdfs` before exiting.
+        """
+        video_ids = list(dict.fromkeys(self.load_video_ids()))
+        existing = {}
+        if skip_existing:
+            for video_id in video_ids:
+                transcript = self.load_transcript_txt(video_id)
+                if transcript is not None:
+                    existing[video_id] = transcript
+            print(f"{len(existing)} of {len(video_ids)} transcripts already saved.")
+        missing_ids = [video_id for video_id in video_ids if video_id not in existing]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fetched = dict(zip(missing_ids, pool.map(self.fetch_and_save_transcript, missing_ids)))
+        transcripts = [existing.get(video_id) or fetched[video_id] for video_id in video_ids]
+        if self.pdf_output_directory is not None:
+            self.pdf_thread = threading.Thread(target=self.save_transcripts_pdf, args=(list(fetched.values()),),
+                                               name='transcripts-pdf')
+            self.pdf_thread.start()
+        if self.document_store is not None:
+            changed = self.save_transcripts_to_store(transcripts)
+            print(f"{changed} new or changed transcripts in the document store.")
+        return transcripts
 
 if __name__ == '__main__':
+    import argparse
+    import sys
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_manager'))
+    from document_store import DocumentStore
+
+    parser = argparse.ArgumentParser(description='Fetch the transcripts of the YouTube videos and save them as text and to the document store.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of transcripts fetched in parallel.')
+    parser.add_argument('--refetch', action='store_true', help='Fetch again the transcripts already saved.')
+    parser.add_argument('--pdf', action='store_true', help='Also render the fetched transcripts as PDF files, in the background.')
+    args = parser.parse_args()
+
     video_ids_file = 'data/raw/youtube_videos_urls.txt'  # Path to the file containing video URLs
     output_directory = 'data/processed/transcripts'
-    pdf_output_directory = 'data/processed/pdf_files'
-    video_transcript = VideoTranscript(video_ids_file, output_directory, pdf_output_directory)
-    transcripts = video_transcript.get_all_transcripts()
+    pdf_output_directory = 'data/processed/pdf_files' if args.pdf else None
+    store = DocumentStore()
+    video_transcript = VideoTranscript(video_ids_file, output_directory, pdf_output_directory, document_store=store)
+    transcripts = video_transcript.get_all_transcripts(workers=args.workers, skip_existing=not args.refetch)
+    store.close()
     
     for transcript in transcripts:
         print(f"Saved transcript for Video ID: {transcript['video_id']}")
+    video_transcript.wait_for_pdfs()